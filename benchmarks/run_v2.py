@@ -0,0 +1,242 @@
+"""Benchmarks of the host overhead of `QickInstrument.run()`.
+
+The measurements run against a `SimulatedQickSoc` whose programs complete
+immediately, so the results are the time spent on the host. Run them with
+`asv run` or, without asv, with `python -m benchmarks.run_v2`.
+
+Every `track_*_time` benchmark reports the time per software sweep point spent in
+one phase of `run()`, as recorded in `QickInstrument.last_run_metrics`. The phases
+overlap, because the points are compiled and processed on worker threads while
+other points are acquired.
+"""
+
+from __future__ import annotations
+
+import itertools
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from qcodes import (
+    Measurement,
+    initialise_or_create_database_at,
+    load_or_create_experiment,
+)
+from qick.asm_v2 import QickSweep1D
+
+from qcodes_qick.envelopes_v2 import GaussianEnvelope
+from qcodes_qick.instrument_v2 import QickInstrument, SoftwareSweep
+from qcodes_qick.macros_v2 import DelayAuto, PlayPulse, Trigger
+from qcodes_qick.metrics_v2 import PointMetrics
+from qcodes_qick.pulses_v2 import ArbitraryPulse, ConstantPulse
+from qcodes_qick.simulated_soc_v2 import SimulatedQickSoc
+
+PHASES = PointMetrics.TIMES
+
+
+def make_instrument(name: str) -> QickInstrument:
+    """Make an instrument which plays a qubit pulse followed by a readout."""
+    qi = QickInstrument(None, name=name, soc=SimulatedQickSoc(seed=0))
+    readout_dac, readout_adc = qi.dacs[0], qi.adcs[0]
+    readout_dac.matching_adc.set(readout_adc.channel_num)
+    readout_adc.matching_dac.set(readout_dac.channel_num)
+    readout_pulse = ConstantPulse(readout_dac, "readout_pulse")
+    readout_pulse.gain.set(0.5)
+    readout_pulse.freq.set(100e6)
+    readout_pulse.length.set(1e-6)
+    readout_adc.freq.set(100e6)
+    readout_adc.length.set(1e-6)
+
+    envelope = GaussianEnvelope(qi.dacs[1], "envelope")
+    envelope.sigma.set(10e-9)
+    envelope.length.set(40e-9)
+    qubit_pulse = ArbitraryPulse(qi.dacs[1], "qubit_pulse", envelope)
+    qubit_pulse.freq.set(200e6)
+    qubit_pulse.gain.set(0.5)
+
+    qi.set_macro_list(
+        [
+            PlayPulse(qi, qubit_pulse),
+            DelayAuto(qi, 10e-9),
+            Trigger(qi, readout_adc, t=50e-9),
+            PlayPulse(qi, readout_pulse),
+            DelayAuto(qi, 10e-9),
+        ]
+    )
+    qi.ddr4_buffer.num_transfers.set(16)
+    return qi
+
+
+def measure(
+    acquisition_mode: str = "accumulated",
+    hardware_loop_count: int = 0,
+    hard_avgs: int = 100,
+    num_points: int = 10,
+) -> dict[str, float]:
+    """Run a measurement and get the time per software sweep point of each phase.
+
+    Parameters
+    ----------
+    acquisition_mode : str
+        Passed to `QickInstrument.run()`.
+    hardware_loop_count : int
+        Number of points of a hardware sweep of the qubit pulse gain.
+        No hardware loop if 0.
+    hard_avgs : int
+        Number of shots per hardware sweep point.
+    num_points : int
+        Number of points of a software sweep of the readout pulse gain.
+
+    Returns
+    -------
+    dict[str, float]
+        The time in seconds per software sweep point of each of `PHASES`, the total
+        time per point, and the number of shots per second.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        initialise_or_create_database_at(Path(directory) / "benchmark.db")
+        load_or_create_experiment("benchmark", "simulated")
+        qi = make_instrument("benchmark_qi")
+        try:
+            qi.hard_avgs.set(hard_avgs)
+            hardware_loop_counts = {}
+            if hardware_loop_count > 0:
+                qi.dacs[1].qubit_pulse.gain.set(QickSweep1D("gain", 0, 1))
+                hardware_loop_counts["gain"] = hardware_loop_count
+            kwargs = {}
+            if acquisition_mode == "state population":
+                kwargs["num_states"] = 2
+                kwargs["state_classifier"] = lambda iq: (iq.imag > iq.real).astype(int)
+            if acquisition_mode == "histogram":
+                edges = np.linspace(-1e6, 1e6, 101)
+                kwargs["histogram_bins"] = (edges, edges)
+            sweep = SoftwareSweep(qi.dacs[0].readout_pulse.gain, 0.1, 0.9, num_points)
+
+            qi.run(
+                Measurement(name="benchmark"),
+                software_sweeps=[sweep],
+                hardware_loop_counts=hardware_loop_counts,
+                acquisition_mode=acquisition_mode,
+                **kwargs,
+            )
+            metrics = qi.last_run_metrics
+        finally:
+            qi.close()
+
+    totals = metrics.totals()
+    result = {phase: totals[phase] / num_points for phase in PHASES}
+    total = metrics.total_time
+    result["total"] = total / num_points
+    num_shots = num_points * hard_avgs * max(1, hardware_loop_count)
+    result["shots_per_second"] = num_shots / total
+    return result
+
+
+class _PhaseSuite:
+    """Reports the time per point of each phase for every combination of `params`."""
+
+    params: list[list]
+    param_names: list[str]
+    timeout = 3600
+    unit = "seconds"
+
+    def run_measurement(self, *params: object) -> dict[str, float]:
+        raise NotImplementedError
+
+    def setup_cache(self) -> dict[tuple, dict[str, float]]:
+        return {
+            params: self.run_measurement(*params)
+            for params in itertools.product(*self.params)
+        }
+
+    def track_build_time(self, results, *params: object):
+        return results[params]["build_time"]
+
+    def track_assemble_time(self, results, *params: object):
+        return results[params]["assemble_time"]
+
+    def track_load_time(self, results, *params: object):
+        return results[params]["load_time"]
+
+    def track_run_time(self, results, *params: object):
+        return results[params]["run_time"]
+
+    def track_transfer_time(self, results, *params: object):
+        return results[params]["transfer_time"]
+
+    def track_reduction_time(self, results, *params: object):
+        return results[params]["reduction_time"]
+
+    def track_write_time(self, results, *params: object):
+        return results[params]["write_time"]
+
+    def track_total(self, results, *params: object):
+        return results[params]["total"]
+
+    def track_shots_per_second(self, results, *params: object):
+        return results[params]["shots_per_second"]
+
+    track_shots_per_second.unit = "shots/second"
+
+
+class AcquisitionModeSuite(_PhaseSuite):
+    params = [
+        [
+            "accumulated",
+            "accumulated geometric median",
+            "accumulated shots",
+            "ddr4",
+            "decimated",
+            "histogram",
+            "state population",
+        ]
+    ]
+    param_names = ["acquisition_mode"]
+
+    def run_measurement(self, acquisition_mode):
+        # the decimated buffer holds only a few readouts, and the time axis of
+        # the decimated and DDR4 modes does not support hardware loops
+        if acquisition_mode in ["decimated", "ddr4"]:
+            return measure(acquisition_mode, hard_avgs=10)
+        return measure(acquisition_mode, hardware_loop_count=10)
+
+
+class HardwareLoopSuite(_PhaseSuite):
+    params = [[2, 10, 100, 1000]]
+    param_names = ["hardware_loop_count"]
+
+    def run_measurement(self, hardware_loop_count):
+        return measure(hardware_loop_count=hardware_loop_count)
+
+
+class HardAvgsSuite(_PhaseSuite):
+    params = [[100, 10_000, 1_000_000]]
+    param_names = ["hard_avgs"]
+
+    def run_measurement(self, hard_avgs):
+        return measure(hard_avgs=hard_avgs, num_points=3)
+
+
+class SoftwareSweepSuite(_PhaseSuite):
+    params = [[1, 10, 100, 1000]]
+    param_names = ["num_points"]
+
+    def run_measurement(self, num_points):
+        return measure(num_points=num_points)
+
+
+if __name__ == "__main__":
+    for suite in [
+        AcquisitionModeSuite,
+        HardwareLoopSuite,
+        HardAvgsSuite,
+        SoftwareSweepSuite,
+    ]:
+        print(suite.__name__)
+        for params, result in suite().setup_cache().items():
+            phases = ", ".join(f"{phase} {result[phase] * 1e3:.2f}" for phase in PHASES)
+            print(
+                f"  {', '.join(map(str, params))}: {phases},"
+                f" total {result['total'] * 1e3:.2f} ms per point,"
+                f" {result['shots_per_second']:.3g} shots/s"
+            )
@@ -29,7 +29,11 @@ experiment = load_or_create_experiment(experiment_name, sample_name)
 
 station = Station()
 station.metadata["wiring"] = wiring
-qi: QickInstrument = QickInstrument("ip.address.of.board", name="qi")
+qi: QickInstrument = QickInstrument(
+    "ip.address.of.board",
+    name="qi",
+    soccfg_path=Path(__file__).parent / "soccfg.json",
+)
 station.add_component(qi)
 
 readout_dac = qi.dacs[0]
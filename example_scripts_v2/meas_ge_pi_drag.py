@@ -2,6 +2,7 @@ from header import *
 
 ge_minus_pi_pulse = ge_pi_pulse.copy("ge_minus_pi_pulse")
 ge_minus_pi_pulse.gain.set(-ge_pi_pulse.gain.get())
+ge_envelope.alpha.set(QickSweep1D("alpha", -0.2, 0))
 
 qi.set_macro_list(
     [
@@ -34,7 +35,5 @@ qi.final_delay.set(200e-6)
 
 qi.run(
     Measurement(station=station, name=Path(__file__).name[:-3]),
-    software_sweeps=[
-        SoftwareSweep(ge_envelope.alpha, -0.2, 0, 101),
-    ],
+    hardware_loop_counts={"alpha": 101},
 )
@@ -0,0 +1,444 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from qcodes.metadatable import Metadatable
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from qcodes.dataset.data_set_protocol import DataSetProtocol
+
+
+class StateClassifier(Metadatable, ABC):
+    """Abstract base class of the classifiers which assign a qubit state to each single-shot IQ point.
+
+    A classifier is called with an array of complex IQ points and returns an integer
+    array of the same shape with the state of each point, so that it can be passed to
+    `QickInstrument.run()` as the `state_classifier` of the "state population" mode.
+    The calibration is included in the snapshot, so a classifier added to the station
+    is saved with every dataset, and `from_snapshot` recreates it.
+
+    Parameters
+    ----------
+    name : str
+        The name under which the classifier appears in the station.
+    """
+
+    # the subclasses which can be recreated from a snapshot, by class name
+    _classes: dict[str, type[StateClassifier]] = {}  # noqa: RUF012
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        """Register the subclass for `from_snapshot`."""
+        super().__init_subclass__(**kwargs)
+        StateClassifier._classes[cls.__name__] = cls
+
+    def __init__(self, name: str = "state_classifier") -> None:
+        super().__init__()
+        self.name = name
+
+    @property
+    @abstractmethod
+    def num_states(self) -> int:
+        """The number of states which the classifier assigns."""
+
+    def __call__(self, iq: np.ndarray) -> np.ndarray:
+        """Classify the IQ points.
+
+        Parameters
+        ----------
+        iq : np.ndarray
+            Complex IQ points of any shape.
+
+        Returns
+        -------
+        np.ndarray
+            The state of each IQ point, with the same shape.
+        """
+        iq = np.asarray(iq)
+        states = self.classify(iq.real.reshape(-1), iq.imag.reshape(-1))
+        return states.reshape(iq.shape)
+
+    @abstractmethod
+    def classify(self, i: np.ndarray, q: np.ndarray) -> np.ndarray:
+        """Classify the IQ points given as flat arrays of the I and Q values."""
+
+    @classmethod
+    @abstractmethod
+    def fit(cls, shots: Sequence[np.ndarray], **kwargs) -> StateClassifier:
+        """Fit a classifier to shots of known states.
+
+        Parameters
+        ----------
+        shots : Sequence[np.ndarray]
+            The complex IQ points of the shots prepared in each state.
+        **kwargs
+            Passed to the constructor of the classifier.
+        """
+
+    @classmethod
+    def fit_dataset(
+        cls,
+        dataset: DataSetProtocol,
+        parameter_name: str = "iq",
+        state_parameter: str | None = None,
+        **kwargs,
+    ) -> StateClassifier:
+        """Fit a classifier to a dataset of the "accumulated shots" acquisition mode.
+
+        The states are prepared by the sweep of `state_parameter`, e.g. by a
+        hardware loop of the gain of a pi pulse from 0 to the pi pulse gain, as in
+        `meas_single_shot_readout_vs_qubit_state.py`. The shots of each value of
+        `state_parameter` are the shots of a state, in the order of increasing
+        values, and the shots of all other sweep points are pooled.
+
+        Parameters
+        ----------
+        dataset : DataSetProtocol
+            The dataset, e.g. from `qcodes.load_by_id()`.
+        parameter_name : str
+            The name of the parameter holding the IQ points.
+        state_parameter : str, optional
+            The name of the setpoint parameter which prepares the states. By
+            default, the innermost sweep, i.e. the innermost hardware loop if
+            there is one. It may also be a software sweep or an outer hardware loop.
+        **kwargs
+            Passed to `fit`.
+
+        Raises
+        ------
+        ValueError
+            If `state_parameter` is not a setpoint of `parameter_name`, or if the
+            dataset has no sweep to prepare the states.
+        """
+        data = dataset.get_parameter_data(parameter_name)[parameter_name]
+        setpoints = [name for name in data if name != parameter_name]
+        if state_parameter is None:
+            state_parameter = setpoints[-1] if len(setpoints) > 0 else None
+            if state_parameter in [None, "shot"]:
+                msg = f"{parameter_name} has no sweep which prepares the states. Sweep the state preparation, or pass `state_parameter`."
+                raise ValueError(msg)
+        elif state_parameter not in setpoints:
+            msg = f"{state_parameter} is not a setpoint of {parameter_name}, whose setpoints are {setpoints}."
+            raise ValueError(msg)
+        iq = np.asarray(data[parameter_name])
+        values = np.broadcast_to(data[state_parameter], iq.shape)
+        return cls.fit([iq[values == value] for value in np.unique(values)], **kwargs)
+
+    def assignment_matrix(self, shots: Sequence[np.ndarray]) -> np.ndarray:
+        """Get the probability to assign each state to shots of known states.
+
+        Parameters
+        ----------
+        shots : Sequence[np.ndarray]
+            The complex IQ points of the shots prepared in each state.
+
+        Returns
+        -------
+        np.ndarray
+            Element [i, j] is the fraction of the shots prepared in state i
+            which are classified as state j.
+        """
+        matrix = np.empty((len(shots), self.num_states))
+        for i, state_shots in enumerate(shots):
+            states = self(state_shots).reshape(-1)
+            counts = np.bincount(states, minlength=self.num_states)
+            matrix[i] = counts / len(states)
+        return matrix
+
+    def snapshot_base(
+        self,
+        update: bool | None = False,  # noqa: ARG002
+        params_to_skip_update: Sequence[str] | None = None,  # noqa: ARG002
+    ) -> dict[str, Any]:
+        return {
+            "__class__": f"{type(self).__module__}.{type(self).__name__}",
+            "name": self.name,
+            "num_states": self.num_states,
+            "calibration": self.calibration(),
+        }
+
+    @abstractmethod
+    def calibration(self) -> dict[str, Any]:
+        """Get the arguments of the constructor as JSON-serializable values."""
+
+    @staticmethod
+    def from_snapshot(snapshot: dict[str, Any]) -> StateClassifier:
+        """Recreate a classifier from its snapshot.
+
+        Parameters
+        ----------
+        snapshot : dict
+            The snapshot, e.g. from `dataset.snapshot["station"]["components"][name]`.
+        """
+        cls = StateClassifier._classes[snapshot["__class__"].rsplit(".", 1)[-1]]
+        return cls(name=snapshot["name"], **snapshot["calibration"])
+
+
+class RotatedThresholdClassifier(StateClassifier):
+    """Distinguish two states by thresholding the rotated I values.
+
+    An IQ point is assigned the state 1 if the real part of iq * exp(-1j * angle)
+    exceeds the threshold, and the state 0 otherwise.
+
+    Parameters
+    ----------
+    angle : float
+        The rotation angle in radians.
+    threshold : float
+        The threshold of the rotated I values.
+    name : str
+        The name under which the classifier appears in the station.
+    """
+
+    def __init__(
+        self, angle: float, threshold: float, name: str = "state_classifier"
+    ) -> None:
+        super().__init__(name)
+        self.angle = float(angle)
+        self.threshold = float(threshold)
+        self._cos = np.cos(self.angle)
+        self._sin = np.sin(self.angle)
+
+    @property
+    def num_states(self) -> int:
+        return 2
+
+    def classify(self, i: np.ndarray, q: np.ndarray) -> np.ndarray:
+        rotated = i * self._cos
+        rotated += q * self._sin
+        return (rotated > self.threshold).view(np.int8)
+
+    @classmethod
+    def fit(cls, shots: Sequence[np.ndarray], **kwargs) -> RotatedThresholdClassifier:
+        """Fit the angle and the threshold to shots of the states 0 and 1.
+
+        The angle is that of the line through the mean IQ points of the two states,
+        and the threshold maximizes the assignment fidelity.
+
+        Parameters
+        ----------
+        shots : Sequence[np.ndarray]
+            The complex IQ points of the shots prepared in the states 0 and 1.
+        **kwargs
+            Passed to the constructor.
+        """
+        assert len(shots) == 2
+        shots0, shots1 = (np.asarray(s).reshape(-1) for s in shots)
+        angle = np.angle(shots1.mean() - shots0.mean())
+        rotated0 = np.sort((shots0 * np.exp(-1j * angle)).real)
+        rotated1 = np.sort((shots1 * np.exp(-1j * angle)).real)
+        # the fidelity of a threshold at each rotated I value
+        candidates = np.concatenate([rotated0, rotated1])
+        errors0 = 1 - np.searchsorted(rotated0, candidates, "right") / len(rotated0)
+        errors1 = np.searchsorted(rotated1, candidates, "right") / len(rotated1)
+        best = np.argmin(errors0 + errors1)
+        threshold = candidates[best]
+        # put the threshold halfway to the next rotated I value
+        above = candidates[candidates > threshold]
+        if above.size > 0:
+            threshold = (threshold + above.min()) / 2
+        return cls(angle, threshold, **kwargs)
+
+    def calibration(self) -> dict[str, Any]:
+        return {"angle": self.angle, "threshold": self.threshold}
+
+
+class LinearDiscriminantClassifier(StateClassifier):
+    """Assign the most likely state of Gaussian distributions with a shared covariance.
+
+    Each state is modelled as a Gaussian distribution in the IQ plane, with the
+    covariance shared by all states.
+
+    The decision boundaries are straight lines, so any number of states can be
+    distinguished, e.g. g, e and f.
+
+    Parameters
+    ----------
+    means : Sequence[complex]
+        The mean IQ point of each state.
+    covariance : Sequence[Sequence[float]]
+        The 2x2 covariance matrix of I and Q.
+    name : str
+        The name under which the classifier appears in the station.
+    """
+
+    def __init__(
+        self,
+        means: Sequence[complex],
+        covariance: Sequence[Sequence[float]],
+        name: str = "state_classifier",
+    ) -> None:
+        super().__init__(name)
+        self.means = _as_complex(means)
+        self.covariance = np.asarray(covariance, dtype=float)
+        assert self.covariance.shape == (2, 2)
+        # the log-likelihood of state k is linear: w_k . (i, q) + b_k
+        means_iq = np.stack([self.means.real, self.means.imag], axis=-1)
+        self._weights = means_iq @ np.linalg.inv(self.covariance)
+        self._biases = -0.5 * np.sum(self._weights * means_iq, axis=-1)
+
+    @property
+    def num_states(self) -> int:
+        return len(self.means)
+
+    def classify(self, i: np.ndarray, q: np.ndarray) -> np.ndarray:
+        scores = np.multiply.outer(i, self._weights[:, 0])
+        scores += np.multiply.outer(q, self._weights[:, 1])
+        scores += self._biases
+        return scores.argmax(axis=-1)
+
+    @classmethod
+    def fit(cls, shots: Sequence[np.ndarray], **kwargs) -> LinearDiscriminantClassifier:
+        """Fit the mean of each state and the pooled covariance.
+
+        Parameters
+        ----------
+        shots : Sequence[np.ndarray]
+            The complex IQ points of the shots prepared in each state.
+        **kwargs
+            Passed to the constructor.
+        """
+        shots = [np.asarray(s).reshape(-1) for s in shots]
+        means = [s.mean() for s in shots]
+        deviations = np.concatenate([s - m for s, m in zip(shots, means)])
+        covariance = np.cov(deviations.real, deviations.imag)
+        return cls(means, covariance, **kwargs)
+
+    def calibration(self) -> dict[str, Any]:
+        return {
+            "means": _as_pairs(self.means),
+            "covariance": self.covariance.tolist(),
+        }
+
+
+class GaussianMixtureClassifier(StateClassifier):
+    """Assign the most likely component of a Gaussian mixture.
+
+    The shots are modelled as a mixture of Gaussian distributions in the IQ plane,
+    with one component per state.
+
+    Parameters
+    ----------
+    weights : Sequence[float]
+        The weight of each component.
+    means : Sequence[complex]
+        The mean IQ point of each component.
+    covariances : Sequence[Sequence[Sequence[float]]]
+        The 2x2 covariance matrix of I and Q of each component.
+    name : str
+        The name under which the classifier appears in the station.
+    """
+
+    def __init__(
+        self,
+        weights: Sequence[float],
+        means: Sequence[complex],
+        covariances: Sequence[Sequence[Sequence[float]]],
+        name: str = "state_classifier",
+    ) -> None:
+        super().__init__(name)
+        self.weights = np.asarray(weights, dtype=float)
+        self.means = _as_complex(means)
+        self.covariances = np.asarray(covariances, dtype=float)
+        assert self.covariances.shape == (len(self.means), 2, 2)
+        self._precisions = np.linalg.inv(self.covariances)
+        self._log_norms = np.log(self.weights) - 0.5 * np.log(
+            np.linalg.det(self.covariances)
+        )
+
+    @property
+    def num_states(self) -> int:
+        return len(self.means)
+
+    def classify(self, i: np.ndarray, q: np.ndarray) -> np.ndarray:
+        return self._log_likelihoods(i, q).argmax(axis=-1)
+
+    def _log_likelihoods(self, i: np.ndarray, q: np.ndarray) -> np.ndarray:
+        """Get the log-likelihood of each component, up to a constant."""
+        scores = np.empty((len(i), self.num_states))
+        for k in range(self.num_states):
+            di = i - self.means[k].real
+            dq = q - self.means[k].imag
+            (pii, piq), (_, pqq) = self._precisions[k]
+            mahalanobis = pii * di * di + 2 * piq * di * dq + pqq * dq * dq
+            scores[:, k] = self._log_norms[k] - 0.5 * mahalanobis
+        return scores
+
+    @classmethod
+    def fit(
+        cls,
+        shots: Sequence[np.ndarray],
+        max_iter: int = 100,
+        tol: float = 1e-6,
+        **kwargs,
+    ) -> GaussianMixtureClassifier:
+        """Fit the mixture to all shots by expectation maximization.
+
+        The components are initialized from the shots prepared in each state, so that
+        component k represents state k. Unlike `LinearDiscriminantClassifier.fit`,
+        the fit is not biased by shots which ended up in another state than the
+        prepared one, e.g. because of thermal population or decay during the readout.
+
+        Parameters
+        ----------
+        shots : Sequence[np.ndarray]
+            The complex IQ points of the shots prepared in each state.
+        max_iter : int
+            Maximum number of iterations.
+        tol : float
+            Stop when the mean log-likelihood improves by less than this.
+        **kwargs
+            Passed to the constructor.
+        """
+        shots = [np.asarray(s).reshape(-1) for s in shots]
+        num_states = len(shots)
+        iq = np.concatenate(shots)
+        x = np.stack([iq.real, iq.imag], axis=-1)
+        weights = np.full(num_states, 1 / num_states)
+        means = np.array([s.mean() for s in shots])
+        covariances = np.array([np.cov(s.real, s.imag) for s in shots])
+        # keep the covariances positive definite
+        regularization = 1e-6 * np.trace(np.cov(x.T)) * np.eye(2)
+
+        previous = -np.inf
+        for _ in range(max_iter):
+            model = cls(weights, means, covariances)
+            log_likelihoods = model._log_likelihoods(iq.real, iq.imag)
+            log_sum = np.logaddexp.reduce(log_likelihoods, axis=-1)
+            responsibilities = np.exp(log_likelihoods - log_sum[:, np.newaxis])
+            totals = responsibilities.sum(axis=0)
+            weights = totals / len(iq)
+            means_iq = (responsibilities.T @ x) / totals[:, np.newaxis]
+            means = means_iq[:, 0] + 1j * means_iq[:, 1]
+            for k in range(num_states):
+                deviations = x - means_iq[k]
+                covariances[k] = (responsibilities[:, k] * deviations.T) @ deviations
+                covariances[k] = covariances[k] / totals[k] + regularization
+            mean_log_likelihood = log_sum.mean()
+            if mean_log_likelihood - previous < tol:
+                break
+            previous = mean_log_likelihood
+        return cls(weights, means, covariances, **kwargs)
+
+    def calibration(self) -> dict[str, Any]:
+        return {
+            "weights": self.weights.tolist(),
+            "means": _as_pairs(self.means),
+            "covariances": self.covariances.tolist(),
+        }
+
+
+def _as_complex(values: Sequence) -> np.ndarray:
+    """Convert complex numbers or (I, Q) pairs to a complex array."""
+    values = np.asarray(values)
+    if values.ndim == 2:
+        return values[:, 0] + 1j * values[:, 1]
+    return values.astype(complex)
+
+
+def _as_pairs(values: np.ndarray) -> list[list[float]]:
+    """Convert complex numbers to JSON-serializable (I, Q) pairs."""
+    return np.stack([values.real, values.imag], axis=-1).tolist()
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING
+
+from qcodes import load_by_id
+
+from qcodes_qick.instrument_v2 import RunCancelledError
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from qcodes import Measurement
+
+    from qcodes_qick.instrument_v2 import QickInstrument
+
+
+class BoardRun:
+    """A measurement to run on one board with `run_on_boards()`.
+
+    Parameters
+    ----------
+    instrument : QickInstrument
+        The board, with its own macro list and parameters.
+    meas : Measurement
+        The measurement, which is saved in its own dataset.
+    **kwargs
+        Passed to `QickInstrument.run()`.
+    """
+
+    def __init__(self, instrument: QickInstrument, meas: Measurement, **kwargs) -> None:
+        self.instrument = instrument
+        self.meas = meas
+        self.kwargs = kwargs
+
+
+def run_on_boards(
+    runs: Sequence[BoardRun],
+    synchronize_points: bool = False,
+    link_datasets: bool = True,
+) -> list[int]:
+    """Run measurements on several boards concurrently, one thread per board.
+
+    Each board compiles, acquires and saves its points on its own thread, so the
+    boards wait for their Pyro proxies in parallel. If a run fails, the runs on the
+    other boards are cancelled with `QickInstrument.cancel_run()`, and the first
+    exception is raised once all runs have stopped.
+
+    Parameters
+    ----------
+    runs : Sequence[BoardRun]
+        The measurements, at most one per board.
+    synchronize_points : bool
+        Start the acquisition of each software sweep point on all boards together.
+        A board which has no points left no longer holds back the others.
+        The boards are only synchronized by software, within the latency of the
+        Pyro calls. For a deterministic timing between the boards, distribute an
+        external trigger to them instead.
+    link_datasets : bool
+        Save the run IDs of all the datasets as JSON in the metadata
+        "qick_linked_run_ids" of each dataset.
+
+    Returns
+    -------
+    list[int]
+        The run IDs of the datasets, in the order of `runs`.
+    """
+    instruments = [run.instrument for run in runs]
+    if len(set(map(id, instruments))) != len(instruments):
+        msg = "Each board can only run one measurement at a time."
+        raise ValueError(msg)
+    synchronizer = _PointSynchronizer(len(runs)) if synchronize_points else None
+    # Forget the cancellations of earlier runs. A board which fails before another
+    # board has started its run cancels that run as soon as it starts.
+    for instrument in instruments:
+        instrument._run_cancelled.clear()  # noqa: SLF001
+
+    def run_on_board(run: BoardRun) -> int:
+        try:
+            return run.instrument.run(
+                run.meas,
+                before_each_point=None if synchronizer is None else synchronizer.wait,
+                **run.kwargs,
+            )
+        except BaseException:
+            # stop the other boards
+            for instrument in instruments:
+                if instrument is not run.instrument:
+                    instrument.cancel_run()
+            raise
+        finally:
+            if synchronizer is not None:
+                synchronizer.leave()
+
+    with ThreadPoolExecutor(max_workers=max(1, len(runs))) as executor:
+        futures = [executor.submit(run_on_board, run) for run in runs]
+        wait(futures)
+    # the boards which had finished before a board failed have not been stopped
+    for instrument in instruments:
+        instrument._run_cancelled.clear()  # noqa: SLF001
+    # raise the exception which caused the other runs to be cancelled
+    errors = [future.exception() for future in futures]
+    for error in errors:
+        if error is not None and not isinstance(error, RunCancelledError):
+            raise error
+    for error in errors:
+        if error is not None:
+            raise error
+
+    run_ids = [future.result() for future in futures]
+    if link_datasets:
+        for run_id in run_ids:
+            load_by_id(run_id).add_metadata("qick_linked_run_ids", json.dumps(run_ids))
+    return run_ids
+
+
+class _PointSynchronizer:
+    """Let a number of threads start each point together.
+
+    Unlike `threading.Barrier`, a thread which has finished leaves the group,
+    so that the remaining threads do not wait for it.
+    """
+
+    def __init__(self, parties: int) -> None:
+        self._parties = parties
+        self._waiting = 0
+        self._generation = 0
+        self._condition = threading.Condition()
+
+    def wait(self) -> None:
+        """Wait until all the threads which have not left are waiting."""
+        with self._condition:
+            generation = self._generation
+            self._waiting += 1
+            if self._waiting >= self._parties:
+                self._release()
+            else:
+                self._condition.wait_for(lambda: self._generation != generation)
+
+    def leave(self) -> None:
+        """Stop taking part, releasing the waiting threads if they were waiting for this one."""
+        with self._condition:
+            self._parties -= 1
+            if self._waiting > 0 and self._waiting >= self._parties:
+                self._release()
+
+    def _release(self) -> None:
+        self._waiting = 0
+        self._generation += 1
+        self._condition.notify_all()
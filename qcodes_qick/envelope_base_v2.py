@@ -1,17 +1,27 @@
 from __future__ import annotations
 
+from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING
 
+import numpy as np
 from qcodes.instrument import InstrumentModule
+from qick.asm_v2 import QickParam, QickRawParam, Waveform
+
+from qcodes_qick.parameters_v2 import SweepableParameter
 
 if TYPE_CHECKING:
-    import qick.asm_v2
+    from collections.abc import Hashable
 
     from qcodes_qick.channels_v2 import DacChannel
+    from qcodes_qick.programs_v2 import AveragerProgram
+
 
+class DacEnvelope(InstrumentModule, ABC):
+    """Abstract base class for a pulse envelope stored in a DAC channel's envelope memory.
 
-class DacEnvelope(InstrumentModule):
-    """Base class for a pulse envelope stored in a DAC channel's envelope memory.
+    If a SweepableParameter of the envelope is swept in hardware, a bank with one
+    envelope per sweep point is stored in the envelope memory, and the hardware loops
+    select the envelope from the bank.
 
     Parameters
     ----------
@@ -27,11 +37,332 @@ class DacEnvelope(InstrumentModule):
         super().__init__(parent, name)
         self.parent.add_submodule(name, self)
 
-    def initialize(self, program: qick.asm_v2.QickProgramV2) -> None:
+    def initialize(self, program: AveragerProgram) -> None:
         """Add this envelope to the program's envelope library.
 
+        If the same envelope is resident in the envelope memory of the board,
+        its samples are reused instead of being calculated again.
+
+        Parameters
+        ----------
+        program : AveragerProgram
+            The program which uses this envelope.
+        """
+        ch = self.parent.channel_num
+        bank_loops = self.get_bank_loops(program)
+        values = {
+            name: self.get_bank_values(parameter, bank_loops)
+            for name, parameter in self.parameters.items()
+            if isinstance(parameter, SweepableParameter)
+        }
+        key = self.get_key(bank_loops)
+        memory = program.qick_instrument.envelope_memory
+        data = memory.find(ch, (key, 0))
+        bank_data = memory.find(ch, (key, 1))
+        if data is None or (
+            bank_data is None and np.prod(tuple(bank_loops.values())) > 1
+        ):
+            idata, qdata = self.calculate(program, **values)
+            self.add_bank(program, idata, qdata, key)
+        else:
+            self.add_bank(program, data[:, 0], data[:, 1], key, part=0)
+            if bank_data is not None:
+                self.add_bank(program, bank_data[:, 0], bank_data[:, 1], key, part=1)
+
+    @abstractmethod
+    def calculate(
+        self,
+        program: AveragerProgram,
+        **values: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray | None]:
+        """Calculate the envelope samples.
+
+        Parameters
+        ----------
+        program : AveragerProgram
+            The program which uses this envelope.
+        **values : np.ndarray
+            The values of the SweepableParameters of this envelope,
+            as returned by `get_bank_values`.
+
+        Returns
+        -------
+        idata : np.ndarray
+            I data. The last dimension is the sample, the others correspond to
+            the loops returned by `get_bank_loops`.
+        qdata : np.ndarray | None
+            Q data, which must broadcast together with `idata`.
+        """
+
+    def get_key(self, bank_loops: dict[str, int]) -> tuple:
+        """Get a key which identifies the samples of this envelope.
+
+        Parameters
+        ----------
+        bank_loops : dict[str, int]
+            The loops returned by `get_bank_loops`.
+        """
+        values = []
+        for name, parameter in self.parameters.items():
+            if isinstance(parameter, SweepableParameter):
+                value = parameter.qick_param
+                values.append((name, value.start, tuple(value.spans.items())))
+            else:
+                values.append((name, parameter.cache.get(get_if_invalid=False)))
+        return (type(self).__name__, tuple(values), tuple(bank_loops.items()))
+
+    def get_bank_loops(self, program: AveragerProgram) -> dict[str, int]:
+        """Get the hardware loops which select the envelope from the bank.
+
+        Parameters
+        ----------
+        program : AveragerProgram
+            The program which uses this envelope.
+
+        Returns
+        -------
+        dict[str, int]
+            The loop counts, outermost first. Empty if no parameter is swept.
+        """
+        loops = set()
+        for parameter in self.parameters.values():
+            if isinstance(parameter, SweepableParameter):
+                value = parameter.qick_param
+                if isinstance(value, QickParam) and value.is_sweep():
+                    loops.update(value.spans)
+        return {
+            loop: count
+            for loop, count in program.hardware_loop_counts.items()
+            if loop in loops
+        }
+
+    def get_bank_values(
+        self,
+        parameter: SweepableParameter,
+        bank_loops: dict[str, int],
+    ) -> np.ndarray:
+        """Get the value of a parameter for each envelope in the bank.
+
+        The envelopes are calculated from the exact sweep points, which are not
+        rounded to a hardware resolution, so these are also the actual values of
+        the sweep.
+
+        Parameters
+        ----------
+        parameter : SweepableParameter
+            A parameter of this envelope.
+        bank_loops : dict[str, int]
+            The loops returned by `get_bank_loops`.
+
+        Returns
+        -------
+        np.ndarray
+            Each dimension corresponds to a loop in `bank_loops`.
+        """
+        value = parameter.qick_param
+        assert isinstance(value, QickParam)
+        return np.asarray(value.to_array(bank_loops, all_loops=True))
+
+    def add_bank(
+        self,
+        program: AveragerProgram,
+        idata: np.ndarray,
+        qdata: np.ndarray | None,
+        key: tuple,
+        part: int | None = None,
+    ) -> None:
+        """Add a bank of envelopes to the program's envelope library.
+
+        The envelopes are stored next to each other, so that a hardware loop
+        can select one by incrementing the envelope address.
+        The first envelope gets the name of this envelope and the others are
+        added as a single envelope, so that the bank is loaded in one transfer.
+
+        Parameters
+        ----------
+        program : AveragerProgram
+            The program which uses this envelope.
+        idata : np.ndarray
+            I data. The last dimension is the sample, the others correspond to
+            the loops returned by `get_bank_loops`.
+        qdata : np.ndarray | None
+            Q data, which must broadcast together with `idata`.
+        key : tuple
+            The key returned by `get_key`.
+        part : int, optional
+            Add only the first envelope (0) or only the others (1), with the samples
+            given as they are stored in the envelope memory.
+        """
+        ch = self.parent.channel_num
+        if part is None:
+            if qdata is not None:
+                idata, qdata = np.broadcast_arrays(idata, qdata)
+                qdata = qdata.reshape(-1, qdata.shape[-1])
+            length = idata.shape[-1]
+            idata = idata.reshape(-1, length)
+            self.add_bank(
+                program,
+                idata[0],
+                None if qdata is None else qdata[0],
+                key,
+                part=0,
+            )
+            if len(idata) > 1:
+                self.add_bank(
+                    program,
+                    idata[1:].ravel(),
+                    None if qdata is None else qdata[1:].ravel(),
+                    key,
+                    part=1,
+                )
+            return
+
+        name = self.short_name if part == 0 else f"{self.short_name}_bank"
+        program.add_envelope(ch, name, idata=idata, qdata=qdata)
+        program.envelope_keys[ch, name] = (key, part)
+
+        maxlen = program.soccfg["gens"][ch]["maxlen"]
+        if program.envelopes[ch]["next_addr"] > maxlen:
+            msg = (
+                f"The envelopes of {self.full_name} do not fit into"
+                f" the envelope memory ({maxlen} samples)."
+            )
+            raise RuntimeError(msg)
+
+    def select_from_bank(self, program: AveragerProgram) -> None:
+        """Make the hardware loops select the envelope from the bank.
+
+        This sweeps the envelope address of every waveform which plays this envelope.
+        It must be called after the pulses have been added to the program.
+
         Parameters
         ----------
-        program : qick.asm_v2.QickProgramV2
+        program : AveragerProgram
             The program which uses this envelope.
         """
+        bank_loops = self.get_bank_loops(program)
+        if len(bank_loops) == 0:
+            return
+
+        ch = self.parent.channel_num
+        samps_per_clk = program.soccfg["gens"][ch]["samps_per_clk"]
+        envelope = program.envelopes[ch]["envs"][self.short_name]
+        start = envelope["addr"] // samps_per_clk
+        length = envelope["data"].shape[0] // samps_per_clk
+
+        # the envelopes are stored in C order of the loops
+        spans = {}
+        stride = length
+        for loop, count in reversed(bank_loops.items()):
+            spans[loop] = stride * (count - 1)
+            stride *= count
+
+        for pulse in program.pulses.values():
+            if pulse.gen_chs is None or ch not in pulse.gen_chs:
+                continue
+            for i, wave in enumerate(pulse.waveforms):
+                if not isinstance(wave, Waveform) or isinstance(wave.env, QickRawParam):
+                    continue
+                if not start <= wave.env < start + length:
+                    continue
+                env = QickRawParam("env", wave.env, dict(spans))
+                bank_wave = _EnvelopeBankWaveform(
+                    *(getattr(wave, field) for field in Waveform._fields[1:]),
+                    name=wave.name,
+                )
+                pulse.waveforms[i] = bank_wave
+                program.waves[program.wave2idx[wave.name]] = bank_wave
+                bank_wave.env = env
+
+
+class _EnvelopeBankWaveform(Waveform):
+    """A waveform whose envelope address is swept to select from an envelope bank."""
+
+    def sweeps(self) -> list[QickRawParam]:
+        return [*super().sweeps(), self.env]
+
+
+class EnvelopeMemory:
+    """Keeps track of the envelopes which are resident in the envelope memories of a board.
+
+    Envelopes are identified by their channel and the key given by
+    `DacEnvelope.get_key`. If an envelope is already resident at its address,
+    loading it again is skipped, and its samples can be reused by new programs.
+    """
+
+    def __init__(self) -> None:
+        # {channel: {address: (key, data)}}
+        self.envelopes: dict[int, dict[int, tuple[Hashable, np.ndarray]]] = {}
+
+    def find(self, channel: int, key: Hashable) -> np.ndarray | None:
+        """Get the samples of a resident envelope.
+
+        Parameters
+        ----------
+        channel : int
+            The DAC channel number.
+        key : Hashable
+            The key of the envelope.
+
+        Returns
+        -------
+        np.ndarray | None
+            The samples as stored in the envelope memory, or None if not resident.
+        """
+        for resident_key, data in self.envelopes.get(channel, {}).values():
+            if resident_key == key:
+                return data
+        return None
+
+    def load(
+        self,
+        soc,
+        channel: int,
+        address: int,
+        data: np.ndarray,
+        key: Hashable | None,
+    ) -> None:
+        """Load an envelope onto the board, unless it is already resident.
+
+        Parameters
+        ----------
+        soc : Pyro4.Proxy
+            The QickSoc.
+        channel : int
+            The DAC channel number.
+        address : int
+            The address in the envelope memory.
+        data : np.ndarray
+            The samples, in the format of `QickProgramV2.envelopes`.
+        key : Hashable | None
+            The key of the envelope. If None, the envelope is always loaded.
+        """
+        resident = self.envelopes.setdefault(channel, {})
+        if key is not None and address in resident:
+            resident_key, resident_data = resident[address]
+            if resident_key == key and len(resident_data) == len(data):
+                return
+
+        soc.load_envelope(channel, data=data.tolist(), addr=address)
+
+        # forget the envelopes which have been overwritten
+        for other_address, (_, other_data) in list(resident.items()):
+            if other_address < address + len(data) and address < other_address + len(
+                other_data
+            ):
+                del resident[other_address]
+        if key is not None:
+            resident[address] = (key, data)
+
+    def invalidate(self, channel: int | None = None) -> None:
+        """Forget which envelopes are resident, so that they are loaded again.
+
+        Parameters
+        ----------
+        channel : int, optional
+            Only forget the envelopes of this DAC channel.
+        """
+        if channel is None:
+            self.envelopes.clear()
+        else:
+            self.envelopes.pop(channel, None)
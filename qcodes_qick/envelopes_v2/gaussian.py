@@ -2,15 +2,17 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
+import numpy as np
 from qcodes import ManualParameter
 from qcodes.validators import Numbers
+from qick.helpers import gauss
 
 from qcodes_qick.envelope_base_v2 import DacEnvelope
+from qcodes_qick.parameters_v2 import SweepableParameter
 
 if TYPE_CHECKING:
-    import qick.asm_v2
-
     from qcodes_qick.channels_v2 import DacChannel
+    from qcodes_qick.programs_v2 import AveragerProgram
 
 
 class GaussianEnvelope(DacEnvelope):
@@ -21,13 +23,13 @@ class GaussianEnvelope(DacEnvelope):
     ) -> None:
         super().__init__(parent, name)
 
-        self.sigma = ManualParameter(
+        self.sigma = SweepableParameter(
             name="sigma",
             instrument=self,
             label="Standard deviation of the gaussian",
             unit="sec",
-            vals=Numbers(min_value=0),
             initial_value=100e-9,
+            min_value=0,
         )
         self.length = ManualParameter(
             name="length",
@@ -38,10 +40,22 @@ class GaussianEnvelope(DacEnvelope):
             initial_value=400e-9,
         )
 
-    def initialize(self, program: qick.asm_v2.QickProgramV2) -> None:
-        program.add_gauss(
-            ch=self.parent.channel_num,
-            name=self.short_name,
-            sigma=self.sigma.get() * 1e6,
-            length=self.length.get() * 1e6,
+    def calculate(
+        self,
+        program: AveragerProgram,
+        sigma: np.ndarray,
+    ) -> tuple[np.ndarray, None]:
+        # same calculation as add_gauss(), but sigma can be an array
+        ch = self.parent.channel_num
+        samps_per_clk = program.soccfg["gens"][ch]["samps_per_clk"]
+        lenreg = program.us2cycles(gen_ch=ch, us=self.length.get() * 1e6)
+        lenreg *= samps_per_clk
+        sigreg = program.us2cycles(gen_ch=ch, us=sigma * 1e6, as_float=True)
+        sigreg *= samps_per_clk
+        idata = gauss(
+            mu=lenreg / 2 - 0.5,
+            si=sigreg[..., np.newaxis],
+            length=lenreg,
+            maxv=program.soccfg.get_maxv(ch),
         )
+        return idata, None
@@ -2,15 +2,17 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
+import numpy as np
 from qcodes import ManualParameter
 from qcodes.validators import Numbers
+from qick.helpers import DRAG
 
 from qcodes_qick.envelope_base_v2 import DacEnvelope
+from qcodes_qick.parameters_v2 import SweepableParameter
 
 if TYPE_CHECKING:
-    import qick.asm_v2
-
     from qcodes_qick.channels_v2 import DacChannel
+    from qcodes_qick.programs_v2 import AveragerProgram
 
 
 class GaussianDragEnvelope(DacEnvelope):
@@ -21,13 +23,13 @@ class GaussianDragEnvelope(DacEnvelope):
     ) -> None:
         super().__init__(parent, name)
 
-        self.sigma = ManualParameter(
+        self.sigma = SweepableParameter(
             name="sigma",
             instrument=self,
             label="Standard deviation of the gaussian",
             unit="sec",
-            vals=Numbers(min_value=0),
             initial_value=100e-9,
+            min_value=0,
         )
         self.length = ManualParameter(
             name="length",
@@ -37,28 +39,42 @@ class GaussianDragEnvelope(DacEnvelope):
             vals=Numbers(min_value=0),
             initial_value=400e-9,
         )
-        self.delta = ManualParameter(
+        self.delta = SweepableParameter(
             name="delta",
             instrument=self,
             label="Anharmonicity of the qubit",
             unit="Hz",
-            vals=Numbers(),
             initial_value=-200e6,
         )
-        self.alpha = ManualParameter(
+        self.alpha = SweepableParameter(
             name="alpha",
             instrument=self,
             label="Alpha parameter of DRAG",
-            vals=Numbers(),
+            unit="",
             initial_value=0.5,
         )
 
-    def initialize(self, program: qick.asm_v2.QickProgramV2) -> None:
-        program.add_DRAG(
-            ch=self.parent.channel_num,
-            name=self.short_name,
-            sigma=self.sigma.get() * 1e6,
-            length=self.length.get() * 1e6,
-            delta=self.delta.get() / 1e6,
-            alpha=self.alpha.get(),
+    def calculate(
+        self,
+        program: AveragerProgram,
+        sigma: np.ndarray,
+        delta: np.ndarray,
+        alpha: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # same calculation as add_DRAG(), but the parameters can be arrays
+        ch = self.parent.channel_num
+        samps_per_clk = program.soccfg["gens"][ch]["samps_per_clk"]
+        f_fabric = program.soccfg["gens"][ch]["f_fabric"]
+        lenreg = program.us2cycles(gen_ch=ch, us=self.length.get() * 1e6)
+        lenreg *= samps_per_clk
+        sigreg = program.us2cycles(gen_ch=ch, us=sigma * 1e6, as_float=True)
+        sigreg *= samps_per_clk
+        return DRAG(
+            mu=lenreg / 2 - 0.5,
+            si=sigreg[..., np.newaxis],
+            length=lenreg,
+            maxv=program.soccfg.get_maxv(ch),
+            delta=delta[..., np.newaxis] / 1e6 / (samps_per_clk * f_fabric),
+            alpha=alpha[..., np.newaxis],
+            det=0,
         )
@@ -1,12 +1,23 @@
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING
+
 import numpy as np
-from geom_median.numpy import compute_geometric_median
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
 
 
-def geometric_median(data: np.ndarray, ftol: float = 1e-6) -> np.ndarray:
+def geometric_median(
+    data: np.ndarray, ftol: float = 1e-6, eps: float = 1e-6, maxiter: int = 100
+) -> np.ndarray:
     """Compute the geometric median of the data.
 
     data.shape[0] is the number of data points and data.shape[-1] is the dimensionality of each data point.
-    The computation is iterated over the remaining axes.
+    The computation is vectorized over the remaining axes: the Weiszfeld iterations
+    of all the medians run simultaneously, and each median stops being updated once
+    its own objective value has converged.
 
     Parameters
     ----------
@@ -14,12 +25,180 @@ def geometric_median(data: np.ndarray, ftol: float = 1e-6) -> np.ndarray:
         The data.
     ftol : float
         If objective value does not improve by at least this `ftol` fraction, terminate the algorithm.
+    eps : float
+        Smallest allowed distance between a data point and the median estimate, to avoid dividing by zero.
+    maxiter : int
+        Maximum number of Weiszfeld iterations.
     """
     result_shape = data.shape[1:]
     num_points = data.shape[0]
     num_components = data.shape[-1]
-    data = data.reshape(num_points, -1, num_components)
-    result = np.empty(result_shape).reshape(-1, num_components)
-    for i in range(data.shape[1]):
-        result[i, :] = compute_geometric_median(data[:, i, :], ftol=ftol).median
-    return result.reshape(result_shape)
+    data = data.reshape(num_points, -1, num_components).astype(float, copy=False)
+
+    # initialize the median estimates at the means
+    median = data.mean(axis=0)
+    objective_value = np.linalg.norm(data - median, axis=-1).mean(axis=0)
+    # indices of the medians which have not converged yet
+    active = np.arange(median.shape[0])
+    for _ in range(maxiter):
+        points = data[:, active, :]
+        norms = np.linalg.norm(points - median[active], axis=-1)
+        weights = 1 / np.maximum(eps, norms)
+        weight_sums = weights.sum(axis=0)[:, np.newaxis]
+        new_median = np.einsum("nm,nmd->md", weights, points) / weight_sums
+        new_objective_value = np.linalg.norm(points - new_median, axis=-1).mean(axis=0)
+        median[active] = new_median
+        converged = abs(objective_value[active] - new_objective_value) <= (
+            ftol * new_objective_value
+        )
+        objective_value[active] = new_objective_value
+        active = active[~converged]
+        if active.size == 0:
+            break
+    return median.reshape(result_shape)
+
+
+class StreamingGeometricMedian:
+    """Estimate the geometric median and the median absolute deviation of shots which arrive in chunks.
+
+    The shots of a sweep are consumed in the order they are read out, without keeping
+    them in memory. The first `num_warmup_shots` shots of every point are buffered and
+    their geometric median is computed exactly with `geometric_median`. If no more
+    shots arrive, the results are identical to those computed from all the shots.
+    Otherwise every further shot contributes one warm-started Weiszfeld step: it is
+    added to the running weighted mean with the weight 1 / |shot - median|, where the
+    median is the estimate at the time the shot arrived.
+
+    The median absolute deviation is estimated from a histogram of the distances of
+    the shots to the median, with logarithmically spaced bins spanning
+    `num_decades` decades around the median absolute deviation of the warmup shots.
+
+    Parameters
+    ----------
+    shape : Sequence[int]
+        The shape of the points of one shot, excluding the I/Q axis,
+        e.g. the hardware loop counts followed by the number of readouts per shot.
+    num_warmup_shots : int
+        Number of shots per point from which the median is computed exactly.
+    num_bins : int
+        Number of histogram bins of the distances of each point.
+    num_decades : float
+        Number of decades spanned by the histogram bins.
+    ftol : float
+        Passed to `geometric_median` for the warmup shots.
+    eps : float
+        Smallest allowed distance between a shot and the median estimate, to avoid dividing by zero.
+    """
+
+    def __init__(
+        self,
+        shape: Sequence[int],
+        num_warmup_shots: int = 1000,
+        num_bins: int = 1024,
+        num_decades: float = 6,
+        ftol: float = 1e-6,
+        eps: float = 1e-6,
+    ) -> None:
+        self.shape = tuple(shape)
+        self.num_points = math.prod(self.shape)
+        self.num_warmup_shots = num_warmup_shots
+        self.num_bins = num_bins
+        self.num_decades = num_decades
+        self.ftol = ftol
+        self.eps = eps
+        # number of shots of all points consumed so far
+        self.num_values = 0
+        self._warmup = np.empty((num_warmup_shots * self.num_points, 2))
+        self._median: np.ndarray | None = None
+        self._weighted_sum = np.zeros((self.num_points, 2))
+        self._weight_sum = np.zeros(self.num_points)
+        # the lower edge of the histogram of each point,
+        # with an extra bin below and above the bins for the outliers
+        self._log_min_distance = np.zeros(self.num_points)
+        self._counts = np.zeros((self.num_points, num_bins + 2), dtype=np.int64)
+
+    def update(self, data: np.ndarray) -> None:
+        """Consume the next shots.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            The I/Q values in the last axis. The other axes are flattened in C order
+            and continue where the previous chunk ended.
+        """
+        data = np.reshape(data, (-1, 2))
+        if self._median is None:
+            num_warmup = min(len(data), len(self._warmup) - self.num_values)
+            self._warmup[self.num_values : self.num_values + num_warmup] = data[
+                :num_warmup
+            ]
+            data = data[num_warmup:]
+            self.num_values += num_warmup
+            if len(data) == 0:
+                return
+            warmup = self._warmup.reshape(-1, self.num_points, 2)
+            self._median = geometric_median(warmup, ftol=self.ftol, eps=self.eps)
+            distances = np.linalg.norm(warmup - self._median, axis=-1)
+            mad = np.maximum(np.median(distances, axis=0), self.eps)
+            self._log_min_distance = np.log10(mad) - self.num_decades / 2
+            self._accumulate(np.arange(len(self._warmup)), self._warmup)
+            del self._warmup
+        if len(data) > 0:
+            indices = np.arange(self.num_values, self.num_values + len(data))
+            self._accumulate(indices, data.astype(float, copy=False))
+            self._median = self._weighted_sum / self._weight_sum[:, np.newaxis]
+            self.num_values += len(data)
+
+    def _accumulate(self, indices: np.ndarray, data: np.ndarray) -> None:
+        """Add shots with the given flat indices to the weighted sums and the histograms."""
+        points = indices % self.num_points
+        distances = np.linalg.norm(data - self._median[points], axis=-1)
+        weights = 1 / np.maximum(self.eps, distances)
+        for i in range(2):
+            self._weighted_sum[:, i] += np.bincount(
+                points, weights * data[:, i], minlength=self.num_points
+            )
+        self._weight_sum += np.bincount(points, weights, minlength=self.num_points)
+
+        with np.errstate(divide="ignore"):
+            log_distances = np.log10(distances)
+        bins = (log_distances - self._log_min_distance[points]) * (
+            self.num_bins / self.num_decades
+        )
+        bins = np.clip(np.floor(bins) + 1, 0, self.num_bins + 1).astype(np.intp)
+        self._counts += np.bincount(
+            points * (self.num_bins + 2) + bins, minlength=self._counts.size
+        ).reshape(self._counts.shape)
+
+    def median(self) -> np.ndarray:
+        """Get the geometric median with the shape `(*shape, 2)`."""
+        if self._median is None:
+            return geometric_median(self._buffered(), ftol=self.ftol, eps=self.eps)
+        return self._median.reshape(*self.shape, 2)
+
+    def mad(self) -> np.ndarray:
+        """Get the median absolute deviation from the geometric median with the shape `shape`."""
+        if self._median is None:
+            shots = self._buffered()
+            distances = np.linalg.norm(shots - self.median(), axis=-1)
+            return np.median(distances, axis=0)
+
+        # find the bin containing the median and interpolate linearly within it
+        cumulative = np.cumsum(self._counts, axis=1)
+        half = cumulative[:, -1] / 2
+        bins = np.argmax(cumulative >= half[:, np.newaxis], axis=1)
+        below = np.take_along_axis(cumulative, bins[:, np.newaxis], axis=1)[:, 0]
+        counts = self._counts[np.arange(self.num_points), bins]
+        fraction = 1 - (below - half) / np.maximum(counts, 1)
+        bin_width = self.num_decades / self.num_bins
+        lower = 10 ** (self._log_min_distance + (bins - 1) * bin_width)
+        upper = 10 ** (self._log_min_distance + bins * bin_width)
+        # the outlier bins extend down to zero and have no upper edge
+        lower = np.where(bins == 0, 0, lower)
+        upper = np.where(bins == self.num_bins + 1, lower, upper)
+        mad = lower + fraction * (upper - lower)
+        return mad.reshape(self.shape)
+
+    def _buffered(self) -> np.ndarray:
+        """Get the warmup shots consumed so far with the shape `(num_shots, *shape, 2)`."""
+        return self._warmup[: self.num_values].reshape(-1, *self.shape, 2)
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+
+class StreamingHistogram:
+    """Accumulate 2D histograms of shots which arrive in chunks.
+
+    The shots of a sweep are consumed in the order they are read out, and only the
+    counts of each point are kept. As in `np.histogram2d`, the bins include their
+    lower edge, the last bins also include their upper edge, and the shots outside
+    of the edges are not counted.
+
+    Parameters
+    ----------
+    shape : Sequence[int]
+        The shape of the points of one shot, excluding the I/Q axis,
+        e.g. the hardware loop counts followed by the number of readouts per shot.
+    i_edges : Sequence[float]
+        The monotonically increasing bin edges of I.
+    q_edges : Sequence[float]
+        The monotonically increasing bin edges of Q.
+    """
+
+    def __init__(
+        self,
+        shape: Sequence[int],
+        i_edges: Sequence[float],
+        q_edges: Sequence[float],
+    ) -> None:
+        self.shape = tuple(shape)
+        self.num_points = math.prod(self.shape)
+        self.i_edges = np.asarray(i_edges, dtype=float)
+        self.q_edges = np.asarray(q_edges, dtype=float)
+        self.num_i_bins = len(self.i_edges) - 1
+        self.num_q_bins = len(self.q_edges) - 1
+        assert self.num_i_bins > 0
+        assert self.num_q_bins > 0
+        # number of shots of all points consumed so far, including those outside the bins
+        self.num_values = 0
+        self._counts = np.zeros(
+            self.num_points * self.num_i_bins * self.num_q_bins, dtype=np.int64
+        )
+
+    @property
+    def counts(self) -> np.ndarray:
+        """The counts with the shape `(*shape, number of I bins, number of Q bins)`."""
+        return self._counts.reshape(*self.shape, self.num_i_bins, self.num_q_bins)
+
+    def update(self, data: np.ndarray) -> None:
+        """Count the next shots.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            The I/Q values in the last axis. The other axes are flattened in C order
+            and continue where the previous chunk ended. When all points have been
+            consumed, the next shots start again from the first point.
+        """
+        data = np.reshape(data, (-1, 2))
+        points = np.arange(self.num_values, self.num_values + len(data))
+        points %= self.num_points
+        self.num_values += len(data)
+        i_bins = _bin_indices(self.i_edges, data[:, 0])
+        q_bins = _bin_indices(self.q_edges, data[:, 1])
+        inside = (i_bins >= 0) & (i_bins < self.num_i_bins)
+        inside &= (q_bins >= 0) & (q_bins < self.num_q_bins)
+        indices = (points * self.num_i_bins + i_bins) * self.num_q_bins + q_bins
+        indices = indices[inside]
+        if indices.size == 0:
+            return
+        # only count over the range of bins of the points in this chunk
+        start = indices.min()
+        stop = indices.max() + 1
+        self._counts[start:stop] += np.bincount(indices - start, minlength=stop - start)
+
+
+def bin_centers(edges: Sequence[float]) -> np.ndarray:
+    """Get the centers of the bins with the given edges."""
+    edges = np.asarray(edges, dtype=float)
+    return (edges[1:] + edges[:-1]) / 2
+
+
+def _bin_indices(edges: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Get the index of the bin of each value, -1 or len(edges) - 1 if outside."""
+    indices = np.searchsorted(edges, values, side="right") - 1
+    # the last bin includes its upper edge
+    indices[values == edges[-1]] = len(edges) - 2
+    return indices
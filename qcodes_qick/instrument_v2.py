@@ -1,7 +1,21 @@
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
+import contextlib
+import copy
+import functools
 import itertools
-from collections.abc import Sequence
+import json
+import math
+import queue
+import sys
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import TYPE_CHECKING, Callable, Literal
 
@@ -12,9 +26,16 @@ import qick.qick_asm
 from qcodes import ChannelTuple, Instrument, ManualParameter, Measurement, Parameter
 from qcodes.instrument import InstrumentModule
 from qcodes.validators import Enum, Ints
-from qick.asm_v2 import MultiplexedGenManager, QickProgramV2, StandardGenManager
+from qick.asm_v2 import (
+    MultiplexedGenManager,
+    QickParam,
+    QickProgramV2,
+    QickSweep1D,
+    StandardGenManager,
+)
 from qick.pyro import make_proxy
-from tqdm.contrib.itertools import product as tqdm_product
+from qick.qick_asm import QickConfig
+from tqdm.auto import tqdm
 
 from qcodes_qick.channels_v2 import (
     AdcChannel,
@@ -22,13 +43,23 @@ from qcodes_qick.channels_v2 import (
     MultiplexedDacChannel,
     StandardDacChannel,
 )
-from qcodes_qick.geometric_median import geometric_median
+from qcodes_qick.classifiers_v2 import StateClassifier
+from qcodes_qick.envelope_base_v2 import DacEnvelope, EnvelopeMemory
+from qcodes_qick.geometric_median import StreamingGeometricMedian, geometric_median
+from qcodes_qick.histogram import StreamingHistogram, bin_centers
+from qcodes_qick.iq import iq_to_complex
 from qcodes_qick.macro_base_v2 import Macro
+from qcodes_qick.metrics_v2 import MeteredSoc, PointMetrics, RunMetrics
 from qcodes_qick.parameters_v2 import SweepableParameter
 from qcodes_qick.programs_v2 import AveragerProgram
 
 if TYPE_CHECKING:
+    from concurrent.futures import Future
+
     from qcodes.dataset.measurements import DataSaver
+    from qcodes.instrument import InstrumentBase
+
+    from qcodes_qick.shot_store import ShotStore
 
 
 class SoftwareSweep:
@@ -61,21 +92,107 @@ class SoftwareSweep:
         if skip_last:
             self.values = self.values[:-1]
 
+    def is_hardware_sweepable(self, qick_instrument: QickInstrument) -> bool:
+        """Check whether this sweep can be replaced by a hardware loop.
+
+        This requires all parameters to be SweepableParameters of `qick_instrument`
+        which are not already swept, and the values to be evenly spaced.
+
+        Parameters
+        ----------
+        qick_instrument : QickInstrument
+            The instrument which would run the hardware loop.
+        """
+        for parameter in self.parameters:
+            if not isinstance(parameter, SweepableParameter):
+                return False
+            if parameter.qick_instrument is not qick_instrument:
+                return False
+            if parameter in qick_instrument.swept_params:
+                return False
+        if len(self.values) < 2:
+            return False
+        steps = np.diff(self.values)
+        return steps[0] != 0 and bool(np.allclose(steps, steps[0], rtol=1e-9, atol=0))
+
+
+# SQLite does not wait for the lock of a database which another connection writes to
+# in a transaction, so the runs on different threads take turns to access the datasets
+_DATABASE_LOCK = threading.RLock()
+
+
+class RunCancelledError(Exception):
+    """Raised by `QickInstrument.run()` when the run is cancelled with `cancel_run()`."""
+
 
 class QickInstrument(Instrument):
+    """QCoDeS instrument for a QICK board with a tProc v2.
+
+    Parameters
+    ----------
+    ns_host : str | None
+        IP address or hostname of the Pyro4 nameserver.
+        None for working offline from `soccfg_path`.
+    ns_port : int
+        Port of the Pyro4 nameserver.
+    name : str
+        Name of the instrument.
+    soccfg_path : str | Path, optional
+        A JSON file in which the board configuration is cached. If the file exists,
+        the instrument is created from it without connecting to the board, and
+        the connection is only made when the board is first used. Programs can be
+        compiled offline in this way. If the file does not exist, the configuration
+        is written to it after connecting to the board.
+    soc : QickConfig, optional
+        A QickSoc to use instead of connecting to the nameserver, such as
+        a `SimulatedQickSoc`. `ns_host` and `soccfg_path` are then ignored.
+    """
+
     def __init__(
-        self, ns_host: str, ns_port=8888, name="QickInstrument", **kwargs
+        self,
+        ns_host: str | None,
+        ns_port=8888,
+        name="QickInstrument",
+        soccfg_path: str | Path | None = None,
+        soc: QickConfig | None = None,
+        **kwargs,
     ) -> None:
         super().__init__(name, **kwargs)
 
+        self.ns_host = ns_host
+        self.ns_port = ns_port
+        self.soccfg_path = None if soccfg_path is None else Path(soccfg_path)
+
         # Use the IP address and port of the Pyro4 nameserver to get:
         #   soc: Pyro4.Proxy pointing to the QickSoc object on the board
         #   soccfg: QickConfig containing the current configuration of the board
-        self.soc, self.soccfg = make_proxy(ns_host, ns_port)
+        self._soc = soc
+        if soc is not None:
+            self.soccfg = QickConfig(soc.get_cfg())
+        elif self.soccfg_path is not None and self.soccfg_path.exists():
+            self.soccfg = QickConfig(str(self.soccfg_path))
+        else:
+            self._soc, self.soccfg = make_proxy(ns_host, ns_port)
+            if self.soccfg_path is not None:
+                self.soccfg.dump_cfg(self.soccfg_path)
 
         # set of all parameters which have been assigned a QickSweep object
         self.swept_params: set[SweepableParameter] = set()
 
+        # compiled programs keyed by `program_fingerprint()`, least recently used first
+        self.program_cache: OrderedDict[tuple, _CachedProgram] = OrderedDict()
+
+        # the program whose DAC, ADC and envelope configuration is currently on the board
+        self.loaded_program: AveragerProgram | None = None
+        # the envelopes which are resident in the envelope memories of the board
+        self.envelope_memory = EnvelopeMemory()
+        # where the time went during the last call of run()
+        self.last_run_metrics: RunMetrics | None = None
+        # set by cancel_run() to stop the current call of run()
+        self._run_cancelled = threading.Event()
+        # the other instruments of the pool of the current call of run()
+        self._run_pool: Sequence[QickInstrument] = ()
+
         assert len(self.soccfg["tprocs"]) == 1
         tproc_type = self.soccfg["tprocs"][0]["type"]
         if tproc_type != "qick_processor":
@@ -162,6 +279,27 @@ class QickInstrument(Instrument):
             initial_value=1e-6,
             min_value=0,
         )
+        self.program_cache_size = ManualParameter(
+            name="program_cache_size",
+            instrument=self,
+            label="Number of compiled programs to keep for reuse",
+            vals=Ints(min_value=0),
+            initial_value=8,
+        )
+        self.max_buffered_reads = ManualParameter(
+            name="max_buffered_reads",
+            instrument=self,
+            label="Number of readouts per point above which the shots are reduced as they are read out instead of being buffered",
+            vals=Ints(min_value=0),
+            initial_value=2**24,
+        )
+        self.max_pending_writes = ManualParameter(
+            name="max_pending_writes",
+            instrument=self,
+            label="Number of points whose results can wait to be added to the dataset before the acquisition waits for them",
+            vals=Ints(min_value=1),
+            initial_value=8,
+        )
 
     def append_counter_to_macro_name(self, name: str) -> str:
         """Append a number to a macro name to make it unique within the program."""
@@ -188,6 +326,145 @@ class QickInstrument(Instrument):
         )
         self.add_submodule("macro_list", self.macro_list)
 
+    def program_fingerprint(
+        self, hardware_loop_counts: dict[str, int]
+    ) -> tuple[tuple, list[SweepableParameter]]:
+        """Summarize everything that goes into compiling the program.
+
+        Two programs with the same fingerprint are identical, so a compiled program can be reused.
+
+        Parameters
+        ----------
+        hardware_loop_counts : dict[str, int]
+            The hardware loops of the program.
+
+        Returns
+        -------
+        fingerprint : tuple
+            A hashable summary of the macro list, the parameters of this instrument which are read by `AveragerProgram`, the parameters of the objects used by the macros, and the hardware loops.
+        sweepable_parameters : list[SweepableParameter]
+            The SweepableParameters which went into the fingerprint.
+        """
+        # the other parameters of this instrument, e.g. soft_avgs, do not affect the program
+        parameters: list[tuple[str, Parameter]] = [
+            (self.full_name, parameter)
+            for parameter in [
+                self.hard_avgs,
+                self.final_delay,
+                self.final_wait,
+                self.initial_delay,
+            ]
+        ]
+        # every object whose parameters may affect the compiled program
+        modules: dict[str, InstrumentBase] = {}
+        for macro in self.macro_list:
+            modules[macro.full_name] = macro
+            for module in [*macro.dacs, *macro.adcs, *macro.envelopes, *macro.pulses]:
+                modules[module.full_name] = module
+                for tone in getattr(module, "tones", ()):
+                    modules[tone.full_name] = tone
+        for full_name, module in modules.items():
+            parameters.extend(
+                (full_name, parameter) for parameter in module.parameters.values()
+            )
+
+        sweepable_parameters = []
+        values = []
+        for full_name, parameter in parameters:
+            if isinstance(parameter, SweepableParameter):
+                value = parameter.qick_param
+                sweepable_parameters.append(parameter)
+            else:
+                value = parameter.cache.get(get_if_invalid=False)
+            values.append((full_name, parameter.short_name, _hashable(value)))
+
+        fingerprint = (
+            tuple(macro.full_name for macro in self.macro_list),
+            tuple(values),
+            tuple(hardware_loop_counts.items()),
+        )
+        return fingerprint, sweepable_parameters
+
+    def get_program(
+        self,
+        hardware_loop_counts: dict[str, int],
+        metrics: PointMetrics | None = None,
+    ) -> AveragerProgram:
+        """Get the compiled program for the current settings.
+
+        The program is taken from `program_cache` if a program with the same fingerprint has been compiled before.
+
+        Parameters
+        ----------
+        hardware_loop_counts : dict[str, int]
+            The hardware loops of the program.
+        metrics : PointMetrics, optional
+            Where the build and assembler times are recorded.
+        """
+        start = time.perf_counter()
+        key, sweepable_parameters = self.program_fingerprint(hardware_loop_counts)
+        cached = self.program_cache.get(key)
+        cache_hit = cached is not None
+        if cached is None:
+            program = AveragerProgram(self, dict(hardware_loop_counts))
+            cached = _CachedProgram(program, sweepable_parameters)
+            self.program_cache[key] = cached
+        else:
+            cached.restore_qick_params()
+        if metrics is not None:
+            metrics.program_cache_hit = cache_hit
+            if not cache_hit:
+                metrics.assemble_time = cached.program.assemble_time
+            metrics.build_time = time.perf_counter() - start - metrics.assemble_time
+        self.program_cache.move_to_end(key)
+        while len(self.program_cache) > self.program_cache_size.get():
+            self.program_cache.popitem(last=False)
+        return cached.program
+
+    def clear_program_cache(self) -> None:
+        """Forget all compiled programs."""
+        self.program_cache.clear()
+
+    @property
+    def soc(self):
+        """Pyro4.Proxy pointing to the QickSoc object on the board.
+
+        Connects to the board if this has not been done yet.
+        """
+        if self._soc is None:
+            self.connect()
+        return self._soc
+
+    def connect(self) -> None:
+        """Connect to the board.
+
+        The board configuration must be the same as the one this instrument
+        was created with. If it is not, the cache in `soccfg_path` is updated
+        and an error is raised.
+        """
+        if self.ns_host is None:
+            msg = "Cannot connect to the board, because `ns_host` is None."
+            raise RuntimeError(msg)
+        soc, soccfg = make_proxy(self.ns_host, self.ns_port)
+        if soccfg.dump_cfg() != self.soccfg.dump_cfg():
+            msg = "The board configuration has changed."
+            if self.soccfg_path is not None:
+                soccfg.dump_cfg(self.soccfg_path)
+                msg += f" The cache in {self.soccfg_path} has been updated."
+            msg += " Please create the QickInstrument again."
+            raise RuntimeError(msg)
+        self._soc = soc
+
+    def invalidate_board_state(self) -> None:
+        """Forget what has been loaded onto the board.
+
+        The next program will be loaded from scratch, including all envelopes.
+        Call this if the board has been configured by something else than this
+        QickInstrument.
+        """
+        self.loaded_program = None
+        self.envelope_memory.invalidate()
+
     def get_idn(self) -> dict[str, str | None]:
         return {
             "vendor": "Xilinx",
@@ -207,12 +484,106 @@ class QickInstrument(Instrument):
             "accumulated shots",
             "ddr4",
             "decimated",
+            "histogram",
             "state population",
         ] = "accumulated",
         num_states: int = 0,
         state_classifier: Callable[[np.ndarray], np.ndarray] | None = None,
+        histogram_bins: tuple[Sequence[float], Sequence[float]] | None = None,
         save_shots_as_npy: bool = False,
+        save_shots: bool = False,
+        iq_dtype: Literal["complex128", "complex64"] = "complex128",
+        promote_software_sweeps: bool = False,
+        save_metrics: bool = False,
+        partial_results_every: int = 0,
+        progress_callback: Callable[[int, int], None] | None = None,
+        before_each_point: Callable[[], None] | None = None,
+        pool: Sequence[QickInstrument] = (),
     ) -> int:
+        """Run the measurement and save the results.
+
+        If a point has more readouts than `max_buffered_reads` (`hard_avgs` times the
+        loop counts times the readouts per shot), the shots are reduced chunk by chunk
+        as the board sends them, unless the shots are saved. In the
+        "accumulated" mode, only the sums of each point are kept. In the
+        "state population" mode, the shots of each chunk are classified and counted.
+        In the "accumulated shots" mode, every shot is saved, so the shots are still
+        buffered but with the int32 of the board instead of int64. In these cases the
+        dataset is identical to the one of a single buffered acquisition. In the
+        "accumulated geometric median" mode, the shots are consumed by a
+        `StreamingGeometricMedian`, so the median and the MAD are estimates, whereas
+        they are exact for the points which are buffered.
+
+        In the "histogram" mode, the shots are counted in the 2D bins of I and Q with
+        the edges `histogram_bins`, in the units of the "accumulated shots" mode.
+        The shots are counted as they are read out, over all `soft_avgs` rounds,
+        and only the counts of each point are saved.
+
+        In the "state population" mode, `state_classifier` may be a `StateClassifier`.
+        Then `num_states` defaults to its number of states, and its calibration is
+        saved as JSON in the metadata "qick_state_classifier" of the dataset.
+
+        If `save_shots` is True, the accumulated I and Q of every shot are saved in
+        the `ShotStore` "<run_id>_shots.h5" next to the database, whose file name is
+        saved in the metadata "qick_shots" of the dataset. The shots of each point
+        are written as soon as it is processed. `save_shots_as_npy` is deprecated:
+        it saves the shots of each point and readout in a separate .npy file in the
+        folder "<run_id>_shots" instead, which is slow for long sweeps.
+
+        The I/Q results with hardware loops, shots or time axes are saved as
+        `iq_dtype`. "complex64" halves the size of the dataset in the "accumulated
+        shots", "decimated" and "ddr4" modes, rounding the values to about 7
+        significant digits. To keep the accumulated I and Q of every shot exactly, as
+        int32 pairs, save them with `save_shots` instead. The "shot" setpoints are
+        saved with the smallest integer dtype which holds `hard_avgs`.
+
+        If `promote_software_sweeps` is True, the innermost software sweeps which
+        can be run as hardware loops (see `SoftwareSweep.is_hardware_sweepable`) are
+        executed as additional tProc loops. The results are saved point by point,
+        so the dataset has the same parameters and shape as with the software
+        sweeps. However, the saved values of the promoted parameters are the values
+        played by the tProc loop, whose step is truncated to the hardware
+        resolution. So they drift from the requested values by up to one resolution
+        step per point, whereas the values of a software sweep are each rounded to
+        the resolution. E.g. a frequency sweep from 100 to 137 MHz in 7 points ends
+        at 136.999998 MHz instead of 136.9999997 MHz.
+
+        Where the time went is recorded in `last_run_metrics`. If `save_metrics` is
+        True, it is also saved as JSON in the metadata "qick_metrics" of the dataset.
+
+        If `partial_results_every` is positive, the results of the "accumulated" and
+        "histogram" modes so far are also saved after every `partial_results_every`
+        of the `soft_avgs` rounds, so that they can be plotted live and are not lost
+        if the run fails. They are saved as the parameters with the suffix "_partial"
+        and the additional setpoint "round", the number of rounds they include.
+        The final results are saved exactly as without partial results.
+
+        The results are added to the dataset on a background thread, so that the
+        acquisition of the next point does not wait for the database. If the results
+        of `max_pending_writes` points are waiting to be added, the acquisition waits
+        until one of them has been added. When the run ends, even with an error, the
+        results of all the points acquired so far are added before `run()` returns.
+
+        `progress_callback` is called with the number of software sweep points
+        saved so far and the total number of points, after each point is saved,
+        on the thread which adds the results to the dataset.
+        `before_each_point` is called before each point is acquired, e.g. to start
+        the points of several boards together, see `run_on_boards()`.
+
+        If `pool` contains other QickInstruments, configured with the same macros and
+        hardware sweeps as this one, the software sweep points are distributed over this
+        instrument and the pool. Each board takes the next point to measure as soon as
+        it starts to acquire its previous point, so that it compiles the next point
+        meanwhile, and faster boards measure more points. The results are saved in the
+        same order as without a pool. Only the parameters of this instrument can be
+        swept; the equivalent parameters of the other instruments, with the same names
+        relative to their instrument, are set.
+
+        The run can be stopped from another thread with `cancel_run()`, which raises
+        `RunCancelledError`. As for any other error, the tProc is then stopped and the
+        points saved so far are kept in the dataset. See `run_async()` to run from
+        `asyncio`.
+        """
         if len(self.macro_list) == 0:
             msg = (
                 "`macro_list` is empty. Please define the sequence with"
@@ -227,10 +598,49 @@ class QickInstrument(Instrument):
         ]:
             assert self.soft_avgs.get() == 1
         if acquisition_mode == "state population":
+            if num_states == 0 and isinstance(state_classifier, StateClassifier):
+                num_states = state_classifier.num_states
             assert num_states >= 2
             assert state_classifier is not None
+        if acquisition_mode == "histogram":
+            if histogram_bins is None:
+                msg = 'The "histogram" acquisition mode requires `histogram_bins`.'
+                raise ValueError(msg)
+            if save_shots or save_shots_as_npy:
+                msg = 'The "histogram" acquisition mode does not keep the shots.'
+                raise ValueError(msg)
+        if iq_dtype not in ["complex128", "complex64"]:
+            msg = f'`iq_dtype` must be "complex128" or "complex64", not {iq_dtype!r}.'
+            raise ValueError(msg)
+        if partial_results_every > 0 and acquisition_mode not in [
+            "accumulated",
+            "histogram",
+        ]:
+            msg = 'Partial results are only saved in the "accumulated" and "histogram" acquisition modes.'
+            raise ValueError(msg)
+        if len(pool) > 0:
+            if self in pool or len(set(map(id, pool))) != len(pool):
+                msg = "The instruments of the pool must be distinct from each other and from this instrument."
+                raise ValueError(msg)
+            if partial_results_every > 0:
+                msg = "Partial results cannot be saved when the points are distributed over a pool."
+                raise ValueError(msg)
+            for sweep in software_sweeps:
+                for parameter in sweep.parameters:
+                    if parameter.root_instrument is not self:
+                        msg = f"{parameter.full_name} cannot be swept on a pool, only the parameters of {self.name} can."
+                        raise ValueError(msg)
+        if save_shots_as_npy:
+            warnings.warn(
+                "`save_shots_as_npy` is deprecated, use `save_shots` instead.",
+                DeprecationWarning,
+                stacklevel=2,
+            )
         if hardware_loop_counts is None:
             hardware_loop_counts = {}
+        metrics = RunMetrics(acquisition_mode)
+        self.last_run_metrics = metrics
+        start = time.perf_counter()
         if len(hardware_loop_counts) == 0 and acquisition_mode in [
             "accumulated",
             "accumulated geometric median",
@@ -270,6 +680,15 @@ class QickInstrument(Instrument):
                     setpoints.append(parameter)
                     meas.register_parameter(parameter, paramtype=paramtype)
 
+        # register the I and Q axes of the histograms if necessary
+        histogram_axes: list[tuple[Parameter, np.ndarray]] = []
+        if acquisition_mode == "histogram":
+            for name, edges in zip(["i", "q"], histogram_bins):
+                parameter = Parameter(name, label=name.upper(), unit="")
+                setpoints.append(parameter)
+                meas.register_parameter(parameter, paramtype=paramtype)
+                histogram_axes.append((parameter, np.asarray(edges, dtype=float)))
+
         # register the time axis if necessary
         if acquisition_mode in ["decimated", "ddr4"]:
             time_parameter = Parameter("time", label="Time", unit="sec")
@@ -278,8 +697,31 @@ class QickInstrument(Instrument):
         else:
             time_parameter = None
 
-        # generate the program just to obtain the ADC channel numbers and the number of readouts per shot
-        program = AveragerProgram(self, hardware_loop_counts)
+        # replace the innermost software sweeps by hardware loops
+        # which run outside the user-defined hardware loops
+        promoted_sweeps: list[SoftwareSweep] = []
+        if promote_software_sweeps and acquisition_mode not in ["ddr4", "decimated"]:
+            promoted_params = set()
+            for sweep in reversed(software_sweeps):
+                if not sweep.is_hardware_sweepable(self):
+                    break
+                if not promoted_params.isdisjoint(sweep.parameters):
+                    break
+                promoted_params.update(sweep.parameters)
+                promoted_sweeps.insert(0, sweep)
+        remaining_sweeps = software_sweeps[
+            : len(software_sweeps) - len(promoted_sweeps)
+        ]
+        promoted_loop_counts = {}
+        for i, sweep in enumerate(promoted_sweeps, start=len(remaining_sweeps)):
+            loop = f"software_sweep_{i}"
+            assert loop not in hardware_loop_counts
+            promoted_loop_counts[loop] = len(sweep.values)
+            for parameter in sweep.parameters:
+                parameter.set(QickSweep1D(loop, sweep.values[0], sweep.values[-1]))
+
+        # get the program to obtain the ADC channel numbers and the number of readouts per shot
+        program = self.get_program({**promoted_loop_counts, **hardware_loop_counts})
         adc_channel_nums = program.ro_chs.keys()
         reads_per_shot = [ro["trigs"] for ro in program.ro_chs.values()]
         assert len(adc_channel_nums) == len(reads_per_shot)
@@ -305,7 +747,7 @@ class QickInstrument(Instrument):
         else:
             for i, channel_num in enumerate(adc_channel_nums):
                 for readout_num in range(reads_per_shot[i]):
-                    name = "iq"
+                    name = "histogram" if acquisition_mode == "histogram" else "iq"
                     if reads_per_shot[i] > 1:
                         name += f"{readout_num}"
                     if len(adc_channel_nums) > 1:
@@ -322,184 +764,938 @@ class QickInstrument(Instrument):
                         mad_parameter = Parameter(name + "_mad")
                         result_parameters.append(mad_parameter)
                         meas.register_parameter(
-                            mad_parameter, setpoints, paramtype=paramtype_iq
+                            mad_parameter, setpoints, paramtype=paramtype
                         )
 
+        # register the running averages or counts saved after some of the rounds
+        round_parameter = Parameter("round", label="Round", unit="")
+        partial_parameters = []
+        if partial_results_every > 0:
+            meas.register_parameter(round_parameter, paramtype=paramtype)
+            for parameter in result_parameters:
+                partial_parameter = Parameter(parameter.name + "_partial")
+                partial_parameters.append(partial_parameter)
+                meas.register_parameter(
+                    partial_parameter,
+                    [*setpoints, round_parameter],
+                    paramtype=paramtype_iq,
+                )
+
         self.snapshot(update=True)
 
-        with meas.run() as datasaver:
-            if len(software_sweeps) == 0:
-                self._run_hardware_loops(
-                    datasaver,
+        remaining_sweep_ranges = [
+            range(len(sweep.values)) for sweep in remaining_sweeps
+        ]
+        all_indices = list(itertools.product(*remaining_sweep_ranges))
+        num_reads = (
+            self.hard_avgs.get()
+            * math.prod(promoted_loop_counts.values())
+            * math.prod(hardware_loop_counts.values())
+            * sum(reads_per_shot)
+        )
+        stream = (
+            not (save_shots or save_shots_as_npy)
+            and acquisition_mode
+            in [
+                "accumulated",
+                "accumulated geometric median",
+                "accumulated shots",
+                "state population",
+            ]
+            and num_reads > self.max_buffered_reads.get()
+        )
+        compiler = ThreadPoolExecutor(max_workers=1)
+        processor = ThreadPoolExecutor(max_workers=1)
+        shot_store = None
+        # the results are added to the dataset on a background thread,
+        # so that the acquisition does not wait for the database
+        writer = _DatasetWriter(meas, self.max_pending_writes.get())
+        try:
+            datasaver = writer.start()
+            if save_shots:
+                # h5py is slow to import, so only import it when it is needed
+                from qcodes_qick.shot_store import ShotStore  # noqa: PLC0415
+
+                path_to_db = Path(datasaver.dataset.path_to_db)
+                shot_store = ShotStore.create(
+                    path_to_db.parent / f"{datasaver.run_id}_shots.h5",
+                    [
+                        (sweep.parameters[0].full_name, sweep.values)
+                        for sweep in software_sweeps
+                    ],
+                )
+                writer.submit(
+                    functools.partial(
+                        _add_metadata, tag="qick_shots", metadata=shot_store.path.name
+                    )
+                )
+            elif save_shots_as_npy:
+                path_to_db = Path(datasaver.dataset.path_to_db)
+                shot_store = _NpyShotDirectory(
+                    path_to_db.parent / f"{datasaver.run_id}_shots"
+                )
+
+            metrics.run_id = datasaver.run_id
+            if acquisition_mode == "state population" and isinstance(
+                state_classifier, StateClassifier
+            ):
+                writer.submit(
+                    functools.partial(
+                        _add_metadata,
+                        tag="qick_state_classifier",
+                        metadata=json.dumps(state_classifier.snapshot()),
+                    )
+                )
+            if len(pool) > 0:
+                self._run_sharded(
+                    pool,
+                    writer,
+                    metrics,
                     software_sweeps,
-                    shot_parameter,
+                    promoted_loop_counts,
                     hardware_loop_counts,
+                    shot_parameter,
                     hardware_sweep_parameters,
+                    histogram_axes,
                     time_parameter,
                     result_parameters,
                     acquisition_mode,
+                    stream,
                     num_states,
                     state_classifier,
-                    save_shots_as_npy,
-                    software_sweep_indices=(),
-                    progress=True,
+                    iq_dtype,
+                    shot_store,
+                    all_indices,
+                    progress_callback,
+                    before_each_point,
                 )
             else:
-                software_sweep_ranges = [
-                    range(len(sweep.values)) for sweep in software_sweeps
-                ]
-                for indices in tqdm_product(*software_sweep_ranges):
-                    # update the software sweep parameters
-                    for sweep, index in zip(software_sweeps, indices):
-                        for parameter in sweep.parameters:
-                            parameter.set(sweep.values[index])
-
-                    self._run_hardware_loops(
-                        datasaver,
-                        software_sweeps,
-                        shot_parameter,
+                # Pipeline the software sweep: while point N is acquired, point N+1
+                # is compiled and the results of point N-1 are processed.
+                # The results are added to the dataset in order by the writer.
+                next_point = compiler.submit(
+                    self._prepare_point,
+                    software_sweeps,
+                    promoted_loop_counts,
+                    hardware_loop_counts,
+                    shot_parameter,
+                    hardware_sweep_parameters,
+                    histogram_axes,
+                    acquisition_mode,
+                    all_indices[0],
+                )
+                for i in tqdm(range(len(all_indices)), disable=len(all_indices) == 1):
+                    point = next_point.result()
+                    _raise_if_cancelled(self._run_cancelled)
+                    if i + 1 < len(all_indices):
+                        next_point = compiler.submit(
+                            self._prepare_point,
+                            software_sweeps,
+                            promoted_loop_counts,
+                            hardware_loop_counts,
+                            shot_parameter,
+                            hardware_sweep_parameters,
+                            histogram_axes,
+                            acquisition_mode,
+                            all_indices[i + 1],
+                        )
+                    if before_each_point is not None:
+                        before_each_point()
+                    self._acquire_point(
+                        point,
                         hardware_loop_counts,
-                        hardware_sweep_parameters,
-                        time_parameter,
-                        result_parameters,
                         acquisition_mode,
+                        stream,
                         num_states,
                         state_classifier,
-                        save_shots_as_npy,
-                        software_sweep_indices=indices,
-                        progress=False,
+                        progress=len(all_indices) == 1,
+                        round_callback=functools.partial(
+                            self._write_partial_results,
+                            writer,
+                            point,
+                            promoted_loop_counts,
+                            round_parameter,
+                            partial_parameters,
+                            acquisition_mode,
+                            iq_dtype,
+                            partial_results_every,
+                        )
+                        if partial_results_every > 0
+                        else None,
                     )
+                    writer.submit(
+                        functools.partial(
+                            self._write_point,
+                            metrics=metrics,
+                            point=point,
+                            processed=processor.submit(
+                                self._process_point,
+                                point,
+                                promoted_loop_counts,
+                                time_parameter,
+                                result_parameters,
+                                acquisition_mode,
+                                num_states,
+                                state_classifier,
+                                iq_dtype,
+                                shot_store,
+                            ),
+                            progress_callback=progress_callback,
+                            num_points=len(all_indices),
+                        )
+                    )
+            writer.flush()
+            metrics.total_time = time.perf_counter() - start
+            if save_metrics:
+                writer.submit(
+                    functools.partial(
+                        _add_metadata,
+                        tag="qick_metrics",
+                        metadata=json.dumps(metrics.as_dict()),
+                    )
+                )
+        except BaseException:
+            # stop the program, which may be in the middle of a round,
+            # without hiding the original error if the board cannot be reached
+            with contextlib.suppress(Exception):
+                self.soc.stop_tproc()
+            # keep the results of the points which have been processed
+            writer.close(sys.exc_info())
+            raise
+        else:
+            writer.close()
+        finally:
+            compiler.shutdown()
+            processor.shutdown()
+            # the cancellation has stopped this run, so it must not stop the next one
+            self._run_cancelled.clear()
+            if shot_store is not None:
+                shot_store.close()
+            # leave the promoted parameters at the last value, as a software sweep would
+            for sweep in promoted_sweeps:
+                for parameter in sweep.parameters:
+                    parameter.set(sweep.values[-1])
 
         return datasaver.run_id
 
-    def _run_hardware_loops(
+    def _run_sharded(
         self,
-        datasaver: DataSaver,
+        pool: Sequence[QickInstrument],
+        writer: _DatasetWriter,
+        metrics: RunMetrics,
         software_sweeps: Sequence[SoftwareSweep],
+        promoted_loop_counts: dict[str, int],
+        hardware_loop_counts: dict[str, int],
         shot_parameter: Parameter | None,
+        hardware_sweep_parameters: Sequence[SweepableParameter],
+        histogram_axes: Sequence[tuple[Parameter, np.ndarray]],
+        time_parameter: Parameter | None,
+        result_parameters: Sequence[Parameter],
+        acquisition_mode: str,
+        stream: bool,
+        num_states: int,
+        state_classifier: Callable[[np.ndarray], np.ndarray] | None,
+        iq_dtype: str,
+        shot_store: ShotStore | _NpyShotDirectory | None,
+        all_indices: Sequence[Sequence[int]],
+        progress_callback: Callable[[int, int], None] | None,
+        before_each_point: Callable[[], None] | None,
+    ) -> None:
+        """Measure the software sweep points on this instrument and the pool concurrently.
+
+        Each instrument measures points with `_measure_shard` on its own thread.
+        The results are added to the dataset in order by the writer.
+        """
+        instruments = [self, *pool]
+        promoted_sweeps = software_sweeps[
+            len(software_sweeps) - len(promoted_loop_counts) :
+        ]
+        queue = _PointQueue(all_indices)
+        workers = ThreadPoolExecutor(max_workers=len(instruments))
+        # Forget the cancellations of the earlier runs of the pool, before the
+        # cancellations of this run are passed on to it.
+        for instrument in pool:
+            instrument._run_cancelled.clear()  # noqa: SLF001
+        self._run_pool = pool
+        try:
+            for instrument in instruments:
+                # find the parameters of the instrument which are set instead of ours
+                to_primary: dict[Parameter, Parameter] = {}
+                sweeps = []
+                for sweep in software_sweeps:
+                    parameters = []
+                    for parameter in sweep.parameters:
+                        equivalent = _equivalent_parameter(parameter, instrument)
+                        to_primary[equivalent] = parameter
+                        parameters.append(equivalent)
+                    sweeps.append(SoftwareSweep(parameters, sweep.values))
+                sweep_parameters = []
+                for parameter in hardware_sweep_parameters:
+                    equivalent = _equivalent_parameter(parameter, instrument)
+                    to_primary[equivalent] = parameter
+                    sweep_parameters.append(equivalent)
+                for loop, sweep in zip(promoted_loop_counts, promoted_sweeps):
+                    for parameter in sweep.parameters:
+                        _equivalent_parameter(parameter, instrument).set(
+                            QickSweep1D(loop, sweep.values[0], sweep.values[-1])
+                        )
+                workers.submit(
+                    instrument._measure_shard,  # noqa: SLF001
+                    queue,
+                    sweeps,
+                    promoted_loop_counts,
+                    hardware_loop_counts,
+                    shot_parameter,
+                    sweep_parameters,
+                    histogram_axes,
+                    time_parameter,
+                    result_parameters,
+                    acquisition_mode,
+                    stream,
+                    num_states,
+                    state_classifier,
+                    iq_dtype,
+                    shot_store,
+                    before_each_point,
+                    to_primary,
+                )
+
+            for i in tqdm(range(len(all_indices)), disable=len(all_indices) == 1):
+                # wait for the results of the point, which raises if it failed
+                queue.processed[i].result()
+                writer.submit(
+                    functools.partial(
+                        self._write_point,
+                        metrics=metrics,
+                        point=queue.points[i],
+                        processed=queue.processed[i],
+                        progress_callback=progress_callback,
+                        num_points=len(all_indices),
+                    )
+                )
+            # raise the errors of the writer before the instruments are stopped
+            writer.flush()
+        except BaseException:
+            queue.close()
+            for instrument in instruments:
+                instrument.cancel_run()
+            raise
+        finally:
+            workers.shutdown()
+            self._run_pool = ()
+            for instrument in pool:
+                instrument._run_cancelled.clear()  # noqa: SLF001
+            # Leave the parameters at the last value, as a software sweep would,
+            # instead of the last point measured by each instrument. The promoted
+            # parameters of this instrument are left by run().
+            for instrument in instruments:
+                for sweep in software_sweeps[
+                    : len(software_sweeps) - len(promoted_sweeps)
+                ]:
+                    for parameter in sweep.parameters:
+                        _equivalent_parameter(parameter, instrument).set(
+                            sweep.values[-1]
+                        )
+            for instrument in pool:
+                for sweep in promoted_sweeps:
+                    for parameter in sweep.parameters:
+                        _equivalent_parameter(parameter, instrument).set(
+                            sweep.values[-1]
+                        )
+
+    def _measure_shard(
+        self,
+        queue: _PointQueue,
+        software_sweeps: Sequence[SoftwareSweep],
+        promoted_loop_counts: dict[str, int],
         hardware_loop_counts: dict[str, int],
+        shot_parameter: Parameter | None,
         hardware_sweep_parameters: Sequence[SweepableParameter],
+        histogram_axes: Sequence[tuple[Parameter, np.ndarray]],
         time_parameter: Parameter | None,
         result_parameters: Sequence[Parameter],
-        acquisition_mode: Literal[
-            "accumulated",
-            "accumulated geometric median",
-            "accumulated shots",
-            "ddr4",
-            "decimated",
-            "state population",
-        ],
+        acquisition_mode: str,
+        stream: bool,
         num_states: int,
         state_classifier: Callable[[np.ndarray], np.ndarray] | None,
-        save_shots_as_npy: bool,
+        iq_dtype: str,
+        shot_store: ShotStore | _NpyShotDirectory | None,
+        before_each_point: Callable[[], None] | None,
+        to_primary: dict[Parameter, Parameter],
+    ) -> None:
+        """Measure the points taken from the queue until there are none left.
+
+        This runs on a worker thread of `_run_sharded` for each instrument of the pool.
+        As in `run()`, the next point is compiled and the previous one is processed
+        while a point is acquired, so each instrument holds the next point while it
+        measures the current one. The results are given as the parameters of the
+        primary instrument with `to_primary`, which maps the parameters of this
+        instrument to them.
+        """
+        compiler = ThreadPoolExecutor(max_workers=1)
+        processor = ThreadPoolExecutor(max_workers=1)
+
+        def prepare(i: int) -> _SweepPoint:
+            return self._prepare_point(
+                software_sweeps,
+                promoted_loop_counts,
+                hardware_loop_counts,
+                shot_parameter,
+                hardware_sweep_parameters,
+                histogram_axes,
+                acquisition_mode,
+                queue.indices[i],
+            )
+
+        def process(i: int, point: _SweepPoint) -> None:
+            try:
+                results = self._process_point(
+                    point,
+                    promoted_loop_counts,
+                    time_parameter,
+                    result_parameters,
+                    acquisition_mode,
+                    num_states,
+                    state_classifier,
+                    iq_dtype,
+                    shot_store,
+                )
+            except BaseException as error:  # noqa: BLE001
+                # raised on the primary thread when it gets to this point
+                queue.processed[i].set_exception(error)
+                return
+            queue.processed[i].set_result(
+                [
+                    [
+                        (to_primary.get(parameter, parameter), value)
+                        for parameter, value in result
+                    ]
+                    for result in results
+                ]
+            )
+
+        try:
+            i = queue.take()
+            if i is not None:
+                next_point = compiler.submit(prepare, i)
+            while i is not None:
+                next_i = None
+                try:
+                    point = next_point.result()
+                    _raise_if_cancelled(self._run_cancelled)
+                    next_i = queue.take()
+                    if next_i is not None:
+                        next_point = compiler.submit(prepare, next_i)
+                    if before_each_point is not None:
+                        before_each_point()
+                    self._acquire_point(
+                        point,
+                        hardware_loop_counts,
+                        acquisition_mode,
+                        stream,
+                        num_states,
+                        state_classifier,
+                        progress=False,
+                    )
+                except BaseException as error:  # noqa: BLE001
+                    # raised on the primary thread when it gets to this point
+                    with contextlib.suppress(Exception):
+                        self.soc.stop_tproc()
+                    queue.processed[i].set_exception(error)
+                    if next_i is not None:
+                        queue.processed[next_i].set_exception(error)
+                    return
+                queue.points[i] = point
+                processor.submit(process, i, point)
+                i = next_i
+        finally:
+            compiler.shutdown()
+            processor.shutdown()
+
+    async def run_async(
+        self,
+        meas: Measurement,
+        *args: object,
+        progress_callback: Callable[[int, int], None] | None = None,
+        **kwargs,
+    ) -> int:
+        """Run the measurement with `run()` on a worker thread.
+
+        The event loop keeps running while the program is compiled, acquired and
+        saved, so other instruments or other boards can be driven meanwhile.
+        `progress_callback` is called on the event loop, as described in `run()`.
+        If the awaiting task is cancelled, the run is cancelled with `cancel_run()`,
+        which stops the tProc and keeps the points saved so far, and
+        `asyncio.CancelledError` is raised once the worker thread has finished.
+
+        Parameters
+        ----------
+        meas : Measurement
+            The measurement to run.
+        *args
+            Passed to `run()`.
+        progress_callback : Callable[[int, int], None], optional
+            Called with the number of points saved so far and the total number of points.
+        **kwargs
+            Passed to `run()`.
+
+        Returns
+        -------
+        int
+            The run ID of the dataset.
+        """
+        loop = asyncio.get_running_loop()
+
+        def report_progress(num_saved: int, num_points: int) -> None:
+            if progress_callback is not None:
+                loop.call_soon_threadsafe(progress_callback, num_saved, num_points)
+
+        # forget the cancellations of earlier runs, but not the ones which arrive
+        # before the worker thread has started this run
+        self._run_cancelled.clear()
+        future = loop.run_in_executor(
+            None,
+            functools.partial(
+                self.run, meas, *args, progress_callback=report_progress, **kwargs
+            ),
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self.cancel_run()
+            try:
+                with contextlib.suppress(RunCancelledError):
+                    await future
+            finally:
+                # the run may have finished before it was cancelled
+                self._run_cancelled.clear()
+            raise
+
+    def cancel_run(self) -> None:
+        """Stop the current call of `run()`, which raises `RunCancelledError`.
+
+        This can be called from any thread. The run stops at the next transfer of
+        data from the board or between two software sweep points, also on the
+        instruments of its pool. If `run()` has not started yet, e.g. while
+        `run_async()` waits for a worker thread, it stops before its first point.
+        """
+        self._run_cancelled.set()
+        for instrument in self._run_pool:
+            instrument.cancel_run()
+
+    def _prepare_point(
+        self,
+        software_sweeps: Sequence[SoftwareSweep],
+        promoted_loop_counts: dict[str, int],
+        hardware_loop_counts: dict[str, int],
+        shot_parameter: Parameter | None,
+        hardware_sweep_parameters: Sequence[SweepableParameter],
+        histogram_axes: Sequence[tuple[Parameter, np.ndarray]],
+        acquisition_mode: str,
         software_sweep_indices: Sequence[int],
+    ) -> _SweepPoint:
+        """Set the parameters of this instrument and compile the program for a point.
+
+        This runs on a worker thread while the previous point is acquired.
+        Parameters of other instruments are set later by `_acquire_point`,
+        so that they do not change during the acquisition of the previous point.
+        Everything needed to acquire and save the point is captured here.
+        """
+        remaining_sweeps = software_sweeps[
+            : len(software_sweeps) - len(promoted_loop_counts)
+        ]
+        point = _SweepPoint(software_sweep_indices)
+
+        # update the software sweep parameters
+        for sweep, index in zip(remaining_sweeps, software_sweep_indices):
+            for parameter in sweep.parameters:
+                if parameter.root_instrument is self:
+                    parameter.set(sweep.values[index])
+                else:
+                    point.external_settings.append((parameter, sweep.values[index]))
+
+        point.program = self.get_program(
+            {**promoted_loop_counts, **hardware_loop_counts}, point.metrics
+        )
+
+        # get the values rounded to the hardware resolution by the compilation
+        for sweep in remaining_sweeps:
+            if sweep.parameters[0].root_instrument is self:
+                point.software_values.append(
+                    (sweep.parameters[0], sweep.parameters[0].get())
+                )
+            else:
+                point.software_values.append((sweep.parameters[0], None))
+        point.rounds = self.soft_avgs.get()
+        point.hard_avgs = self.hard_avgs.get()
+        point.ddr4_channel = self.ddr4_buffer.selected_adc_channel.get()
+        point.ddr4_num_transfers = self.ddr4_buffer.num_transfers.get()
+
+        # Add the shot axis to the result if necessary
+        if acquisition_mode == "accumulated shots":
+            shape = (point.hard_avgs, *hardware_loop_counts.values())
+            values = np.arange(
+                point.hard_avgs, dtype=_smallest_int_dtype(point.hard_avgs - 1)
+            )
+            for _ in range(len(hardware_loop_counts)):
+                values = values[..., np.newaxis]
+            values = np.broadcast_to(values, shape)
+            point.param_values.append((shot_parameter, values))
+        elif acquisition_mode == "histogram":
+            point.histogram_edges = [edges for _, edges in histogram_axes]
+            num_bins = [len(edges) - 1 for edges in point.histogram_edges]
+            shape = (*hardware_loop_counts.values(), *num_bins)
+        else:
+            shape = tuple(hardware_loop_counts.values())
+        point.result_shape = shape
+
+        # Add hardware sweep parameters to the result
+        for parameter in hardware_sweep_parameters:
+            values = _get_actual_values(parameter, hardware_loop_counts)
+            if acquisition_mode == "histogram":
+                values = np.reshape(values, (*np.shape(values), 1, 1))
+            values = np.broadcast_to(values, shape)
+            point.param_values.append((parameter, values))
+
+        # Add the bin centers of the histograms to the result
+        for axis, (parameter, edges) in enumerate(histogram_axes):
+            values = bin_centers(edges).reshape((-1,) + (1,) * (1 - axis))
+            values = np.broadcast_to(values, shape)
+            point.param_values.append((parameter, values))
+
+        # Add the values of the promoted software sweeps
+        promoted_sweeps = software_sweeps[len(remaining_sweeps) :]
+        for sweep, (loop, count) in zip(promoted_sweeps, promoted_loop_counts.items()):
+            values = _get_actual_values(sweep.parameters[0], {loop: count})
+            point.promoted_values.append((sweep.parameters[0], values))
+
+        return point
+
+    def _acquire_point(
+        self,
+        point: _SweepPoint,
+        hardware_loop_counts: dict[str, int],
+        acquisition_mode: str,
+        stream: bool,
+        num_states: int,
+        state_classifier: Callable[[np.ndarray], np.ndarray] | None,
         progress: bool,
-    ):
+        round_callback: Callable[[int], None] | None = None,
+    ) -> None:
+        """Set the parameters of other instruments and acquire the data of a point.
+
+        In the "accumulated" and "histogram" modes, `round_callback` is called with the
+        number of completed rounds after each of the `soft_avgs` rounds.
+
+        If `stream` is True, the shots are reduced while they are read out instead of
+        being buffered, as described in `run()`. In the "histogram" mode, the shots are
+        always counted while they are read out, see `StreamingHistogram`.
+        """
+        for parameter, value in point.external_settings:
+            parameter.set(value)
+        for i, (parameter, _) in enumerate(point.software_values):
+            if parameter.root_instrument is not self:
+                point.software_values[i] = (parameter, parameter.get())
+
         if acquisition_mode == "ddr4":
-            self.ddr4_buffer.arm()
+            # arm with the settings of this point, not those of the point being prepared
+            self.soc.arm_ddr4(point.ddr4_channel, point.ddr4_num_transfers)
 
         # run the program
-        program = AveragerProgram(self, hardware_loop_counts)
+        program = point.program
+        soc = MeteredSoc(_CancellableSoc(self.soc, self._run_cancelled), point.metrics)
         reads_per_shot = [ro["trigs"] for ro in program.ro_chs.values()]
         if acquisition_mode == "decimated":
             all_iq = qick.qick_asm.AcquireMixin.acquire_decimated(
                 self=program,
-                soc=self.soc,
-                rounds=self.soft_avgs.get(),
+                soc=soc,
+                rounds=point.rounds,
                 progress=progress,
             )
             for channel_index in range(len(reads_per_shot)):
                 channel_iq = all_iq[channel_index]
                 length = len(program.get_time_axis(channel_index))
                 all_iq[channel_index] = channel_iq.reshape(
-                    self.hard_avgs.get(), -1, reads_per_shot[channel_index], length, 2
+                    point.hard_avgs, -1, reads_per_shot[channel_index], length, 2
                 )
                 if len(hardware_loop_counts) == 0:
                     all_iq[channel_index] = all_iq[channel_index][:, 0, :, :, :]
+        elif acquisition_mode == "histogram":
+            point.histograms = [
+                StreamingHistogram(
+                    (*program.loop_dims[1:], nreads), *point.histogram_edges
+                )
+                for nreads in reads_per_shot
+            ]
+            program.stream_accumulated(
+                soc,
+                _update_each(point.histograms),
+                rounds=point.rounds,
+                progress=progress,
+                round_callback=round_callback,
+            )
+            all_iq = []
+        elif stream and acquisition_mode == "accumulated geometric median":
+            point.geometric_medians = [
+                StreamingGeometricMedian((*program.loop_dims[1:], nreads))
+                for nreads in reads_per_shot
+            ]
+            program.stream_accumulated(
+                soc,
+                _update_each(point.geometric_medians),
+                progress=progress,
+            )
+            all_iq = []
+        elif stream and acquisition_mode == "accumulated":
+            all_iq = program.acquire_streamed(
+                soc,
+                rounds=point.rounds,
+                progress=progress,
+                round_callback=round_callback,
+            )
+        elif stream and acquisition_mode == "accumulated shots":
+            program.acquire_shots(soc, progress=progress)
+            all_iq = []
+        elif stream and acquisition_mode == "state population":
+            sweep_shape = tuple(program.loop_dims[1:])
+            num_points = math.prod(sweep_shape)
+            num_readouts = sum(reads_per_shot)
+            population = np.zeros(num_points * num_states**num_readouts, dtype=int)
+
+            def count_states(
+                first_shot: int, num_shots: int, data: Sequence[np.ndarray]
+            ) -> None:
+                points = np.arange(first_shot, first_shot + num_shots) % num_points
+                iqs = (
+                    iq_to_complex(
+                        channel_data.reshape(num_shots, nreads, 2)[:, readout_num]
+                    )
+                    for channel_data, nreads in zip(data, reads_per_shot)
+                    for readout_num in range(nreads)
+                )
+                population[:] += _count_states(
+                    points, iqs, num_points, num_readouts, num_states, state_classifier
+                )
+
+            program.stream_accumulated(soc, count_states, progress=progress)
+            point.population = population.reshape(*sweep_shape, -1)
+            all_iq = []
+        elif acquisition_mode == "accumulated" and round_callback is not None:
+            all_iq = program.acquire_rounds(
+                soc,
+                rounds=point.rounds,
+                progress=progress,
+                round_callback=round_callback,
+            )
         else:
             all_iq = qick.qick_asm.AcquireMixin.acquire(
                 self=program,
-                soc=self.soc,
-                rounds=self.soft_avgs.get(),
+                soc=soc,
+                rounds=point.rounds,
                 progress=progress,
             )
+        point.metrics.load_time = program.load_time
+        point.all_iq = all_iq
+        # the program may be reused for the next point, which replaces its buffers
+        point.acc_buf = program.acc_buf
 
-        param_values = []
+        if acquisition_mode == "ddr4":
+            point.ddr4_iq = soc.get_ddr4(point.ddr4_num_transfers)
 
-        # Add software sweep paramters to the result
-        for sweep in software_sweeps:
-            param_values.append((sweep.parameters[0], sweep.parameters[0].get()))
+    def _process_point(
+        self,
+        point: _SweepPoint,
+        promoted_loop_counts: dict[str, int],
+        time_parameter: Parameter | None,
+        result_parameters: Sequence[Parameter],
+        acquisition_mode: str,
+        num_states: int,
+        state_classifier: Callable[[np.ndarray], np.ndarray] | None,
+        iq_dtype: str,
+        shot_store: ShotStore | _NpyShotDirectory | None,
+    ) -> list[list[tuple[Parameter, np.ndarray]]]:
+        """Compute the results of a point to be added to the dataset.
 
-        # Add the shot axis to the result if necessary
-        if acquisition_mode == "accumulated shots":
-            shape = (self.hard_avgs.get(), *hardware_loop_counts.values())
-            values = np.arange(self.hard_avgs.get())
-            for _ in range(len(hardware_loop_counts)):
-                values = values[..., np.newaxis]
-            values = np.broadcast_to(values, shape)
-            param_values.append((shot_parameter, values))
-        else:
-            shape = hardware_loop_counts.values()
+        This runs on a worker thread while the next point is acquired.
+        """
+        start = time.perf_counter()
+        results = []
+        geometric_medians = [
+            (estimator.median(), estimator.mad())
+            for estimator in point.geometric_medians
+        ]
+        histograms = [histogram.counts for histogram in point.histograms]
+        if acquisition_mode == "state population":
+            population = point.population
+            if population is None:
+                population = self._count_state_population(
+                    point, num_states, state_classifier
+                )
+        # The promoted software sweeps are the outermost hardware loops.
+        # Split the data along them and save each point as a software sweep would.
+        for promoted_indices in np.ndindex(*promoted_loop_counts.values()):
+            index = (slice(None), *promoted_indices)
+            if len(promoted_loop_counts) > 0:
+                all_iq = [iq[index] for iq in point.all_iq]
+            else:
+                all_iq = point.all_iq
+            acc_buf = [buf[index] for buf in point.acc_buf]
+            point_geometric_medians = [
+                (median[promoted_indices], mad[promoted_indices])
+                for median, mad in geometric_medians
+            ]
+            point_histograms = [counts[promoted_indices] for counts in histograms]
 
-        # Add hardware sweep parameters to the result
-        for parameter in hardware_sweep_parameters:
-            sweep = parameter.qick_param
-            assert isinstance(sweep, qick.asm_v2.QickParam)
-            values = sweep.get_actual_values(hardware_loop_counts)
-            values = np.broadcast_to(values, shape)
-            param_values.append((parameter, values))
+            param_values = [
+                *point.software_values,
+                *(
+                    (parameter, values[i])
+                    for (parameter, values), i in zip(
+                        point.promoted_values, promoted_indices
+                    )
+                ),
+                *point.param_values,
+            ]
+            if acquisition_mode == "state population":
+                results += self._process_results_state_population(
+                    param_values,
+                    population[promoted_indices],
+                    result_parameters,
+                )
+            else:
+                results += self._process_results(
+                    all_iq,
+                    param_values,
+                    point,
+                    acc_buf,
+                    point_geometric_medians,
+                    point_histograms,
+                    time_parameter,
+                    result_parameters,
+                    acquisition_mode,
+                )
 
-        # save the results
-        if acquisition_mode == "state population":
-            self._save_results_state_population(
-                param_values,
-                program,
-                datasaver,
-                result_parameters,
-                num_states,
-                state_classifier,
-            )
+            if shot_store is not None:
+                self._save_shots(
+                    point.program,
+                    acc_buf,
+                    shot_store,
+                    (*point.software_sweep_indices, *promoted_indices),
+                )
+        if iq_dtype != "complex128":
+            results = [
+                [
+                    (parameter, values.astype(iq_dtype))
+                    if np.iscomplexobj(values) and np.ndim(values) > 0
+                    else (parameter, values)
+                    for parameter, values in result
+                ]
+                for result in results
+            ]
+        point.metrics.reduction_time = time.perf_counter() - start
+        return _merge_results(results)
+
+    def _write_partial_results(
+        self,
+        writer: _DatasetWriter,
+        point: _SweepPoint,
+        promoted_loop_counts: dict[str, int],
+        round_parameter: Parameter,
+        partial_parameters: Sequence[Parameter],
+        acquisition_mode: str,
+        iq_dtype: str,
+        partial_results_every: int,
+        num_rounds: int,
+    ) -> None:
+        """Add the results of the rounds of a point completed so far to the dataset.
+
+        This runs on the main thread between two rounds of the acquisition.
+        """
+        if num_rounds % partial_results_every != 0:
+            return
+        partial = copy.copy(point)
+        partial.metrics = PointMetrics(point.software_sweep_indices)
+        if acquisition_mode == "accumulated":
+            partial.all_iq = point.program.rounds_average()
+        if point.result_shape == ():
+            rounds = num_rounds
         else:
-            self._save_results(
-                all_iq,
-                param_values,
-                program,
-                datasaver,
-                time_parameter,
-                result_parameters,
-                acquisition_mode,
-            )
+            rounds = np.full(point.result_shape, num_rounds)
+        partial.param_values = [*point.param_values, (round_parameter, rounds)]
+        results = self._process_point(
+            partial,
+            promoted_loop_counts,
+            None,
+            partial_parameters,
+            acquisition_mode,
+            0,
+            None,
+            iq_dtype,
+            None,
+        )
+        # The results may be views of the histograms, which the next rounds update
+        # before the writer gets to them. Flush, so that the partial results can be
+        # plotted while the point is acquired.
+        results = [
+            [(parameter, np.copy(value)) for parameter, value in result]
+            for result in results
+        ]
+        writer.submit(functools.partial(_add_results, results=results, flush=True))
 
-        if save_shots_as_npy:
-            path = (
-                Path(datasaver.dataset.path_to_db).parent / f"{datasaver.run_id}_shots"
-            )
-            path.mkdir(exist_ok=True)
-            reads_per_shot = [ro["trigs"] for ro in program.ro_chs.values()]
-            for channel_index in range(len(reads_per_shot)):
-                channel_num = list(program.ro_chs.keys())[channel_index]
-                for readout_num in range(reads_per_shot[channel_index]):
-                    shots = program.acc_buf[channel_index][..., readout_num, :].dot(
-                        [1, 1j]
-                    )
-                    name = ""
-                    if len(software_sweep_indices) > 0:
-                        name += "sweep_"
-                        for index in software_sweep_indices:
-                            name += f"{index}_"
-                    name += "iq"
-                    if reads_per_shot[channel_index] > 1:
-                        name += f"{readout_num}"
-                    if len(reads_per_shot) > 1:
-                        name += f"_ch{channel_num}"
-                    np.save(path / name, shots)
+    def _write_point(
+        self,
+        datasaver: DataSaver,
+        metrics: RunMetrics,
+        point: _SweepPoint,
+        processed: Future[list[list[tuple[Parameter, np.ndarray]]]],
+        progress_callback: Callable[[int, int], None] | None = None,
+        num_points: int = 0,
+    ) -> None:
+        """Add the results of a point to the dataset and report the progress.
 
-    def _save_results(
+        This runs on the thread of the `_DatasetWriter`.
+        """
+        results = processed.result()
+        start = time.perf_counter()
+        _add_results(datasaver, results)
+        point.metrics.write_time = time.perf_counter() - start
+        metrics.points.append(point.metrics)
+        if progress_callback is not None:
+            progress_callback(len(metrics.points), num_points)
+
+    def _save_shots(
+        self,
+        program: AveragerProgram,
+        acc_buf: Sequence[np.ndarray],
+        shot_store: ShotStore | _NpyShotDirectory,
+        software_sweep_indices: Sequence[int],
+    ) -> None:
+        reads_per_shot = [ro["trigs"] for ro in program.ro_chs.values()]
+        for channel_index in range(len(reads_per_shot)):
+            channel_num = list(program.ro_chs.keys())[channel_index]
+            for readout_num in range(reads_per_shot[channel_index]):
+                name = "iq"
+                if reads_per_shot[channel_index] > 1:
+                    name += f"{readout_num}"
+                if len(reads_per_shot) > 1:
+                    name += f"_ch{channel_num}"
+                shot_store.write(
+                    name,
+                    software_sweep_indices,
+                    acc_buf[channel_index][..., readout_num, :],
+                    scale=1 / program.ro_chs[channel_num]["length"],
+                )
+        # a point whose readouts have not all been written is not marked
+        shot_store.mark_written(software_sweep_indices)
+
+    def _process_results(
         self,
         all_iq: Sequence[np.ndarray],
         param_values: Sequence[tuple[Parameter, np.ndarray]],
-        program: AveragerProgram,
-        datasaver: DataSaver,
+        point: _SweepPoint,
+        acc_buf: Sequence[np.ndarray],
+        geometric_medians: Sequence[tuple[np.ndarray, np.ndarray]],
+        histograms: Sequence[np.ndarray],
         time_parameter: Parameter | None,
         result_parameters: Sequence[Parameter],
         acquisition_mode: Literal[
@@ -508,109 +1704,132 @@ class QickInstrument(Instrument):
             "accumulated shots",
             "ddr4",
             "decimated",
+            "histogram",
         ],
-    ) -> None:
-        ddr4_channel = self.ddr4_buffer.selected_adc_channel.get()
-        ddr4_num_transfers = self.ddr4_buffer.num_transfers.get()
-
+    ) -> list[list[tuple[Parameter, np.ndarray]]]:
+        program = point.program
         reads_per_shot = [ro["trigs"] for ro in program.ro_chs.values()]
+        results = []
         result_index = 0
         for channel_index in range(len(reads_per_shot)):
-            channel_iq = all_iq[channel_index]
             channel_num = list(program.ro_chs.keys())[channel_index]
             for readout_num in range(reads_per_shot[channel_index]):
                 # Add acquired data to the result
                 if acquisition_mode == "accumulated":
-                    iq = channel_iq[readout_num, ...].dot([1, 1j])
+                    iq = iq_to_complex(all_iq[channel_index][readout_num, ...])
                     if iq.shape == (1,):
                         iq = iq[0]
-                    datasaver.add_result(
-                        *param_values, (result_parameters[result_index], iq)
+                    results.append(
+                        [*param_values, (result_parameters[result_index], iq)]
                     )
                     result_index += 1
                 elif acquisition_mode == "accumulated geometric median":
-                    # Calculate the geometric median of the single-shot data
-                    iq = program.acc_buf[channel_index][..., readout_num, :]
-                    gm = geometric_median(iq).dot([1, 1j])
-                    datasaver.add_result(
-                        *param_values, (result_parameters[result_index], gm)
+                    if len(geometric_medians) > 0:
+                        # The geometric median was estimated during the acquisition
+                        median, mad = geometric_medians[channel_index]
+                        gm = iq_to_complex(median[..., readout_num, :])
+                        mad = mad[..., readout_num]
+                    else:
+                        # Calculate the geometric median of the single-shot data
+                        iq = acc_buf[channel_index][..., readout_num, :]
+                        gm = iq_to_complex(geometric_median(iq))
+                        # Also calculate the median absolute deviation from the geometric mean
+                        mad = np.median(abs(iq_to_complex(iq) - gm), axis=0)
+                    results.append(
+                        [*param_values, (result_parameters[result_index], gm)]
                     )
                     result_index += 1
-                    # Also calculate the median absolute deviation from the geometric mean
-                    mad = np.median(abs(iq.dot([1, 1j]) - gm), axis=0)
-                    datasaver.add_result(
-                        *param_values, (result_parameters[result_index], mad)
+                    results.append(
+                        [*param_values, (result_parameters[result_index], mad)]
                     )
                     result_index += 1
                 elif acquisition_mode == "accumulated shots":
                     # Accumulate over readout window and save single-shot data
-                    iq = program.acc_buf[channel_index][..., readout_num, :].dot(
-                        [1, 1j]
+                    iq = iq_to_complex(acc_buf[channel_index][..., readout_num, :])
+                    results.append(
+                        [*param_values, (result_parameters[result_index], iq)]
                     )
-                    datasaver.add_result(
-                        *param_values, (result_parameters[result_index], iq)
+                    result_index += 1
+                elif acquisition_mode == "histogram":
+                    # Save the counts of the shots in each bin
+                    counts = histograms[channel_index][..., readout_num, :, :]
+                    results.append(
+                        [*param_values, (result_parameters[result_index], counts)]
                     )
                     result_index += 1
                 elif acquisition_mode == "decimated":
                     # Save acquired waveform averaged over shots
                     assert time_parameter is not None
                     time = program.get_time_axis(channel_index) / 1e6
-                    iq = channel_iq[..., readout_num, :, :].mean(axis=0).dot([1, 1j])
-                    datasaver.add_result(
-                        *param_values,
-                        (time_parameter, time),
-                        (result_parameters[result_index], iq),
+                    iq = all_iq[channel_index][..., readout_num, :, :]
+                    iq = iq_to_complex(iq.mean(axis=0))
+                    results.append(
+                        [
+                            *param_values,
+                            (time_parameter, time),
+                            (result_parameters[result_index], iq),
+                        ]
                     )
                     result_index += 1
                 elif acquisition_mode == "ddr4":
-                    if channel_num == ddr4_channel:
+                    if channel_num == point.ddr4_channel:
                         assert time_parameter is not None
-                        iq = self.soc.get_ddr4(ddr4_num_transfers).dot([1, 1j])
-                        time = program.get_time_axis_ddr4(ddr4_channel, iq) / 1e6
-                        datasaver.add_result(
-                            *param_values,
-                            (time_parameter, time),
-                            (result_parameters[result_index], iq),
+                        iq = iq_to_complex(point.ddr4_iq)
+                        time = program.get_time_axis_ddr4(point.ddr4_channel, iq) / 1e6
+                        results.append(
+                            [
+                                *param_values,
+                                (time_parameter, time),
+                                (result_parameters[result_index], iq),
+                            ]
                         )
                         result_index += 1
                 else:
                     raise NotImplementedError
+        return results
 
-    def _save_results_state_population(
+    def _process_results_state_population(
         self,
         param_values: Sequence[tuple[Parameter, np.ndarray]],
-        program: AveragerProgram,
-        datasaver: DataSaver,
+        population: np.ndarray,
         result_parameters: Sequence[Parameter],
-        num_states: int,
-        state_classifier: Callable[[np.ndarray], np.ndarray] | None,
-    ) -> None:
-        reads_per_shot = [ro["trigs"] for ro in program.ro_chs.values()]
-        num_readouts = sum(reads_per_shot)
-        hard_avgs = self.hard_avgs.get()
-        sweep_shape = program.acc_buf[0].shape[1:-2]
+    ) -> list[list[tuple[Parameter, np.ndarray]]]:
+        return [
+            [*param_values, (parameter, population[..., i])]
+            for i, parameter in enumerate(result_parameters)
+        ]
 
-        classified = np.empty((hard_avgs, *sweep_shape, num_readouts), dtype=int)
-        readout_index = 0
-        for channel_index in range(len(reads_per_shot)):
-            for readout_num in range(reads_per_shot[channel_index]):
-                iq = program.acc_buf[channel_index][..., readout_num, :].dot([1, 1j])
-                classified[..., readout_index] = state_classifier(iq)
-                readout_index += 1
-
-        population = np.zeros(sweep_shape + num_readouts * (num_states,), dtype=int)
-        for sweep_index in np.ndindex(sweep_shape):
-            index = (slice(None), *sweep_index, Ellipsis)
-            states, counts = np.unique(classified[index], return_counts=True, axis=0)
-            for state, count in zip(states, counts):
-                population[sweep_index + tuple(state)] = count
-
-        population = population.reshape(*sweep_shape, -1)
-        for i, parameter in enumerate(result_parameters):
-            datasaver.add_result(*param_values, (parameter, population[..., i]))
+    def _count_state_population(
+        self,
+        point: _SweepPoint,
+        num_states: int,
+        state_classifier: Callable[[np.ndarray], np.ndarray],
+    ) -> np.ndarray:
+        """Count the buffered shots of each combination of states at each point."""
+        reads_per_shot = [ro["trigs"] for ro in point.program.ro_chs.values()]
+        shots_shape = point.acc_buf[0].shape[:-2]
+        sweep_shape = shots_shape[1:]
+        num_points = math.prod(sweep_shape)
+        points = np.broadcast_to(
+            np.arange(num_points).reshape(sweep_shape), shots_shape
+        )
+        iqs = (
+            iq_to_complex(point.acc_buf[channel_index][..., readout_num, :])
+            for channel_index in range(len(reads_per_shot))
+            for readout_num in range(reads_per_shot[channel_index])
+        )
+        population = _count_states(
+            points,
+            iqs,
+            num_points,
+            sum(reads_per_shot),
+            num_states,
+            state_classifier,
+        )
+        return population.reshape(*sweep_shape, -1)
 
     def run_without_saving(self, progress: bool = False) -> dict[str, complex]:
-        program = AveragerProgram(self, hardware_loop_counts={})
+        program = self.get_program(hardware_loop_counts={})
         reads_per_shot = [ro["trigs"] for ro in program.ro_chs.values()]
         assert sum(reads_per_shot) > 0
         all_iq = qick.qick_asm.AcquireMixin.acquire(
@@ -623,7 +1842,7 @@ class QickInstrument(Instrument):
         for channel_index in range(len(reads_per_shot)):
             channel_num = list(program.ro_chs.keys())[channel_index]
             for readout_num in range(reads_per_shot[channel_index]):
-                iq = all_iq[channel_index][readout_num, ...].dot([1, 1j])
+                iq = iq_to_complex(all_iq[channel_index][readout_num, ...])
                 name = "iq"
                 if reads_per_shot[channel_index] > 1:
                     name += f"{readout_num}"
@@ -633,6 +1852,406 @@ class QickInstrument(Instrument):
         return iqs
 
 
+class _CancellableSoc:
+    """Forwards calls to a QickSoc, raising `RunCancelledError` when a run is cancelled.
+
+    The cancellation is checked whenever the progress of the tProc is polled.
+    """
+
+    def __init__(self, soc, cancelled: threading.Event) -> None:
+        self._soc = soc
+        self._cancelled = cancelled
+
+    def __getattr__(self, name: str):
+        """Forward the other attributes to the QickSoc."""
+        return getattr(self._soc, name)
+
+    def poll_data(self, *args: object, **kwargs) -> list:
+        _raise_if_cancelled(self._cancelled)
+        return self._soc.poll_data(*args, **kwargs)
+
+    def get_tproc_counter(self, *args: object, **kwargs) -> int:
+        _raise_if_cancelled(self._cancelled)
+        return self._soc.get_tproc_counter(*args, **kwargs)
+
+
+class _PointQueue:
+    """The software sweep points of a run distributed over a pool of instruments.
+
+    The points are handed out in order to whichever instrument asks first, so an
+    instrument which is faster, or whose points are shorter, measures more points.
+    """
+
+    def __init__(self, indices: Sequence[Sequence[int]]) -> None:
+        self.indices = indices
+        # the points and their results, set by the instrument which measured them
+        self.points: list[_SweepPoint | None] = [None] * len(indices)
+        self.processed: list[Future[list[list[tuple[Parameter, np.ndarray]]]]] = [
+            concurrent.futures.Future() for _ in indices
+        ]
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def take(self) -> int | None:
+        """Get the index of the next point to measure, or None if there are none left."""
+        with self._lock:
+            if self._next >= len(self.indices):
+                return None
+            self._next += 1
+            return self._next - 1
+
+    def close(self) -> None:
+        """Stop handing out points."""
+        with self._lock:
+            self._next = len(self.indices)
+
+
+class _NpyShotDirectory:
+    """Saves the shots of each point and readout as a separate .npy file.
+
+    The deprecated format of `save_shots_as_npy`, with the interface of `ShotStore`.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.path.mkdir(exist_ok=True)
+
+    def write(
+        self,
+        readout: str,
+        software_sweep_indices: Sequence[int],
+        shots: np.ndarray,
+        scale: float = 1.0,  # noqa: ARG002
+    ) -> None:
+        name = readout
+        if len(software_sweep_indices) > 0:
+            name = "sweep_" + "".join(f"{i}_" for i in software_sweep_indices) + name
+        np.save(self.path / name, iq_to_complex(shots))
+
+    def mark_written(self, software_sweep_indices: Sequence[int]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class _DatasetWriter:
+    """Runs the jobs which write to the dataset of a run in order on a background thread.
+
+    The thread enters and exits `meas.run()` itself, because the SQLite connection
+    of the dataset can only be used by the thread which opened it. Each job is called
+    with the DataSaver. At most `max_pending` jobs wait to be run, and `submit()`
+    blocks beyond that, so that the results do not pile up in memory when the
+    database is slower than the acquisition. Once a job has failed, the remaining
+    jobs are skipped and the error is raised by the next `submit()`, `flush()` or
+    `close()`.
+    """
+
+    def __init__(self, meas: Measurement, max_pending: int) -> None:
+        self._meas = meas
+        self._jobs: queue.Queue[Callable[[DataSaver], None] | None] = queue.Queue(
+            max_pending
+        )
+        self._datasaver: Future[DataSaver] = concurrent.futures.Future()
+        self._exc_info: tuple = (None, None, None)
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> DataSaver:
+        """Start the run, returning its DataSaver once the dataset has been created."""
+        self._thread.start()
+        return self._datasaver.result()
+
+    def submit(self, job: Callable[[DataSaver], None]) -> None:
+        """Queue a job, waiting if `max_pending` jobs are already queued."""
+        self._raise_error()
+        self._jobs.put(job)
+
+    def flush(self) -> None:
+        """Wait until all the jobs submitted so far have been run."""
+        self._jobs.join()
+        self._raise_error()
+
+    def close(self, exc_info: tuple = (None, None, None)) -> None:
+        """Run the remaining jobs and exit the run, failed with `exc_info` if given."""
+        if self._thread.is_alive():
+            self._exc_info = exc_info
+            self._jobs.put(None)
+            self._thread.join()
+        if exc_info[0] is None:
+            self._raise_error()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        runner = self._meas.run()
+        try:
+            with _DATABASE_LOCK:
+                datasaver = runner.__enter__()
+        except BaseException as error:  # noqa: BLE001
+            # raised by start()
+            self._datasaver.set_exception(error)
+            return
+        self._datasaver.set_result(datasaver)
+        while (job := self._jobs.get()) is not None:
+            if self._error is None:
+                try:
+                    job(datasaver)
+                except BaseException as error:  # noqa: BLE001
+                    # raised on the thread of the run
+                    self._error = error
+            self._jobs.task_done()
+        self._jobs.task_done()
+        exc_info = self._exc_info
+        if exc_info[0] is None and self._error is not None:
+            exc_info = (type(self._error), self._error, self._error.__traceback__)
+        try:
+            with _DATABASE_LOCK:
+                runner.__exit__(*exc_info)
+        except BaseException as error:  # noqa: BLE001
+            if self._error is None:
+                self._error = error
+
+
+class _SweepPoint:
+    """Everything needed to acquire and save one point of the software sweeps."""
+
+    def __init__(self, software_sweep_indices: Sequence[int]) -> None:
+        self.software_sweep_indices = software_sweep_indices
+        self.external_settings: list[tuple[Parameter, float]] = []
+        self.software_values: list[tuple[Parameter, float | None]] = []
+        self.promoted_values: list[tuple[Parameter, np.ndarray]] = []
+        self.param_values: list[tuple[Parameter, np.ndarray]] = []
+        self.program: AveragerProgram | None = None
+        self.rounds = 1
+        self.hard_avgs = 1
+        # the shape of the results and their setpoints, excluding the promoted sweeps
+        self.result_shape: tuple[int, ...] = ()
+        self.ddr4_channel = 0
+        self.ddr4_num_transfers = 0
+        self.all_iq: Sequence[np.ndarray] = []
+        self.acc_buf: Sequence[np.ndarray] = []
+        self.geometric_medians: list[StreamingGeometricMedian] = []
+        self.histogram_edges: list[np.ndarray] = []
+        self.histograms: list[StreamingHistogram] = []
+        self.population: np.ndarray | None = None
+        self.ddr4_iq: np.ndarray | None = None
+        self.metrics = PointMetrics(software_sweep_indices)
+
+
+class _CachedProgram:
+    """A compiled program together with the QickParams it was compiled from.
+
+    Compiling links each QickParam to its value rounded to the hardware resolution,
+    which `SweepableParameter.get()` and `QickParam.get_actual_values()` rely on.
+    The links are saved here so that they can be restored when the program is reused.
+    """
+
+    def __init__(
+        self,
+        program: AveragerProgram,
+        sweepable_parameters: Sequence[SweepableParameter],
+    ) -> None:
+        self.program = program
+        self.links = []
+        for parameter in sweepable_parameters:
+            value = parameter.qick_param
+            if isinstance(value, QickParam):
+                self.links.append(
+                    (
+                        parameter,
+                        value,
+                        value.derived_param,
+                        value.conversion_from_derived_param,
+                    )
+                )
+
+    def restore_qick_params(self) -> None:
+        for parameter, value, derived_param, conversion in self.links:
+            parameter.qick_param = value
+            value.derived_param = derived_param
+            value.conversion_from_derived_param = conversion
+
+
+def _get_actual_values(
+    parameter: SweepableParameter, loop_counts: dict[str, int]
+) -> np.ndarray:
+    """Get the values of a swept parameter as played by the compiled program.
+
+    The parameters of envelopes are not rounded to a hardware resolution, since the
+    envelopes of the bank are calculated from the exact sweep points.
+    """
+    sweep = parameter.qick_param
+    assert isinstance(sweep, QickParam)
+    if isinstance(parameter.instrument, DacEnvelope):
+        return sweep.to_array(loop_counts, all_loops=True)
+    return sweep.get_actual_values(loop_counts)
+
+
+def _smallest_int_dtype(max_value: int) -> np.dtype:
+    """Get the smallest signed integer dtype which can hold the values up to `max_value`."""
+    for dtype in [np.int8, np.int16, np.int32]:
+        if max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _equivalent_parameter(
+    parameter: Parameter, instrument: InstrumentBase
+) -> Parameter:
+    """Find the parameter of `instrument` with the same name relative to its instrument as `parameter`."""
+    component = instrument
+    for name in parameter.name_parts[1:-1]:
+        if name in component.submodules:
+            component = component.submodules[name]
+            continue
+        # the channels are submodules of their ChannelTuple only
+        for submodule in component.submodules.values():
+            if isinstance(submodule, ChannelTuple) and hasattr(submodule, name):
+                component = getattr(submodule, name)
+                break
+        else:
+            msg = f"{instrument.name} has no equivalent of {parameter.full_name}."
+            raise ValueError(msg)
+    if parameter.short_name not in component.parameters:
+        msg = f"{instrument.name} has no equivalent of {parameter.full_name}."
+        raise ValueError(msg)
+    return component.parameters[parameter.short_name]
+
+
+def _add_results(
+    datasaver: DataSaver,
+    results: Sequence[Sequence[tuple[Parameter, np.ndarray]]],
+    flush: bool = False,
+) -> None:
+    """Add results to the dataset, optionally writing them to the database immediately."""
+    with _DATABASE_LOCK:
+        for result in results:
+            datasaver.add_result(*result)
+        if flush:
+            datasaver.flush_data_to_database()
+
+
+def _merge_results(
+    results: Sequence[Sequence[tuple[Parameter, np.ndarray]]],
+) -> list[list[tuple[Parameter, np.ndarray]]]:
+    """Merge the consecutive results which have the same setpoints.
+
+    Each result is the setpoints followed by one result parameter. The readouts of
+    a point share their setpoints, so they are added with a single `add_result`
+    call, which converts and validates the setpoints once instead of per readout.
+    """
+    merged: list[list[tuple[Parameter, np.ndarray]]] = []
+    setpoints: Sequence[tuple[Parameter, np.ndarray]] = []
+    for *result_setpoints, result in results:
+        if len(merged) > 0 and _same_setpoints(result_setpoints, setpoints):
+            merged[-1].append(result)
+        else:
+            setpoints = result_setpoints
+            merged.append([*setpoints, result])
+    return merged
+
+
+def _same_setpoints(
+    a: Sequence[tuple[Parameter, np.ndarray]],
+    b: Sequence[tuple[Parameter, np.ndarray]],
+) -> bool:
+    return len(a) == len(b) and all(
+        parameter_a is parameter_b
+        and (values_a is values_b or np.array_equal(values_a, values_b))
+        for (parameter_a, values_a), (parameter_b, values_b) in zip(a, b)
+    )
+
+
+def _add_metadata(datasaver: DataSaver, tag: str, metadata: str) -> None:
+    with _DATABASE_LOCK:
+        datasaver.dataset.add_metadata(tag, metadata)
+
+
+def _raise_if_cancelled(cancelled: threading.Event) -> None:
+    if cancelled.is_set():
+        raise RunCancelledError
+
+
+def _update_each(
+    estimators: Sequence[StreamingGeometricMedian | StreamingHistogram],
+) -> Callable[[int, int, Sequence[np.ndarray]], None]:
+    """Get a consumer for `stream_accumulated` which updates one estimator per readout channel."""
+
+    def update(
+        first_shot: int,  # noqa: ARG001
+        num_shots: int,  # noqa: ARG001
+        data: Sequence[np.ndarray],
+    ) -> None:
+        for estimator, channel_data in zip(estimators, data):
+            estimator.update(channel_data)
+
+    return update
+
+
+def _count_states(
+    points: np.ndarray,
+    iqs: Iterable[np.ndarray],
+    num_points: int,
+    num_readouts: int,
+    num_states: int,
+    state_classifier: Callable[[np.ndarray], np.ndarray],
+) -> np.ndarray:
+    """Count the shots of each combination of states at each point.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        The index of the sweep point of each shot.
+    iqs : Iterable[np.ndarray]
+        The IQ values of each readout of the shots, with the shape of `points`.
+    num_points : int
+        The number of sweep points.
+    num_readouts : int
+        The number of readouts per shot.
+    num_states : int
+        The number of states returned by `state_classifier`.
+    state_classifier : Callable[[np.ndarray], np.ndarray]
+        Maps the IQ values to states.
+
+    Returns
+    -------
+    np.ndarray
+        The counts with the shape (num_points * num_states**num_readouts,),
+        the combination being the fastest varying index.
+    """
+    num_combinations = num_states**num_readouts
+    # Encode the states of all readouts of a shot as the digits of a mixed-radix
+    # number, the first readout being the most significant digit as in
+    # `itertools.product`, and offset it by the sweep point of the shot.
+    # A single bincount then counts the shots of each combination at each point.
+    index_dtype = _smallest_int_dtype(num_points * num_combinations - 1)
+    state_dtype = _smallest_int_dtype(num_states - 1)
+    codes = points.astype(index_dtype, copy=False)
+    for iq in iqs:
+        states = np.asarray(state_classifier(iq))
+        if states.size > 0 and (states.min() < 0 or states.max() >= num_states):
+            msg = f"state_classifier returned states outside of range({num_states})"
+            raise ValueError(msg)
+        codes = codes * index_dtype.type(num_states) + states.astype(state_dtype)
+    return np.bincount(codes.reshape(-1), minlength=num_points * num_combinations)
+
+
+def _hashable(value):
+    """Convert a parameter value to something which can be used in a dict key."""
+    if isinstance(value, QickParam):
+        return (value.start, tuple(value.spans.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(v) for v in value)
+    if isinstance(value, dict):
+        return tuple((k, _hashable(v)) for k, v in value.items())
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, value.tobytes())
+    return value
+
+
 class Ddr4Buffer(InstrumentModule):
     parent: QickInstrument
 
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+def iq_to_complex(iq: np.ndarray) -> np.ndarray:
+    """Convert I and Q on the last axis to complex numbers, as `iq.dot([1, 1j])`.
+
+    If `iq` is float64 with I and Q next to each other in memory, e.g. the averaged
+    data of a readout, it is viewed as complex128 without copying, so the result
+    shares its memory with `iq`. Otherwise, e.g. for the integer accumulated shots,
+    the result is allocated once and filled, without the temporaries of the
+    matrix product.
+
+    Parameters
+    ----------
+    iq : np.ndarray
+        The array with the shape `(..., 2)`.
+
+    Returns
+    -------
+    np.ndarray
+        The complex128 array with the shape `iq.shape[:-1]`.
+    """
+    iq = np.asarray(iq)
+    assert iq.shape[-1] == 2
+    if iq.dtype == np.float64 and iq.strides[-1] == iq.itemsize:
+        return iq.view(np.complex128)[..., 0]
+    result = np.empty(iq.shape[:-1], dtype=np.complex128)
+    result.real = iq[..., 0]
+    result.imag = iq[..., 1]
+    return result
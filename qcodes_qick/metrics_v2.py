@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+
+class PointMetrics:
+    """Where the time went while acquiring one point of the software sweeps.
+
+    All times are in seconds. The points are pipelined, so the program of a point
+    is built while the previous point is acquired, and the results are reduced
+    while the next point is acquired.
+
+    Attributes
+    ----------
+    software_sweep_indices : tuple[int, ...]
+        The index of the point in each software sweep.
+    program_cache_hit : bool
+        Whether the compiled program was taken from `QickInstrument.program_cache`.
+    build_time : float
+        Building the program from the macros, excluding the assembler.
+    assemble_time : float
+        Assembling the program into the binary loaded onto the tProc.
+    load_time : float
+        Loading the program, the envelopes and the configuration onto the board.
+    run_time : float
+        Running the program on the board. The accumulated data is streamed while
+        the program runs, so this includes the transfer of that data.
+    transfer_time : float
+        Transferring the data from the board after the program has run.
+    transfer_bytes : int
+        Size of the data transferred from the board.
+    reduction_time : float
+        Reducing the raw data to the results, e.g. averaging or classifying shots.
+    write_time : float
+        Adding the results to the dataset.
+    """
+
+    TIMES = (
+        "build_time",
+        "assemble_time",
+        "load_time",
+        "run_time",
+        "transfer_time",
+        "reduction_time",
+        "write_time",
+    )
+
+    def __init__(self, software_sweep_indices: Sequence[int] = ()) -> None:
+        self.software_sweep_indices = tuple(software_sweep_indices)
+        self.program_cache_hit = False
+        self.build_time = 0.0
+        self.assemble_time = 0.0
+        self.load_time = 0.0
+        self.run_time = 0.0
+        self.transfer_time = 0.0
+        self.transfer_bytes = 0
+        self.reduction_time = 0.0
+        self.write_time = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        """Get the metrics as a JSON-serializable dict."""
+        return {
+            "software_sweep_indices": list(self.software_sweep_indices),
+            "program_cache_hit": self.program_cache_hit,
+            **{name: getattr(self, name) for name in self.TIMES},
+            "transfer_bytes": self.transfer_bytes,
+        }
+
+
+class RunMetrics:
+    """Where the time went during `QickInstrument.run()`.
+
+    Attributes
+    ----------
+    acquisition_mode : str
+        The acquisition mode of the run.
+    run_id : int | None
+        The run ID of the dataset, once it has been created.
+    start_time : float
+        When the run started, as returned by `time.time()`.
+    total_time : float
+        Wall-clock duration of the run in seconds.
+    points : list[PointMetrics]
+        The metrics of each point of the software sweeps, in the order of acquisition.
+    """
+
+    def __init__(self, acquisition_mode: str) -> None:
+        self.acquisition_mode = acquisition_mode
+        self.run_id: int | None = None
+        self.start_time = time.time()
+        self.total_time = 0.0
+        self.points: list[PointMetrics] = []
+
+    def totals(self) -> dict[str, float]:
+        """Get the sum over all points of each time and of the transferred bytes."""
+        totals = {
+            name: sum(getattr(point, name) for point in self.points)
+            for name in PointMetrics.TIMES
+        }
+        totals["transfer_bytes"] = sum(point.transfer_bytes for point in self.points)
+        totals["program_cache_hits"] = sum(
+            point.program_cache_hit for point in self.points
+        )
+        return totals
+
+    def duty_cycle(self) -> float:
+        """Get the fraction of the run during which the board was running programs."""
+        if self.total_time == 0:
+            return 0.0
+        return sum(point.run_time for point in self.points) / self.total_time
+
+    def as_dict(self) -> dict[str, Any]:
+        """Get the metrics as a JSON-serializable dict."""
+        return {
+            "acquisition_mode": self.acquisition_mode,
+            "run_id": self.run_id,
+            "start_time": self.start_time,
+            "total_time": self.total_time,
+            "totals": self.totals(),
+            "points": [point.as_dict() for point in self.points],
+        }
+
+
+class MeteredSoc:
+    """Forwards calls to a QickSoc and records the data transfers in a `PointMetrics`.
+
+    Parameters
+    ----------
+    soc : Pyro4.Proxy
+        The QickSoc.
+    metrics : PointMetrics
+        Where the run time, transfer time and transferred bytes are added.
+    """
+
+    def __init__(self, soc, metrics: PointMetrics) -> None:
+        self._soc = soc
+        self._metrics = metrics
+        # when the tProc was started, and when its last data arrived
+        self._run_start: float | None = None
+        self._run_end: float | None = None
+
+    def __getattr__(self, name: str):
+        """Forward the other attributes to the QickSoc."""
+        return getattr(self._soc, name)
+
+    def start_tproc(self) -> None:
+        self._run_start = time.perf_counter()
+        self._run_end = None
+        self._soc.start_tproc()
+
+    def start_readout(self, *args: object, **kwargs) -> None:
+        self._run_start = time.perf_counter()
+        self._run_end = None
+        self._soc.start_readout(*args, **kwargs)
+
+    def poll_data(self, *args: object, **kwargs) -> list:
+        new_data = self._soc.poll_data(*args, **kwargs)
+        for _, (data, _) in new_data:
+            if data is not None:
+                self._metrics.transfer_bytes += sum(_nbytes(d) for d in data)
+                self._run_end = time.perf_counter()
+        return new_data
+
+    def cleanup_round(self) -> None:
+        if self._run_start is not None:
+            run_end = time.perf_counter() if self._run_end is None else self._run_end
+            self._metrics.run_time += run_end - self._run_start
+            self._run_start = None
+        self._soc.cleanup_round()
+
+    def get_decimated(self, *args: object, **kwargs) -> np.ndarray:
+        return self._transfer(self._soc.get_decimated, *args, **kwargs)
+
+    def get_accumulated(self, *args: object, **kwargs) -> np.ndarray:
+        return self._transfer(self._soc.get_accumulated, *args, **kwargs)
+
+    def get_ddr4(self, *args: object, **kwargs) -> np.ndarray:
+        return self._transfer(self._soc.get_ddr4, *args, **kwargs)
+
+    def _transfer(self, method, *args: object, **kwargs) -> np.ndarray:
+        """Call a method which transfers data from the board, and meter it."""
+        start = time.perf_counter()
+        if self._run_start is not None and self._run_end is None:
+            # the program has finished before its data is transferred
+            self._run_end = start
+        data = method(*args, **kwargs)
+        self._metrics.transfer_time += time.perf_counter() - start
+        self._metrics.transfer_bytes += _nbytes(data)
+        return data
+
+
+def _nbytes(data) -> int:
+    """Get the size of an array, or of a list which was converted from an array."""
+    if data is None:
+        return 0
+    return np.asarray(data).nbytes
@@ -1,11 +1,19 @@
 from __future__ import annotations
 
+import copy
+import math
+import time
 from typing import TYPE_CHECKING
 
+import numpy as np
 import qick.asm_v2
 import qick.qick_asm
+from qick import obtain
+from tqdm.auto import tqdm
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
     from qcodes_qick.channels_v2 import AdcChannel, DacChannel
     from qcodes_qick.envelope_base_v2 import DacEnvelope
     from qcodes_qick.instrument_v2 import QickInstrument
@@ -21,6 +29,13 @@ class AveragerProgram(qick.asm_v2.AveragerProgramV2):
     ):
         self.qick_instrument = qick_instrument
         self.hardware_loop_counts = hardware_loop_counts
+        # the keys of the envelopes added by DacEnvelopes, see EnvelopeMemory
+        self.envelope_keys: dict[tuple[int, str], tuple] = {}
+        # durations in seconds, see PointMetrics
+        self.build_time = 0.0
+        self.assemble_time = 0.0
+        self.load_time = 0.0
+        start = time.perf_counter()
         super().__init__(
             qick_instrument.soccfg,
             reps=qick_instrument.hard_avgs.get(),
@@ -28,6 +43,9 @@ class AveragerProgram(qick.asm_v2.AveragerProgramV2):
             final_wait=qick_instrument.final_wait.qick_param * 1e6,
             initial_delay=qick_instrument.initial_delay.qick_param * 1e6,
         )
+        self.build_time = time.perf_counter() - start - self.assemble_time
+        # the DAC, ADC and envelope configuration, saved before config_all() modifies it
+        self.board_config = copy.deepcopy((self.gen_chs, self.ro_chs, self.envelopes))
 
     def _initialize(self, cfg: dict):  # noqa: ARG002
         macros = self.qick_instrument.macro_list
@@ -46,6 +64,8 @@ class AveragerProgram(qick.asm_v2.AveragerProgramV2):
             envelope.initialize(self)
         for pulse in pulses:
             pulse.initialize(self)
+        for envelope in envelopes:
+            envelope.select_from_bank(self)
 
         for name, count in self.hardware_loop_counts.items():
             self.add_loop(name, count)
@@ -53,3 +73,315 @@ class AveragerProgram(qick.asm_v2.AveragerProgramV2):
     def _body(self, cfg: dict):  # noqa: ARG002
         for macro in self.qick_instrument.macro_list:
             self.append_macro(macro.create_qick_macro())
+
+    def _make_asm(self) -> None:
+        start = time.perf_counter()
+        super()._make_asm()
+        self.assemble_time += time.perf_counter() - start
+
+    def _make_binprog(self) -> None:
+        start = time.perf_counter()
+        super()._make_binprog()
+        self.assemble_time += time.perf_counter() - start
+
+    def config_all(
+        self,
+        soc,
+        load_envelopes: bool = True,
+        reset: bool = False,
+        load_mem: bool = True,
+    ) -> None:
+        """Load the program onto the board.
+
+        If the DACs, ADCs and envelopes are configured exactly as in the program which was loaded last,
+        only the tProc memories are written. This is the case when e.g. a software sweep changes
+        only the frequency, phase or gain of pulses, which are stored in the waveform memory.
+
+        Parameters
+        ----------
+        soc : Pyro4.Proxy
+            The QickSoc which will execute this program.
+        load_envelopes : bool
+            Load the pulse envelopes.
+        reset : bool
+            Force-stop the tProc and reconfigure everything.
+        load_mem : bool
+            Write the waveform and data memories now.
+        """
+        start = time.perf_counter()
+        loaded = self.qick_instrument.loaded_program
+        if (
+            reset
+            or not load_envelopes
+            or loaded is None
+            or not _config_equal(self.board_config, loaded.board_config)
+        ):
+            self.qick_instrument.loaded_program = None
+            if reset:
+                self.qick_instrument.envelope_memory.invalidate()
+            super().config_all(soc, load_envelopes, reset, load_mem)
+        else:
+            soc.start_src("internal")
+            soc.stop_tproc(lazy=True)
+            soc.load_bin_program(self.binprog, load_mem=load_mem)
+        if load_envelopes:
+            self.qick_instrument.loaded_program = self
+        self.load_time = time.perf_counter() - start
+
+    def stream_accumulated(
+        self,
+        soc,
+        consumer: Callable[[int, int, Sequence[np.ndarray]], None],
+        rounds: int = 1,
+        progress: bool = True,
+        round_callback: Callable[[int], None] | None = None,
+    ) -> None:
+        """Run the program and pass the accumulated shots to the consumer as they arrive.
+
+        Unlike `acquire()`, the shots are not collected in `acc_buf`,
+        so the memory needed does not grow with the number of shots.
+
+        Parameters
+        ----------
+        soc : Pyro4.Proxy
+            The QickSoc which will execute this program.
+        consumer : Callable[[int, int, Sequence[np.ndarray]], None]
+            Called with each chunk of shots in the order they are read out: the index
+            of the first shot of the chunk, counted from the start of the first round,
+            the number of shots, and the data of each readout channel with the shape
+            (number of shots * readouts per shot, 2). A chunk never spans two rounds.
+        rounds : int
+            Number of times to run the program. The shots of each round follow
+            those of the previous round.
+        progress : bool
+            Display a progress bar.
+        round_callback : Callable[[int], None], optional
+            Called with the number of completed rounds after each round.
+        """
+        if any(x is None for x in [self.counter_addr, self.loop_dims, self.avg_level]):
+            msg = "data dimensions need to be defined with setup_acquire() before calling stream_accumulated()"
+            raise RuntimeError(msg)
+        total_count = math.prod(self.loop_dims)
+        reads_per_shot = [ro["trigs"] for ro in self.ro_chs.values()]
+        self.acquire_params = {
+            "type": "accumulated",
+            "soc": soc,
+            "start_src": "internal",
+        }
+        # let prepare_round() configure the readouts without clearing any buffers
+        self.acc_buf = []
+        self.config_all(soc, load_envelopes=True, load_mem=False)
+
+        with tqdm(total=rounds * total_count, disable=not progress) as pbar:
+            for round_num in range(rounds):
+                self.prepare_round()
+                soc.start_readout(
+                    total_count,
+                    counter_addr=self.counter_addr,
+                    ch_list=list(self.ro_chs),
+                    reads_per_shot=reads_per_shot,
+                )
+                count = 0
+                while count < total_count:
+                    for new_points, (data, _) in obtain(soc.poll_data()):
+                        consumer(round_num * total_count + count, new_points, data)
+                        count += new_points
+                        pbar.update(new_points)
+                soc.cleanup_round()
+                if round_callback is not None:
+                    round_callback(round_num + 1)
+
+    def acquire_rounds(
+        self,
+        soc,
+        rounds: int = 1,
+        progress: bool = True,
+        round_callback: Callable[[int], None] | None = None,
+    ) -> list:
+        """Acquire the averages as `acquire()` does, calling `round_callback` after each round.
+
+        The averages of the rounds completed so far are given by `rounds_average()`.
+
+        Parameters
+        ----------
+        soc : Pyro4.Proxy
+            The QickSoc which will execute this program.
+        rounds : int
+            Number of rounds to average over.
+        progress : bool
+            Display a progress bar.
+        round_callback : Callable[[int], None], optional
+            Called with the number of completed rounds after each round.
+
+        Returns
+        -------
+        list[np.ndarray]
+            The averaged IQ values of each readout channel, as returned by `acquire()`.
+        """
+        qick.qick_asm.AcquireMixin.acquire(
+            self, soc, rounds=rounds, progress=progress, step_rounds=True
+        )
+        num_rounds = 0
+        while True:
+            more_rounds = self.finish_round()
+            num_rounds += 1
+            if round_callback is not None:
+                round_callback(num_rounds)
+            if not more_rounds:
+                break
+            self.prepare_round()
+        return self.finish_acquire()
+
+    def acquire_streamed(
+        self,
+        soc,
+        rounds: int = 1,
+        progress: bool = True,
+        round_callback: Callable[[int], None] | None = None,
+    ) -> list:
+        """Acquire the averages exactly as `acquire()` does, without buffering the shots.
+
+        The shots are summed as they arrive, so only the sums of each point are kept
+        in memory. The sums of integers are exact, so the result is identical to that
+        of `acquire()`. `acc_buf` is left empty.
+
+        Parameters
+        ----------
+        soc : Pyro4.Proxy
+            The QickSoc which will execute this program.
+        rounds : int
+            Number of rounds to average over.
+        progress : bool
+            Display a progress bar.
+        round_callback : Callable[[int], None], optional
+            Called with the number of completed rounds after each round, when the
+            averages of these rounds are given by `rounds_average()`.
+
+        Returns
+        -------
+        list[np.ndarray]
+            The averaged IQ values of each readout channel, as returned by `acquire()`.
+        """
+        assert self.avg_level == 0
+        reps = self.loop_dims[0]
+        total_count = math.prod(self.loop_dims)
+        point_shape = tuple(self.loop_dims[1:])
+        num_points = math.prod(point_shape)
+        reads_per_shot = [ro["trigs"] for ro in self.ro_chs.values()]
+        sums = [np.zeros((num_points * nreads, 2)) for nreads in reads_per_shot]
+        self.rounds_buf = []
+
+        def consumer(
+            first_shot: int, num_shots: int, data: Sequence[np.ndarray]
+        ) -> None:
+            first_shot %= total_count
+            for channel_sums, channel_data, nreads in zip(sums, data, reads_per_shot):
+                indices = np.arange(
+                    first_shot * nreads, first_shot * nreads + len(channel_data)
+                )
+                indices %= len(channel_sums)
+                for i in range(2):
+                    channel_sums[:, i] += np.bincount(
+                        indices, channel_data[:, i], minlength=len(channel_sums)
+                    )
+            if first_shot + num_shots == total_count:
+                # average the round as acquire() does, from the mean over the reps
+                means = [
+                    (channel_sums / reps).reshape(1, *point_shape, nreads, 2)
+                    for channel_sums, nreads in zip(sums, reads_per_shot)
+                ]
+                self.rounds_buf.append(
+                    self._average_buf(means, length_norm=True, remove_offset=True)
+                )
+                for channel_sums in sums:
+                    channel_sums[:] = 0
+
+        self.stream_accumulated(
+            soc,
+            consumer,
+            rounds=rounds,
+            progress=progress,
+            round_callback=round_callback,
+        )
+        return self._summarize_accumulated(self.rounds_buf)
+
+    def acquire_shots(self, soc, progress: bool = True) -> None:
+        """Acquire the shots into `acc_buf` as `acquire()` does, with half the memory.
+
+        The shots are stored with the dtype int32 of the data read from the board,
+        instead of the int64 of `acquire()`. No averages are computed.
+
+        Parameters
+        ----------
+        soc : Pyro4.Proxy
+            The QickSoc which will execute this program.
+        progress : bool
+            Display a progress bar.
+        """
+        reads_per_shot = [ro["trigs"] for ro in self.ro_chs.values()]
+        acc_buf = [
+            np.empty((*self.loop_dims, nreads, 2), dtype=np.int32)
+            for nreads in reads_per_shot
+        ]
+
+        def consumer(
+            first_shot: int,
+            num_shots: int,  # noqa: ARG001
+            data: Sequence[np.ndarray],
+        ) -> None:
+            for buf, channel_data, nreads in zip(acc_buf, data, reads_per_shot):
+                start = first_shot * nreads
+                buf.reshape(-1, 2)[start : start + len(channel_data)] = channel_data
+
+        self.stream_accumulated(soc, consumer, progress=progress)
+        self.acc_buf = acc_buf
+
+    def rounds_average(self) -> list[np.ndarray]:
+        """Get the averaged IQ values of the rounds acquired so far, as returned by `acquire()`."""
+        return self._summarize_accumulated(self.rounds_buf)
+
+    def load_envelopes(self, soc) -> None:
+        """Load the envelopes which are not yet resident in the envelope memories.
+
+        Parameters
+        ----------
+        soc : Pyro4.Proxy
+            The QickSoc which will execute this program.
+        """
+        memory = self.qick_instrument.envelope_memory
+        for ch, envelopes in enumerate(self.envelopes):
+            for name, envelope in envelopes["envs"].items():
+                memory.load(
+                    soc,
+                    ch,
+                    envelope["addr"],
+                    envelope["data"],
+                    self.envelope_keys.get((ch, name)),
+                )
+
+        # let qick load the readout weights, without any envelopes
+        all_envelopes = self.envelopes
+        self.envelopes = [{**envelopes, "envs": {}} for envelopes in all_envelopes]
+        try:
+            super().load_envelopes(soc)
+        finally:
+            self.envelopes = all_envelopes
+
+
+def _config_equal(a, b) -> bool:
+    """Compare nested dicts and lists which may contain numpy arrays."""
+    if isinstance(a, dict):
+        return (
+            isinstance(b, dict)
+            and a.keys() == b.keys()
+            and all(_config_equal(a[key], b[key]) for key in a)
+        )
+    if isinstance(a, (list, tuple)):
+        return (
+            isinstance(b, (list, tuple))
+            and len(a) == len(b)
+            and all(_config_equal(x, y) for x, y in zip(a, b))
+        )
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(a, b)
+    return a == b
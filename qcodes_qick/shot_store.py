@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import math
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import h5py
+import numpy as np
+
+from qcodes_qick.iq import iq_to_complex
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+# target number of int32 values per chunk, i.e. 4 MiB
+_CHUNK_VALUES = 2**20
+
+
+class ShotStore:
+    """The shots of all points of a software sweep in a single HDF5 file.
+
+    Each readout is stored as a dataset with the shape
+    `(*software sweep lengths, *shot shape, 2)`, where the last axis holds the
+    accumulated I and Q as int32, as returned by the board. The shots of each point
+    are compressed chunk by chunk, and a chunk is only allocated in the file when
+    the point is written, so the file grows as the sweep progresses. The datasets
+    are read lazily: indexing them with `shots()` or `__getitem__()` only reads the
+    chunks of the selected points. The attribute "scale" of each dataset converts
+    the accumulated I and Q to the mean over the readout window, in the units of
+    the "accumulated" acquisition mode, except for the I/Q offset of the readout.
+
+    Open an existing store with `ShotStore(path)`, and create a new one with
+    `ShotStore.create()`.
+
+    Parameters
+    ----------
+    path : str | Path
+        The HDF5 file.
+    mode : str
+        The `h5py.File` mode, "r" to read or "r+" to add more points.
+    """
+
+    def __init__(self, path: str | Path, mode: str = "r") -> None:
+        self.path = Path(path)
+        self._file = h5py.File(self.path, mode)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(
+        cls,
+        path: str | Path,
+        software_sweeps: Sequence[tuple[str, Sequence[float]]],
+    ) -> ShotStore:
+        """Create an empty store, failing if the file exists.
+
+        Parameters
+        ----------
+        path : str | Path
+            The HDF5 file.
+        software_sweeps : Sequence[tuple[str, Sequence[float]]]
+            The name of the parameter and the values of each software sweep, from
+            the outermost. They define the leading axes of the datasets.
+        """
+        path = Path(path)
+        h5py.File(path, "w-").close()
+        store = cls(path, "r+")
+        sweeps = store._file.create_group("software_sweeps")
+        for n, (name, values) in enumerate(software_sweeps):
+            sweep = sweeps.create_dataset(str(n), data=np.asarray(values))
+            sweep.attrs["parameter"] = name
+        store._file.create_dataset(
+            "written",
+            shape=tuple(len(values) for _, values in software_sweeps),
+            dtype=bool,
+            fillvalue=False,
+        )
+        return store
+
+    @property
+    def software_sweeps(self) -> list[tuple[str, np.ndarray]]:
+        """The name of the parameter and the values of each software sweep."""
+        sweeps = self._file["software_sweeps"]
+        return [
+            (sweeps[str(n)].attrs["parameter"], sweeps[str(n)][()])
+            for n in range(len(sweeps))
+        ]
+
+    @property
+    def readouts(self) -> list[str]:
+        """The names of the readouts, e.g. "iq" or "iq0_ch0" as in the dataset."""
+        return [name for name in self._file if name.startswith("iq")]
+
+    @property
+    def written(self) -> np.ndarray:
+        """Whether all the readouts of each point of the software sweeps have been written."""
+        return self._file["written"][()]
+
+    def __getitem__(self, readout: str) -> h5py.Dataset:
+        """Get the lazily-read dataset of a readout, with I and Q on the last axis."""
+        return self._file[readout]
+
+    def shots(self, readout: str, index: tuple = ()) -> np.ndarray:
+        """Read the shots of a readout as complex numbers.
+
+        Parameters
+        ----------
+        readout : str
+            The name of the readout, see `readouts`.
+        index : tuple
+            The selection along the leading axes, e.g. the indices of a point of
+            the software sweeps. Only the chunks of the selection are read.
+
+        Returns
+        -------
+        np.ndarray
+            The selected shots, with the shape of the selection without the I/Q axis.
+        """
+        return iq_to_complex(self._file[readout][(*index, Ellipsis)])
+
+    def write(
+        self,
+        readout: str,
+        software_sweep_indices: Sequence[int],
+        shots: np.ndarray,
+        scale: float = 1.0,
+    ) -> None:
+        """Write the shots of a point, creating the dataset of the readout if needed.
+
+        This can be called from several threads. The point is only marked as
+        written with `mark_written()`, once all its readouts have been written.
+
+        Parameters
+        ----------
+        readout : str
+            The name of the readout.
+        software_sweep_indices : Sequence[int]
+            The index of the point in each software sweep.
+        shots : np.ndarray
+            The accumulated I and Q on the last axis.
+        scale : float
+            The attribute "scale" of a new dataset, e.g. 1 / the readout length.
+        """
+        index = tuple(software_sweep_indices)
+        with self._lock:
+            if readout not in self._file:
+                sweep_shape = self._file["written"].shape
+                # one chunk per point, split along the shots if it is large
+                inner = math.prod(shots.shape[1:])
+                chunks = (
+                    *(1 for _ in sweep_shape),
+                    max(1, min(shots.shape[0], _CHUNK_VALUES // max(1, inner))),
+                    *shots.shape[1:],
+                )
+                self._file.create_dataset(
+                    readout,
+                    shape=(*sweep_shape, *shots.shape),
+                    dtype=np.int32,
+                    chunks=chunks,
+                    compression="gzip",
+                    compression_opts=1,
+                    shuffle=True,
+                )
+                self._file[readout].attrs["scale"] = scale
+            self._file[readout][index] = shots
+
+    def mark_written(self, software_sweep_indices: Sequence[int]) -> None:
+        """Mark a point as written, after the shots of all its readouts have been written.
+
+        Parameters
+        ----------
+        software_sweep_indices : Sequence[int]
+            The index of the point in each software sweep.
+        """
+        with self._lock:
+            self._file["written"][tuple(software_sweep_indices)] = True
+
+    def flush(self) -> None:
+        """Flush the points written so far to the file."""
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        """Close the file."""
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> ShotStore:  # noqa: PYI034
+        """Use the store as a context manager which closes the file on exit."""
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        """Close the file."""
+        self.close()
@@ -0,0 +1,449 @@
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+import qick
+from qick.qick_asm import QickConfig
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+
+def simulated_soccfg(num_dacs: int = 4, num_adcs: int = 2) -> dict:
+    """Make the configuration of a simulated ZCU216 board with a tProc v2.
+
+    Parameters
+    ----------
+    num_dacs : int
+        Number of standard signal generators.
+    num_adcs : int
+        Number of standard readouts. All of them are wired to the DDR4 buffer.
+
+    Returns
+    -------
+    dict
+        Configuration dictionary, as returned by `QickSoc.get_cfg`.
+    """
+    gens = []
+    for n in range(num_dacs):
+        gens.append(
+            {
+                "type": "axis_signal_gen_v6",
+                "fullpath": f"axis_signal_gen_v6_{n}",
+                "tproc_ch": n,
+                "dac": f"{2 + n // 4}{n % 4}",
+                "switch_ch": -1,
+                "fs": 9830.4,
+                "fs_mult": 16,
+                "fs_div": 1,
+                "f_fabric": 614.4,
+                "f_dds": 9830.4,
+                "fdds_div": 1,
+                "b_dds": 32,
+                "b_phase": 32,
+                "samps_per_clk": 16,
+                "maxlen": 65536,
+                "maxv": 32766,
+                "maxv_scale": 1.0,
+                "has_dds": True,
+                "has_mixer": False,
+                "complex_env": True,
+                "interpolation": 1,
+            }
+        )
+    readouts = []
+    adcs = {}
+    for n in range(num_adcs):
+        adc = f"{n // 2}{2 * (n % 2)}"
+        adcs[adc] = {"coupling": "AC", "fs": 2457.6}
+        readouts.append(
+            {
+                "ro_type": "axis_dyn_readout_v1",
+                "ro_fullpath": f"axis_dyn_readout_v1_{n}",
+                "avgbuf_fullpath": f"axis_avg_buffer_{n}",
+                "adc": adc,
+                "tproc_ctrl": 4 + n,
+                "tproc_ch": n,
+                "trigger_type": "tproc",
+                "trigger_port": 0,
+                "trigger_bit": n,
+                "fs": 2457.6,
+                "fs_mult": 4,
+                "f_fabric": 307.2,
+                "f_output": 307.2,
+                "f_dds": 2457.6,
+                "fdds_div": 1,
+                "b_dds": 32,
+                "b_phase": 32,
+                "decimation": 8,
+                "iq_offset": 0.0,
+                "has_outsel": True,
+                "has_weights": False,
+                "has_edge_counter": False,
+                "buf_maxlen": 16384,
+                "avg_maxlen": 16384,
+                "wgt_maxlen": 0,
+            }
+        )
+    return {
+        "board": "ZCU216",
+        "sw_version": qick.__version__,
+        "fw_timestamp": "simulated",
+        "refclk_freq": 245.76,
+        "tprocs": [
+            {
+                "type": "qick_processor",
+                "revision": 26,
+                "f_time": 409.6,
+                "f_core": 200.0,
+                "pmem_size": 4096,
+                "dmem_size": 4096,
+                "wmem_size": 1024,
+                "dreg_qty": 16,
+                "in_port_qty": 4,
+                "out_trig_qty": 8,
+                "out_dport_qty": 4,
+                "out_dport_dw": 4,
+                "out_wport_qty": 8,
+                "output_pins": [],
+                "start_pin": None,
+                "trig_output": 0,
+                "ext_flag": False,
+            }
+        ],
+        "gens": gens,
+        "readouts": readouts,
+        "iqs": [],
+        "time_taggers": [],
+        "ddr4_buf": {
+            "readouts": [ro["avgbuf_fullpath"] for ro in readouts],
+            "trigger_type": "tproc",
+            "trigger_port": 7,
+            "burst_len": 256,
+            "junk_len": 401,
+            "maxlen": 2**30,
+        },
+        "rf": {"adcs": adcs, "dacs": {}},
+    }
+
+
+class SimulatedQickSoc(QickConfig):
+    """A stand-in for the QickSoc which runs without a board.
+
+    It implements the methods of the QickSoc used by `QickInstrument`, so that
+    measurements can be run and benchmarked offline. Instead of running the program,
+    every readout measures a qubit in a random state, and returns the IQ point
+    of that state plus Gaussian noise.
+
+    Parameters
+    ----------
+    cfg : dict, optional
+        Board configuration. The default is given by `simulated_soccfg`.
+    state_iq : Sequence[complex]
+        The IQ point of each qubit state, in ADC units per decimated sample.
+    populations : Sequence[float], optional
+        The probability of each qubit state. Equal by default.
+    state_model : Callable[[np.random.Generator, int, int], np.ndarray], optional
+        Called with the random generator, the readout channel number and the number
+        of readouts, returns the qubit state of each readout. Overrides `populations`.
+    noise : float
+        Standard deviation of I and Q of a decimated sample, in ADC units.
+    shot_time : float
+        Duration of a shot in seconds. The data becomes available at this rate.
+        If 0, the programs complete immediately.
+    seed : int, optional
+        Seed of the random generator.
+    """
+
+    def __init__(
+        self,
+        cfg: dict | None = None,
+        state_iq: Sequence[complex] = (300 + 100j, 100 + 300j),
+        populations: Sequence[float] | None = None,
+        state_model: Callable[[np.random.Generator, int, int], np.ndarray]
+        | None = None,
+        noise: float = 1000,
+        shot_time: float = 0,
+        seed: int | None = None,
+    ) -> None:
+        super().__init__(simulated_soccfg() if cfg is None else cfg)
+        self.state_iq = np.asarray(state_iq, dtype=complex)
+        self.populations = populations
+        self.state_model = state_model
+        self.noise = noise
+        self.shot_time = shot_time
+        self.rng = np.random.default_rng(seed)
+
+        # the data loaded onto the board
+        self.binprog: dict | None = None
+        self.envelopes: dict[tuple[int, int], np.ndarray] = {}
+        # readout window lengths in decimated samples
+        self.avg_lengths: dict[int, int] = {}
+        self.buf_lengths: dict[int, int] = {}
+
+        self.start_source = "internal"
+        # time when the tProc was started, or None if it is stopped
+        self.start_time: float | None = None
+        # accumulated readout: (total shots, readout channels, reads per shot)
+        self.readout_job: tuple[int, list[int], list[int]] | None = None
+        self.shots_read = 0
+        # DDR4 buffer: (readout channel, number of transfers)
+        self.ddr4_job: tuple[int, int] | None = None
+
+    # program loading
+
+    def load_bin_program(self, binprog: dict, load_mem: bool = True) -> None:  # noqa: ARG002
+        self.binprog = binprog
+
+    def reload_mem(self) -> None:
+        pass
+
+    def load_envelope(self, ch: int, data: list, addr: int) -> None:
+        self.envelopes[ch, addr] = np.array(data, dtype=np.int16)
+
+    def load_weights(self, ch: int, data: list, addr: int = 0) -> None:
+        pass
+
+    def set_nyquist(self, ch: int, nqz: int, force: bool = False) -> None:
+        pass
+
+    def set_mixer_freq(
+        self,
+        ch: int,
+        f: float,
+        ro_ch: int | None = None,
+        phase_reset: bool = True,
+        fullscale: bool = False,
+    ) -> None:
+        pass
+
+    def config_mux_gen(self, ch: int, tones: list) -> None:
+        pass
+
+    def configure_readout(self, ch: int, ro_regs: dict) -> None:
+        pass
+
+    def config_mux_readout(self, pfbpath: str, cfgs: list, sel=None) -> None:
+        pass
+
+    # tProc control
+
+    def start_src(self, src: str) -> None:
+        self.start_source = src
+
+    def start_tproc(self) -> None:
+        if self.start_source == "internal":
+            self.start_time = time.perf_counter()
+
+    def stop_tproc(self, lazy: bool = False) -> None:  # noqa: ARG002
+        self.start_time = None
+        self.readout_job = None
+
+    def clear_tproc_counter(self, addr: int) -> None:  # noqa: ARG002
+        self.start_time = None
+
+    def get_tproc_counter(self, addr: int) -> int:  # noqa: ARG002
+        """Get the number of shots completed since the tProc was started."""
+        if self.start_time is None:
+            return 0
+        if self.shot_time == 0:
+            return np.iinfo(np.int32).max
+        # a register read over the network takes about a millisecond
+        time.sleep(1e-3)
+        return int((time.perf_counter() - self.start_time) / self.shot_time)
+
+    def prepare_round(self) -> None:
+        pass
+
+    def cleanup_round(self) -> None:
+        pass
+
+    # readout buffers
+
+    def config_avg(self, ch: int, address: int = 0, length: int = 1, **kwargs) -> None:  # noqa: ARG002
+        self.avg_lengths[ch] = length
+
+    def config_buf(self, ch: int, address: int = 0, length: int = 1) -> None:  # noqa: ARG002
+        self.buf_lengths[ch] = length
+
+    def enable_buf(
+        self, ch: int, enable_avg: bool = True, enable_buf: bool = True
+    ) -> None:
+        pass
+
+    def start_readout(
+        self,
+        total_shots: int,
+        counter_addr: int = 1,  # noqa: ARG002
+        ch_list: list[int] | None = None,
+        reads_per_shot: int | list[int] = 1,
+        stride: int | None = None,  # noqa: ARG002
+    ) -> None:
+        if ch_list is None:
+            ch_list = [0, 1]
+        if isinstance(reads_per_shot, int):
+            reads_per_shot = [reads_per_shot] * len(ch_list)
+        self.readout_job = (total_shots, list(ch_list), list(reads_per_shot))
+        self.shots_read = 0
+        self.start_tproc()
+
+    def poll_data(self, totaltime: float = 0.1, timeout: float | None = None) -> list:  # noqa: ARG002
+        """Get the accumulated data of the shots completed since the last call.
+
+        Returns
+        -------
+        list
+            (number of shots, (data, stats)) for each transfer, in the same format
+            as `QickSoc.poll_data`.
+        """
+        if self.readout_job is None or self.start_time is None:
+            return []
+        total_shots, ch_list, reads_per_shot = self.readout_job
+
+        # the QickSoc transfers the data in chunks of 10% of the buffer
+        stride = max(
+            1,
+            min(
+                int(0.1 * self["readouts"][ch]["avg_maxlen"] / reads)
+                for ch, reads in zip(ch_list, reads_per_shot)
+            ),
+        )
+        if self.shot_time == 0:
+            completed = total_shots
+        else:
+            # wait until a chunk is complete
+            next_shots = min(self.shots_read + stride, total_shots)
+            delay = self.start_time + next_shots * self.shot_time - time.perf_counter()
+            time.sleep(max(0, min(delay, totaltime)))
+            elapsed = time.perf_counter() - self.start_time
+            completed = min(int(elapsed / self.shot_time), total_shots)
+
+        new_data = []
+        while self.shots_read < completed:
+            new_shots = min(stride, completed - self.shots_read)
+            if new_shots < stride and completed < total_shots:
+                break
+            data = [
+                self.accumulated_iq(ch, new_shots * reads)
+                for ch, reads in zip(ch_list, reads_per_shot)
+            ]
+            self.shots_read += new_shots
+            stats = (
+                time.perf_counter() - self.start_time,
+                self.shots_read,
+                0,
+                new_shots,
+            )
+            new_data.append((new_shots, (data, stats)))
+        return new_data
+
+    def get_accumulated(
+        self,
+        ch: int,
+        address: int = 0,  # noqa: ARG002
+        length: int | None = None,
+    ) -> np.ndarray:
+        if length is None:
+            length = self["readouts"][ch]["avg_maxlen"]
+        return self.accumulated_iq(ch, length)
+
+    def get_decimated(
+        self,
+        ch: int,
+        address: int = 0,  # noqa: ARG002
+        length: int | None = None,
+    ) -> np.ndarray:
+        if length is None:
+            length = self["readouts"][ch]["buf_maxlen"]
+        window = self.buf_lengths.get(ch, length)
+        num_reads = length // window
+        states = self.get_states(ch, num_reads)
+        return self.decimated_iq(states, window).reshape(-1, 2)[:length]
+
+    # DDR4 buffer
+
+    def arm_ddr4(self, ch: int, nt: int, force_overwrite: bool = False) -> None:
+        maxlen = self["ddr4_buf"]["maxlen"]
+        if nt > maxlen // self["ddr4_buf"]["burst_len"] and not force_overwrite:
+            msg = "the requested number of DDR4 transfers (nt) exceeds the memory size"
+            raise RuntimeError(msg)
+        self.ddr4_job = (ch, nt)
+
+    def get_ddr4(self, nt: int, start: int | None = None) -> np.ndarray:
+        burst_len = self["ddr4_buf"]["burst_len"]
+        if start is None:
+            length = max(0, nt * burst_len - self["ddr4_buf"]["junk_len"])
+        else:
+            length = nt * burst_len
+        ch = 0 if self.ddr4_job is None else self.ddr4_job[0]
+        states = self.get_states(ch, 1)
+        return self.decimated_iq(states, length)[0]
+
+    # synthetic data
+
+    def get_states(self, ch: int, num_reads: int) -> np.ndarray:
+        """Draw the qubit state of each readout.
+
+        Parameters
+        ----------
+        ch : int
+            Readout channel number.
+        num_reads : int
+            Number of readouts.
+
+        Returns
+        -------
+        np.ndarray
+            The state indices.
+        """
+        if self.state_model is not None:
+            return np.asarray(self.state_model(self.rng, ch, num_reads))
+        return self.rng.choice(len(self.state_iq), size=num_reads, p=self.populations)
+
+    def accumulated_iq(self, ch: int, num_reads: int) -> np.ndarray:
+        """Generate the accumulated IQ data of some readouts.
+
+        Parameters
+        ----------
+        ch : int
+            Readout channel number.
+        num_reads : int
+            Number of readouts.
+
+        Returns
+        -------
+        np.ndarray
+            int32 array of shape (num_reads, 2), the sums of the decimated samples.
+        """
+        length = self.avg_lengths.get(ch, 1)
+        iq = self.state_iq[self.get_states(ch, num_reads)] * length
+        data = self.rng.standard_normal((num_reads, 2))
+        data *= self.noise * np.sqrt(length)
+        data[:, 0] += iq.real
+        data[:, 1] += iq.imag
+        return np.rint(data).astype(np.int32)
+
+    def decimated_iq(self, states: np.ndarray, length: int) -> np.ndarray:
+        """Generate the decimated IQ data of some readouts.
+
+        Parameters
+        ----------
+        states : np.ndarray
+            The qubit state of each readout.
+        length : int
+            Number of decimated samples per readout.
+
+        Returns
+        -------
+        np.ndarray
+            int16 array of shape (len(states), length, 2).
+        """
+        iq = self.state_iq[states]
+        data = self.rng.standard_normal((len(states), length, 2))
+        data *= self.noise
+        data[:, :, 0] += iq.real[:, np.newaxis]
+        data[:, :, 1] += iq.imag[:, np.newaxis]
+        limit = np.iinfo(np.int16)
+        return np.clip(np.rint(data), limit.min, limit.max).astype(np.int16)
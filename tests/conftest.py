@@ -0,0 +1,59 @@
+"""Fixtures shared by the tests which run `QickInstrument` on a `SimulatedQickSoc`."""
+
+from collections.abc import Callable
+
+import pytest
+from qcodes import initialise_or_create_database_at, load_or_create_experiment
+
+from qcodes_qick.instrument_v2 import QickInstrument
+from qcodes_qick.macros_v2 import DelayAuto, PlayPulse, Trigger
+from qcodes_qick.pulses_v2 import ConstantPulse
+from qcodes_qick.simulated_soc_v2 import SimulatedQickSoc
+
+
+@pytest.fixture
+def make_qi(tmp_path) -> Callable[..., QickInstrument]:
+    """Get a factory of simulated instruments which save into a temporary database.
+
+    Each instrument plays the constant `readout_pulse` of its first DAC on every
+    readout of its first ADC, and is closed at the end of the test. The factory
+    takes `hard_avgs`, the number of readouts per shot, the delay after each
+    readout, and the class and keyword arguments of the simulated board.
+    """
+    initialise_or_create_database_at(tmp_path / "experiments.db")
+    load_or_create_experiment("tests", "simulated")
+    instruments = []
+
+    def make_qi(
+        hard_avgs: int = 100,
+        num_readouts: int = 1,
+        delay: float = 10e-9,
+        soc_class: type[SimulatedQickSoc] = SimulatedQickSoc,
+        **soc_kwargs,
+    ) -> QickInstrument:
+        soc = soc_class(**soc_kwargs)
+        inst = QickInstrument(None, name=f"qi{len(instruments)}", soc=soc)
+        instruments.append(inst)
+        dac, adc = inst.dacs[0], inst.adcs[0]
+        dac.matching_adc.set(adc.channel_num)
+        adc.matching_dac.set(dac.channel_num)
+        pulse = ConstantPulse(dac, "readout_pulse")
+        pulse.length.set(1e-6)
+        adc.length.set(1e-6)
+        inst.set_macro_list(
+            [
+                macro
+                for _ in range(num_readouts)
+                for macro in (
+                    Trigger(inst, adc, t=0),
+                    PlayPulse(inst, pulse),
+                    DelayAuto(inst, delay),
+                )
+            ]
+        )
+        inst.hard_avgs.set(hard_avgs)
+        return inst
+
+    yield make_qi
+    for inst in instruments:
+        inst.close()
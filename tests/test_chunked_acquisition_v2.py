@@ -0,0 +1,82 @@
+"""Unit tests for the acquisition of points with more readouts than `max_buffered_reads`."""
+
+import numpy as np
+import pytest
+from qcodes import (
+    Measurement,
+    load_by_id,
+)
+from qick.asm_v2 import QickSweep1D
+
+from qcodes_qick.instrument_v2 import QickInstrument, SoftwareSweep
+
+STATE_IQ = np.array([100, -100])
+
+
+def _classify(iq: np.ndarray) -> np.ndarray:
+    return (iq.real < 0).astype(int)
+
+
+@pytest.fixture
+def make_chunked_qi(make_qi):
+    def make_chunked_qi(max_buffered_reads: int) -> QickInstrument:
+        inst = make_qi(
+            hard_avgs=3000, num_readouts=2, state_iq=STATE_IQ, noise=30, seed=0
+        )
+        inst.max_buffered_reads.set(max_buffered_reads)
+        inst.dacs[0].readout_pulse.gain.set(QickSweep1D("gain", 0.1, 0.5))
+        return inst
+
+    return make_chunked_qi
+
+
+def _run(inst: QickInstrument, **kwargs) -> dict:
+    run_id = inst.run(
+        Measurement(name="chunked"),
+        software_sweeps=[SoftwareSweep(inst.dacs[0].readout_pulse.freq, 1e8, 2e8, 2)],
+        hardware_loop_counts={"gain": 3},
+        **kwargs,
+    )
+    return load_by_id(run_id).get_parameter_data()
+
+
+def _assert_datasets_equal(chunked: dict, buffered: dict) -> None:
+    assert chunked.keys() == buffered.keys()
+    for name, data in buffered.items():
+        # the parameters of the two instruments differ only in the instrument name
+        assert len(data) == len(chunked[name])
+        for chunked_values, values in zip(chunked[name].values(), data.values()):
+            np.testing.assert_array_equal(chunked_values, values)
+
+
+@pytest.mark.parametrize(
+    ("acquisition_mode", "soft_avgs"),
+    [("accumulated", 1), ("accumulated", 3), ("accumulated shots", 1)],
+)
+def test_chunked_acquisition_is_identical_to_buffered(
+    make_chunked_qi, acquisition_mode, soft_avgs
+):
+    chunked, buffered = make_chunked_qi(max_buffered_reads=0), make_chunked_qi(2**24)
+    for inst in [chunked, buffered]:
+        inst.soft_avgs.set(soft_avgs)
+    _assert_datasets_equal(
+        _run(chunked, acquisition_mode=acquisition_mode),
+        _run(buffered, acquisition_mode=acquisition_mode),
+    )
+    # only the shots which are saved were buffered, as int32 instead of int64
+    chunked_buf = chunked.loaded_program.acc_buf
+    if acquisition_mode == "accumulated shots":
+        assert [buf.dtype for buf in chunked_buf] == [np.int32]
+    else:
+        assert chunked_buf == []
+    assert [buf.dtype for buf in buffered.loaded_program.acc_buf] == [np.int64]
+
+
+def test_chunked_state_population_is_identical_to_buffered(make_chunked_qi):
+    chunked, buffered = make_chunked_qi(max_buffered_reads=0), make_chunked_qi(2**24)
+    kwargs = {
+        "acquisition_mode": "state population",
+        "num_states": 2,
+        "state_classifier": _classify,
+    }
+    _assert_datasets_equal(_run(chunked, **kwargs), _run(buffered, **kwargs))
@@ -0,0 +1,185 @@
+"""Unit tests for the state classifiers of the "state population" mode."""
+
+import json
+
+import numpy as np
+import pytest
+from qcodes import (
+    Measurement,
+    Station,
+    load_by_id,
+)
+from qick.asm_v2 import QickSweep1D
+
+from qcodes_qick.classifiers_v2 import (
+    GaussianMixtureClassifier,
+    LinearDiscriminantClassifier,
+    RotatedThresholdClassifier,
+    StateClassifier,
+)
+from qcodes_qick.instrument_v2 import SoftwareSweep
+
+CLASSIFIERS = [
+    RotatedThresholdClassifier,
+    LinearDiscriminantClassifier,
+    GaussianMixtureClassifier,
+]
+
+
+def _shots(centers, num_shots=20_000, noise=1.0, seed=0):
+    """Draw shots prepared in each state, of which 5% end up in the next state."""
+    rng = np.random.default_rng(seed)
+    centers = np.asarray(centers)
+    noise = np.broadcast_to(noise, centers.shape)
+    shots = []
+    for state in range(len(centers)):
+        states = np.full(num_shots, state)
+        states[rng.random(num_shots) < 0.05] = (state + 1) % len(centers)
+        noise_iq = rng.normal(scale=noise[states, np.newaxis], size=(num_shots, 2))
+        noise_iq = noise_iq @ [1, 1j]
+        shots.append(centers[states] + noise_iq)
+    return shots
+
+
+@pytest.mark.parametrize("cls", CLASSIFIERS)
+def test_classifier_fit_two_states(cls):
+    shots = _shots([1 + 1j, 4 + 5j])
+    classifier = cls.fit(shots)
+    assert classifier.num_states == 2
+    matrix = classifier.assignment_matrix(shots)
+    # 5% of the shots are in the other state, and the overlap error is about 0.3%
+    np.testing.assert_allclose(np.diag(matrix), 0.95, atol=0.01)
+    states = classifier(np.array([[1 + 1j, 4 + 5j], [4 + 5j, 1 + 1j]]))
+    np.testing.assert_array_equal(states, [[0, 1], [1, 0]])
+
+
+@pytest.mark.parametrize(
+    "cls", [LinearDiscriminantClassifier, GaussianMixtureClassifier]
+)
+def test_classifier_fit_three_states(cls):
+    centers = [0, 5, 5j]
+    classifier = cls.fit(_shots(centers))
+    assert classifier.num_states == 3
+    np.testing.assert_array_equal(classifier(np.array(centers)), [0, 1, 2])
+
+
+def test_gaussian_mixture_fits_prepared_states():
+    shots = _shots([0, 6], noise=[1.0, 2.0])
+    classifier = GaussianMixtureClassifier.fit(shots)
+    # the shots in the wrong state do not bias the components
+    np.testing.assert_allclose(classifier.means, [0, 6], atol=0.05)
+    np.testing.assert_allclose(classifier.weights, [0.5, 0.5], atol=0.01)
+    np.testing.assert_allclose(classifier.covariances[:, 0, 0], [1, 4], rtol=0.05)
+
+
+@pytest.mark.parametrize("cls", CLASSIFIERS)
+def test_classifier_snapshot_round_trip(cls):
+    shots = _shots([1 + 1j, 4 + 5j])
+    classifier = cls.fit(shots, name="readout_classifier")
+    snapshot = json.loads(json.dumps(classifier.snapshot()))
+    restored = StateClassifier.from_snapshot(snapshot)
+    assert type(restored) is cls
+    assert restored.name == "readout_classifier"
+    iq = np.concatenate(shots)
+    np.testing.assert_array_equal(restored(iq), classifier(iq))
+
+
+def test_incomplete_classifier_cannot_be_constructed():
+    class ThresholdClassifier(StateClassifier):
+        # without fit() and calibration()
+        num_states = 2
+
+        def classify(self, i, q):  # noqa: ARG002
+            return (i > 0).astype(int)
+
+    with pytest.raises(TypeError, match="abstract"):
+        ThresholdClassifier()
+
+
+def test_classifier_in_station_snapshot():
+    classifier = RotatedThresholdClassifier(0.5, 1.0, name="readout_classifier")
+    station = Station()
+    station.add_component(classifier)
+    snapshot = station.snapshot()["components"]["readout_classifier"]
+    assert snapshot["calibration"] == {"angle": 0.5, "threshold": 1.0}
+
+
+def test_classifier_fit_dataset_and_run(make_qi):
+    qi = make_qi(hard_avgs=1000, noise=100, seed=0)
+    soc, pulse = qi.soc, qi.dacs[0].readout_pulse
+    soc.num_reads = 0
+
+    def state_model(rng, ch, num_reads):  # noqa: ARG001
+        # the hardware loop prepares the state 0 and 1 alternately
+        states = np.arange(soc.num_reads, soc.num_reads + num_reads) % 2
+        soc.num_reads += num_reads
+        return states
+
+    soc.state_model = state_model
+    pulse.gain.set(QickSweep1D("gain", 0, 1))
+    run_id = qi.run(
+        Measurement(name="classifiers"),
+        hardware_loop_counts={"gain": 2},
+        acquisition_mode="accumulated shots",
+    )
+    classifier = LinearDiscriminantClassifier.fit_dataset(load_by_id(run_id))
+    np.testing.assert_allclose(
+        classifier.means / qi.get_program({"gain": 2}).ro_chs[0]["length"],
+        soc.state_iq,
+        atol=5,
+    )
+
+    pulse.gain.set(0.5)
+    soc.state_model = None
+    soc.populations = [0.2, 0.8]
+    run_id = qi.run(
+        Measurement(name="classifiers"),
+        acquisition_mode="state population",
+        state_classifier=classifier,
+    )
+    dataset = load_by_id(run_id)
+    data = dataset.get_parameter_data()
+    assert data["population_1"]["population_1"][0] == pytest.approx(800, abs=50)
+    metadata = json.loads(dataset.metadata["qick_state_classifier"])
+    assert metadata == json.loads(json.dumps(classifier.snapshot()))
+
+
+def test_classifier_fit_dataset_with_states_prepared_by_a_software_sweep(make_qi):
+    qi = make_qi(hard_avgs=1000, noise=100, seed=0)
+    soc, pulse = qi.soc, qi.dacs[0].readout_pulse
+    soc.num_reads = 0
+
+    def state_model(rng, ch, num_reads):  # noqa: ARG001
+        # the first point of the software sweep prepares the state 0, the second 1
+        states = np.arange(soc.num_reads, soc.num_reads + num_reads) >= 3000
+        soc.num_reads += num_reads
+        return states.astype(int)
+
+    soc.state_model = state_model
+    pulse.phase.set(QickSweep1D("phase", 0, 90))
+    run_id = qi.run(
+        Measurement(name="classifiers"),
+        software_sweeps=[SoftwareSweep(pulse.gain, [0, 1])],
+        hardware_loop_counts={"phase": 3},
+        acquisition_mode="accumulated shots",
+    )
+    dataset = load_by_id(run_id)
+    classifier = LinearDiscriminantClassifier.fit_dataset(
+        dataset, state_parameter=pulse.gain.full_name
+    )
+    np.testing.assert_allclose(
+        classifier.means / qi.get_program({"phase": 3}).ro_chs[0]["length"],
+        soc.state_iq,
+        atol=5,
+    )
+    with pytest.raises(ValueError, match="not a setpoint"):
+        LinearDiscriminantClassifier.fit_dataset(dataset, state_parameter="gain")
+
+
+def test_classifier_fit_dataset_requires_a_state_sweep(make_qi):
+    qi = make_qi(hard_avgs=100, noise=100, seed=0)
+    run_id = qi.run(
+        Measurement(name="classifiers"), acquisition_mode="accumulated shots"
+    )
+    with pytest.raises(ValueError, match="no sweep which prepares the states"):
+        LinearDiscriminantClassifier.fit_dataset(load_by_id(run_id))
@@ -0,0 +1,161 @@
+"""Unit tests for running measurements on several boards with `run_on_boards()`."""
+
+import json
+import threading
+import time
+
+import pytest
+from qcodes import (
+    Measurement,
+    load_by_id,
+)
+
+from qcodes_qick.coordinator_v2 import BoardRun, _PointSynchronizer, run_on_boards
+from qcodes_qick.instrument_v2 import QickInstrument, SoftwareSweep
+
+
+@pytest.fixture
+def boards(make_qi):
+    # 20 ms per point, and the boards run different macro lists
+    return [
+        make_qi(hard_avgs=1000, delay=n * 1e-6, noise=30, shot_time=2e-5, seed=n)
+        for n in range(3)
+    ]
+
+
+def _sweep(inst: QickInstrument, num_points: int) -> SoftwareSweep:
+    return SoftwareSweep(inst.dacs[0].readout_pulse.gain, 0.1, 0.5, num_points)
+
+
+def _board_run(inst: QickInstrument, num_points: int = 5, **kwargs) -> BoardRun:
+    return BoardRun(
+        inst,
+        Measurement(name=inst.name),
+        software_sweeps=[_sweep(inst, num_points)],
+        **kwargs,
+    )
+
+
+def test_run_on_boards_runs_concurrently(boards, monkeypatch):
+    # the first point of each board is only acquired once all boards have started,
+    # so the boards must run concurrently
+    started = threading.Barrier(len(boards), timeout=5)
+    for inst in boards:
+        acquire_point = inst._acquire_point  # noqa: SLF001
+        num_acquired = [0]
+
+        def acquire(
+            *args: object,
+            acquire_point=acquire_point,
+            num_acquired=num_acquired,
+            **kwargs,
+        ) -> None:
+            if num_acquired[0] == 0:
+                started.wait()
+            num_acquired[0] += 1
+            acquire_point(*args, **kwargs)
+
+        monkeypatch.setattr(inst, "_acquire_point", acquire)
+    run_ids = run_on_boards([_board_run(inst) for inst in boards])
+
+    for inst, run_id in zip(boards, run_ids):
+        dataset = load_by_id(run_id)
+        assert dataset.name == inst.name
+        assert len(dataset.get_parameter_data()["iq"]["iq"]) == 5
+        assert json.loads(dataset.metadata["qick_linked_run_ids"]) == run_ids
+
+
+@pytest.mark.parametrize("synchronize_points", [False, True])
+def test_run_on_boards_synchronizes_points(boards, synchronize_points):
+    # the first board is the fastest and has the fewest points
+    saved = {inst.name: [] for inst in boards}
+    runs = []
+    for n, inst in enumerate(boards):
+        inst.hard_avgs.set(500 * (n + 1))
+        runs.append(
+            _board_run(
+                inst,
+                num_points=5 + n,
+                progress_callback=lambda *_, times=saved[inst.name]: times.append(
+                    time.perf_counter()
+                ),
+            )
+        )
+    run_ids = run_on_boards(runs, synchronize_points=synchronize_points)
+
+    fast, slow = saved[boards[0].name], saved[boards[2].name]
+    # A point is saved after the next point is acquired, except the last one.
+    # If the points start together, the fast board saves a point only after the
+    # slow board has saved the point before.
+    assert all(f > s for f, s in zip(fast[1:-1], slow)) == synchronize_points
+    # the boards which still have points left are not held back by the finished ones
+    assert [len(saved[inst.name]) for inst in boards] == [5, 6, 7]
+    assert len(load_by_id(run_ids[2]).get_parameter_data()["iq"]["iq"]) == 7
+
+
+def test_run_on_boards_cancels_the_other_boards_on_failure(boards, monkeypatch):
+    failed = threading.Event()
+
+    def fail(num_saved, num_points):  # noqa: ARG001
+        if num_saved == 2:
+            failed.set()
+            msg = "failed"
+            raise RuntimeError(msg)
+
+    runs = [_board_run(inst, num_points=200) for inst in boards]
+    runs[1].kwargs["progress_callback"] = fail
+    for inst in [boards[0], boards[2]]:
+        acquire_point = inst._acquire_point  # noqa: SLF001
+        num_acquired = [0]
+
+        def acquire(
+            *args: object,
+            acquire_point=acquire_point,
+            num_acquired=num_acquired,
+            **kwargs,
+        ) -> None:
+            # the other boards cannot finish before the failure
+            if num_acquired[0] >= 5:
+                failed.wait(5)
+            num_acquired[0] += 1
+            acquire_point(*args, **kwargs)
+
+        monkeypatch.setattr(inst, "_acquire_point", acquire)
+    with pytest.raises(RuntimeError, match="failed"):
+        run_on_boards(runs)
+    for inst in boards:
+        assert inst.soc.readout_job is None
+        assert len(inst.last_run_metrics.points) < 200
+
+
+def test_run_on_boards_cancels_the_other_boards_on_invalid_arguments(boards):
+    # the first board fails before the other one has started its run
+    runs = [_board_run(boards[0], iq_dtype="bad"), _board_run(boards[1], 100)]
+    with pytest.raises(ValueError, match="iq_dtype"):
+        run_on_boards(runs)
+    assert boards[1].soc.readout_job is None
+    assert len(boards[1].last_run_metrics.points) < 100
+    # the cancellation does not stop the next run
+    run_ids = run_on_boards([_board_run(inst, 2) for inst in boards[:2]])
+    assert len(load_by_id(run_ids[1]).get_parameter_data()["iq"]["iq"]) == 2
+
+
+def test_run_on_boards_rejects_the_same_board_twice(boards):
+    with pytest.raises(ValueError, match="one measurement at a time"):
+        run_on_boards([_board_run(boards[0]), _board_run(boards[0])])
+
+
+def test_point_synchronizer_releases_when_a_party_leaves():
+    synchronizer = _PointSynchronizer(2)
+    released = threading.Event()
+
+    def wait():
+        synchronizer.wait()
+        released.set()
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    assert not released.wait(0.05)
+    synchronizer.leave()
+    thread.join(1)
+    assert released.is_set()
@@ -0,0 +1,108 @@
+"""Unit tests for adding the results of `QickInstrument.run()` on a background thread."""
+
+import threading
+import time
+from collections.abc import Callable
+
+import pytest
+from qcodes import (
+    Measurement,
+    load_by_id,
+)
+from qcodes.dataset.measurements import DataSaver
+
+from qcodes_qick.instrument_v2 import QickInstrument, SoftwareSweep
+from qcodes_qick.macros_v2 import DelayAuto, PlayPulse, Trigger
+
+
+@pytest.fixture
+def qi(make_qi):
+    # 10 ms per point
+    return make_qi(hard_avgs=1000, noise=30, shot_time=1e-5, seed=0)
+
+
+def _run(inst: QickInstrument, num_points: int, **kwargs) -> int:
+    return inst.run(
+        Measurement(name="writer"),
+        [SoftwareSweep(inst.dacs[0].readout_pulse.gain, 0.1, 0.5, num_points)],
+        **kwargs,
+    )
+
+
+def _slow_writes(saved: list) -> Callable[[int, int], None]:
+    def report(num_saved, num_points):  # noqa: ARG001
+        # the progress is reported on the thread of the writer, which it holds up
+        assert threading.current_thread() is not threading.main_thread()
+        time.sleep(0.05)
+        saved.append(time.perf_counter())
+
+    return report
+
+
+def test_acquisition_does_not_wait_for_the_writes(qi):
+    started, saved = [], []
+    run_id = _run(
+        qi,
+        5,
+        before_each_point=lambda: started.append(time.perf_counter()),
+        progress_callback=_slow_writes(saved),
+    )
+    # all points are acquired while the first ones are being written
+    assert started[-1] < saved[1]
+    assert len(saved) == 5
+    assert len(load_by_id(run_id).get_parameter_data()["iq"]["iq"]) == 5
+
+
+def test_acquisition_waits_for_max_pending_writes(qi):
+    qi.max_pending_writes.set(1)
+    started, saved = [], []
+    _run(
+        qi,
+        5,
+        before_each_point=lambda: started.append(time.perf_counter()),
+        progress_callback=_slow_writes(saved),
+    )
+    # at most one point waits to be written while another is written and acquired
+    for n in range(3, 5):
+        assert started[n] > saved[n - 3]
+
+
+def test_points_acquired_before_an_error_are_saved(qi):
+    num_started = 0
+
+    def fail():
+        nonlocal num_started
+        num_started += 1
+        if num_started == 4:
+            msg = "failed"
+            raise RuntimeError(msg)
+
+    with pytest.raises(RuntimeError, match="failed"):
+        _run(qi, 10, before_each_point=fail)
+    data = load_by_id(qi.last_run_metrics.run_id).get_parameter_data()
+    assert len(data["iq"]["iq"]) == 3
+
+
+def test_readouts_of_a_point_are_added_together(qi, monkeypatch):
+    adc, pulse = qi.adcs[0], qi.dacs[0].readout_pulse
+    qi.set_macro_list(
+        [
+            *(Trigger(qi, adc, t=0), PlayPulse(qi, pulse), DelayAuto(qi, 10e-9)),
+            *(Trigger(qi, adc, t=0), PlayPulse(qi, pulse), DelayAuto(qi, 10e-9)),
+        ]
+    )
+    calls = []
+    add_result = DataSaver.add_result
+
+    def count_add_result(self, *results: tuple) -> None:
+        calls.append([parameter for parameter, _ in results])
+        add_result(self, *results)
+
+    monkeypatch.setattr(DataSaver, "add_result", count_add_result)
+    run_id = _run(qi, 3)
+    data = load_by_id(run_id).get_parameter_data()
+    # one call per point, with the setpoint once
+    assert len(calls) == 3
+    assert [parameter.name for parameter in calls[0]] == ["gain", "iq0", "iq1"]
+    for name in ["iq0", "iq1"]:
+        assert len(data[name][name]) == 3
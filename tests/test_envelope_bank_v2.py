@@ -0,0 +1,84 @@
+"""Unit tests for the envelope banks of hardware-swept envelope parameters."""
+
+import numpy as np
+import pytest
+from qcodes import Measurement, load_by_id
+from qick.asm_v2 import QickSweep1D
+
+from qcodes_qick.envelopes_v2.gaussian import GaussianEnvelope
+from qcodes_qick.envelopes_v2.gaussian_drag import GaussianDragEnvelope
+from qcodes_qick.macros_v2 import DelayAuto, PlayPulse, Trigger
+from qcodes_qick.pulses_v2.arbitrary_pulse import ArbitraryPulse
+
+
+@pytest.fixture
+def qi(make_qi):
+    return make_qi(noise=30, seed=0)
+
+
+def _play(qi, envelope_class: type) -> ArbitraryPulse:
+    """Play a pulse with the envelope before each readout."""
+    dac, adc = qi.dacs[0], qi.adcs[0]
+    pulse = ArbitraryPulse(dac, "drive_pulse", envelope_class(dac))
+    qi.set_macro_list(
+        [
+            PlayPulse(qi, pulse),
+            DelayAuto(qi, 10e-9),
+            Trigger(qi, adc, t=0),
+            PlayPulse(qi, dac.readout_pulse),
+            DelayAuto(qi, 10e-9),
+        ]
+    )
+    return pulse
+
+
+def _envelopes(qi, envelope, hardware_loop_counts: dict[str, int]) -> np.ndarray:
+    """Get the samples of the envelope bank, one row per envelope."""
+    envs = qi.get_program(hardware_loop_counts).envelopes[0]["envs"]
+    first = envs[envelope.short_name]["data"]
+    if f"{envelope.short_name}_bank" not in envs:
+        return first[np.newaxis]
+    bank = envs[f"{envelope.short_name}_bank"]["data"].reshape(-1, *first.shape)
+    return np.concatenate([first[np.newaxis], bank])
+
+
+@pytest.mark.parametrize("envelope_class", [GaussianEnvelope, GaussianDragEnvelope])
+def test_bank_envelopes_match_the_scalar_envelopes(qi, envelope_class):
+    envelope = _play(qi, envelope_class).envelope
+    envelope.sigma.set(QickSweep1D("sigma", 50e-9, 150e-9))
+    bank = _envelopes(qi, envelope, {"sigma": 5})
+    assert len(bank) == 5
+    for k, sigma in enumerate(np.linspace(50e-9, 150e-9, 5)):
+        envelope.sigma.set(sigma)
+        np.testing.assert_array_equal(bank[k], _envelopes(qi, envelope, {})[0])
+
+
+def test_bank_values_do_not_modify_the_sweep(qi):
+    envelope = _play(qi, GaussianEnvelope).envelope
+    sweep = QickSweep1D("sigma", 50e-9, 150e-9)
+    envelope.sigma.set(sweep)
+    bank_loops = envelope.get_bank_loops(qi.get_program({"sigma": 3}))
+    np.testing.assert_allclose(
+        envelope.get_bank_values(envelope.sigma, bank_loops), [50e-9, 100e-9, 150e-9]
+    )
+    assert envelope.sigma.qick_param is sweep
+    assert sweep.raw_param is None
+
+
+def test_bank_sweep_saves_the_exact_values(qi):
+    envelope = _play(qi, GaussianEnvelope).envelope
+    envelope.sigma.set(QickSweep1D("sigma", 50e-9, 150e-9))
+    run_id = qi.run(Measurement(name="bank"), hardware_loop_counts={"sigma": 3})
+    data = load_by_id(run_id).get_parameter_data()["iq"]
+    np.testing.assert_array_equal(
+        data[envelope.sigma.full_name][0], np.linspace(50e-9, 150e-9, 3)
+    )
+
+
+def test_bank_must_fit_into_the_envelope_memory(qi):
+    envelope = _play(qi, GaussianEnvelope).envelope
+    maxlen = qi.soccfg["gens"][0]["maxlen"]
+    length = len(_envelopes(qi, envelope, {})[0])
+    envelope.sigma.set(QickSweep1D("sigma", 50e-9, 150e-9))
+    with pytest.raises(RuntimeError, match="do not fit into the envelope memory"):
+        qi.get_program({"sigma": maxlen // length + 1})
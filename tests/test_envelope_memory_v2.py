@@ -0,0 +1,117 @@
+"""Unit tests for `EnvelopeMemory`, which skips loading resident envelopes."""
+
+import numpy as np
+
+from qcodes_qick.envelope_base_v2 import EnvelopeMemory
+from qcodes_qick.envelopes_v2.gaussian import GaussianEnvelope
+from qcodes_qick.macros_v2 import DelayAuto, PlayPulse, Trigger
+from qcodes_qick.pulses_v2.arbitrary_pulse import ArbitraryPulse
+
+
+class FakeSoc:
+    """Records the envelopes loaded onto the board."""
+
+    def __init__(self):
+        self.loaded = []
+
+    def load_envelope(self, ch, data, addr):
+        self.loaded.append((ch, addr, len(data)))
+
+
+def _data(length: int, value: int = 1) -> np.ndarray:
+    return np.full((length, 2), value, dtype=np.int16)
+
+
+def test_envelope_memory_loads_new_envelope():
+    memory, soc = EnvelopeMemory(), FakeSoc()
+    memory.load(soc, 0, 0, _data(16), "a")
+    assert soc.loaded == [(0, 0, 16)]
+    np.testing.assert_array_equal(memory.find(0, "a"), _data(16))
+
+
+def test_envelope_memory_skips_resident_envelope():
+    memory, soc = EnvelopeMemory(), FakeSoc()
+    memory.load(soc, 0, 0, _data(16), "a")
+    memory.load(soc, 0, 0, _data(16), "a")
+    assert soc.loaded == [(0, 0, 16)]
+
+
+def test_envelope_memory_channels_are_separate():
+    memory, soc = EnvelopeMemory(), FakeSoc()
+    memory.load(soc, 0, 0, _data(16), "a")
+    memory.load(soc, 1, 0, _data(16), "a")
+    assert soc.loaded == [(0, 0, 16), (1, 0, 16)]
+    assert memory.find(2, "a") is None
+
+
+def test_envelope_memory_always_loads_envelope_without_key():
+    memory, soc = EnvelopeMemory(), FakeSoc()
+    memory.load(soc, 0, 0, _data(16), None)
+    memory.load(soc, 0, 0, _data(16), None)
+    assert len(soc.loaded) == 2
+
+
+def test_envelope_memory_forgets_overwritten_envelopes():
+    memory, soc = EnvelopeMemory(), FakeSoc()
+    memory.load(soc, 0, 0, _data(16), "a")
+    memory.load(soc, 0, 16, _data(16), "b")
+    memory.load(soc, 0, 8, _data(16, 2), "c")
+    assert memory.find(0, "a") is None
+    assert memory.find(0, "b") is None
+    memory.load(soc, 0, 0, _data(16), "a")
+    assert len(soc.loaded) == 4
+
+
+def test_envelope_memory_invalidate():
+    memory, soc = EnvelopeMemory(), FakeSoc()
+    memory.load(soc, 0, 0, _data(16), "a")
+    memory.load(soc, 1, 0, _data(16), "a")
+    memory.invalidate(channel=0)
+    assert memory.find(0, "a") is None
+    assert memory.find(1, "a") is not None
+    memory.invalidate()
+    assert memory.find(1, "a") is None
+    memory.load(soc, 1, 0, _data(16), "a")
+    assert len(soc.loaded) == 3
+
+
+def test_second_run_reuses_the_resident_envelope(make_qi, monkeypatch):
+    qi = make_qi(noise=30, seed=0)
+    dac, adc = qi.dacs[0], qi.adcs[0]
+    pulse = ArbitraryPulse(dac, "drive_pulse", GaussianEnvelope(dac))
+    qi.set_macro_list(
+        [
+            PlayPulse(qi, pulse),
+            DelayAuto(qi, 10e-9),
+            Trigger(qi, adc, t=0),
+            PlayPulse(qi, dac.readout_pulse),
+            DelayAuto(qi, 10e-9),
+        ]
+    )
+    calculated, loaded = [], []
+    calculate = GaussianEnvelope.calculate
+    load_envelope = qi.soc.load_envelope
+
+    def count_calculate(self, *args: object, **kwargs):
+        calculated.append(self.short_name)
+        return calculate(self, *args, **kwargs)
+
+    def count_load_envelope(ch, data, addr):
+        loaded.append((ch, addr, len(data)))
+        load_envelope(ch, data, addr)
+
+    monkeypatch.setattr(GaussianEnvelope, "calculate", count_calculate)
+    monkeypatch.setattr(qi.soc, "load_envelope", count_load_envelope)
+    qi.run_without_saving()
+    assert calculated == ["GaussianEnvelope"]
+    assert len(loaded) == 1
+    samples = qi.soc.envelopes[0, 0]
+    avg_length = qi.soc.avg_lengths[0]
+
+    # a shorter readout window reconfigures the board, but not the envelope
+    adc.length.set(0.5e-6)
+    qi.run_without_saving()
+    assert qi.soc.avg_lengths[0] < avg_length
+    assert calculated == ["GaussianEnvelope"]
+    assert len(loaded) == 1
+    np.testing.assert_array_equal(qi.soc.envelopes[0, 0], samples)
@@ -0,0 +1,119 @@
+"""Unit tests for the vectorized `geometric_median`."""
+
+import numpy as np
+import pytest
+from geom_median.numpy import compute_geometric_median
+from qcodes import (
+    Measurement,
+    load_by_id,
+)
+
+from qcodes_qick.geometric_median import StreamingGeometricMedian, geometric_median
+from qcodes_qick.iq import iq_to_complex
+
+
+def _reference(data: np.ndarray, ftol: float = 1e-6) -> np.ndarray:
+    """Compute the geometric median of each sweep point separately."""
+    flat = data.reshape(data.shape[0], -1, data.shape[-1])
+    result = [
+        compute_geometric_median(flat[:, i, :], ftol=ftol).median
+        for i in range(flat.shape[1])
+    ]
+    return np.reshape(result, data.shape[1:])
+
+
+@pytest.mark.parametrize("sweep_shape", [(), (7,), (4, 5)])
+def test_geometric_median_matches_reference(sweep_shape):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(scale=1000, size=(*sweep_shape, 2))
+    data = centers + rng.standard_cauchy(size=(200, *sweep_shape, 2)) * 100
+    result = geometric_median(data)
+    assert result.shape == (*sweep_shape, 2)
+    np.testing.assert_allclose(result, _reference(data), rtol=1e-9, atol=1e-9)
+
+
+def test_geometric_median_of_integer_shots():
+    rng = np.random.default_rng(1)
+    data = rng.integers(-1000, 1000, size=(500, 3, 2), dtype=np.int64)
+    np.testing.assert_allclose(
+        geometric_median(data), _reference(data.astype(float)), rtol=1e-9, atol=1e-9
+    )
+
+
+def test_geometric_median_ignores_outliers():
+    data = np.zeros((101, 2))
+    data[:60, 0] = 1
+    data[-1] = 1e6
+    assert geometric_median(data, ftol=1e-12) == pytest.approx([1, 0], abs=1e-3)
+
+
+def _shots(num_shots: int, shape: tuple[int, ...]) -> np.ndarray:
+    rng = np.random.default_rng(2)
+    centers = rng.normal(scale=1e4, size=(*shape, 2))
+    shots = centers + rng.normal(scale=1000, size=(num_shots, *shape, 2))
+    # outliers which shift the mean but not the median
+    shots[rng.random(num_shots) < 0.05] += 20000
+    return shots.astype(np.int64)
+
+
+def _feed(estimator: StreamingGeometricMedian, shots: np.ndarray, chunk: int) -> None:
+    flat = shots.reshape(-1, 2)
+    for start in range(0, len(flat), chunk):
+        estimator.update(flat[start : start + chunk])
+
+
+def test_streaming_geometric_median_is_exact_within_warmup():
+    shots = _shots(500, (3, 2))
+    estimator = StreamingGeometricMedian((3, 2), num_warmup_shots=500)
+    _feed(estimator, shots, chunk=777)
+    median = geometric_median(shots)
+    mad = np.median(np.linalg.norm(shots - median, axis=-1), axis=0)
+    np.testing.assert_array_equal(estimator.median(), median)
+    np.testing.assert_array_equal(estimator.mad(), mad)
+
+
+def test_streaming_geometric_median_approximates_all_shots():
+    shots = _shots(100_000, (4,))
+    estimator = StreamingGeometricMedian((4,), num_warmup_shots=1000)
+    _feed(estimator, shots, chunk=3001)
+    median = geometric_median(shots)
+    mad = np.median(np.linalg.norm(shots - median, axis=-1), axis=0)
+    assert estimator.num_values == shots.size // 2
+    # the statistical uncertainty of the median is about 1000 / sqrt(100_000)
+    np.testing.assert_allclose(estimator.median(), median, atol=10)
+    np.testing.assert_allclose(estimator.mad(), mad, rtol=1e-2)
+
+
+def test_geometric_median_in_run_is_exact_when_buffered(make_qi):
+    qi = make_qi(hard_avgs=5000, populations=[1, 0], noise=100, seed=0)
+    run_id = qi.run(
+        Measurement(name="geometric_median"),
+        acquisition_mode="accumulated geometric median",
+    )
+    (shots,) = qi.get_program({}).acc_buf
+    iq = shots[..., 0, :]
+    # the shots are buffered, so the median and the MAD are exact
+    median = iq_to_complex(geometric_median(iq))
+    mad = np.median(abs(iq_to_complex(iq) - median), axis=0)
+    data = load_by_id(run_id).get_parameter_data()
+    assert data["iq"]["iq"][0] == pytest.approx(median, rel=1e-12)
+    assert data["iq_mad"]["iq_mad"][0] == pytest.approx(mad, rel=1e-12)
+
+
+def test_streaming_geometric_median_in_run(make_qi):
+    qi = make_qi(hard_avgs=5000, populations=[1, 0], noise=100, seed=0)
+    qi.max_buffered_reads.set(1000)
+    run_id = qi.run(
+        Measurement(name="geometric_median"),
+        acquisition_mode="accumulated geometric median",
+    )
+    program = qi.get_program({})
+    # the shots were not buffered
+    assert program.acc_buf == []
+    data = load_by_id(run_id).get_parameter_data()
+    length = program.ro_chs[0]["length"]
+    assert data["iq"]["iq"][0] / length == pytest.approx(300 + 100j, abs=5)
+    # the distance of Gaussian noise from its center has a Rayleigh distribution
+    assert data["iq_mad"]["iq_mad"][0] == pytest.approx(
+        100 * np.sqrt(length) * np.sqrt(2 * np.log(2)), rel=0.05
+    )
@@ -0,0 +1,80 @@
+"""Unit tests for the "histogram" acquisition mode and `StreamingHistogram`."""
+
+import numpy as np
+import pytest
+from qcodes import (
+    Measurement,
+    load_by_id,
+)
+from qick.asm_v2 import QickSweep1D
+
+from qcodes_qick.histogram import StreamingHistogram, bin_centers
+from qcodes_qick.instrument_v2 import QickInstrument, SoftwareSweep
+
+
+def test_streaming_histogram_matches_histogram2d():
+    rng = np.random.default_rng(0)
+    shots = rng.normal(scale=3, size=(1000, 3, 2, 2))
+    # values on the edges, which are counted as in np.histogram2d
+    shots[:10] = [5, 6]
+    i_edges = np.linspace(-5, 5, 11)
+    q_edges = np.linspace(-4, 6, 7)
+    histogram = StreamingHistogram((3, 2), i_edges, q_edges)
+    flat = shots.reshape(-1, 2)
+    for start in range(0, len(flat), 77):
+        histogram.update(flat[start : start + 77])
+    expected = [
+        [
+            np.histogram2d(*shots[:, a, b].T, bins=[i_edges, q_edges])[0]
+            for b in range(2)
+        ]
+        for a in range(3)
+    ]
+    np.testing.assert_array_equal(histogram.counts, expected)
+    assert histogram.num_values == 6000
+
+
+@pytest.fixture
+def qi(make_qi):
+    return make_qi(populations=[0.3, 0.7], noise=100, seed=0)
+
+
+def _bins(qi: QickInstrument, hardware_loop_counts: dict[str, int]):
+    """Get bins of I and Q which cover the states of the simulated board."""
+    length = qi.get_program(hardware_loop_counts).ro_chs[0]["length"]
+    edges = np.linspace(-200, 600, 41) * length
+    return edges, edges[:31]
+
+
+def test_histogram_run(qi):
+    qi.hard_avgs.set(1000)
+    qi.soft_avgs.set(2)
+    qi.dacs[0].readout_pulse.gain.set(QickSweep1D("gain", 0.1, 0.5))
+    i_edges, q_edges = _bins(qi, {"gain": 3})
+    run_id = qi.run(
+        Measurement(name="histogram"),
+        software_sweeps=[SoftwareSweep(qi.dacs[0].readout_pulse.freq, 1e8, 2e8, 2)],
+        hardware_loop_counts={"gain": 3},
+        acquisition_mode="histogram",
+        histogram_bins=(i_edges, q_edges),
+    )
+    data = load_by_id(run_id).get_parameter_data()["histogram"]
+    counts = data["histogram"]
+    assert counts.shape == (2, 3, 40, 30)
+    np.testing.assert_array_equal(counts.sum(axis=(-2, -1)), np.full((2, 3), 2000))
+    np.testing.assert_array_equal(data["i"][0, 0, :, 0], bin_centers(i_edges))
+    np.testing.assert_array_equal(data["q"][0, 0, 0, :], bin_centers(q_edges))
+    np.testing.assert_allclose(
+        data[f"{qi.name}_dac0_readout_pulse_gain"][0, :, 0, 0],
+        [0.1, 0.3, 0.5],
+        atol=1e-3,
+    )
+    # the state 1 at 100 + 300j is above the line I = Q
+    above = data["q"] > data["i"]
+    population = (counts * above).sum(axis=(-2, -1)) / 2000
+    np.testing.assert_allclose(population, 0.7, atol=0.05)
+
+
+def test_histogram_requires_bins(qi):
+    with pytest.raises(ValueError, match="histogram_bins"):
+        qi.run(Measurement(name="histogram"), acquisition_mode="histogram")
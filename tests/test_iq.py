@@ -0,0 +1,32 @@
+"""Unit tests for `iq_to_complex`."""
+
+import numpy as np
+import pytest
+
+from qcodes_qick.iq import iq_to_complex
+
+
+def test_iq_to_complex_views_float_buffers():
+    rng = np.random.default_rng(0)
+    iq = rng.normal(size=(2, 5, 3, 2))
+    # a readout of the averaged data, whose I and Q are still next to each other
+    readout = iq[1, ..., 2, :]
+    result = iq_to_complex(readout)
+    np.testing.assert_array_equal(result, readout.dot([1, 1j]))
+    assert np.shares_memory(result, iq)
+
+
+@pytest.mark.parametrize("dtype", [np.int32, np.int64, np.float32])
+def test_iq_to_complex_converts_other_dtypes(dtype):
+    rng = np.random.default_rng(0)
+    iq = rng.integers(-(2**20), 2**20, size=(100, 3, 2)).astype(dtype)
+    result = iq_to_complex(iq)
+    assert result.dtype == np.complex128
+    np.testing.assert_array_equal(result, iq.dot([1, 1j]))
+
+
+def test_iq_to_complex_copies_separated_quadratures():
+    iq = np.arange(12.0).reshape(2, 6).T
+    result = iq_to_complex(iq)
+    np.testing.assert_array_equal(result, iq.dot([1, 1j]))
+    assert not np.shares_memory(result, iq)
@@ -0,0 +1,109 @@
+"""Unit tests for the metrics which `QickInstrument.run()` records."""
+
+import json
+
+import pytest
+from qcodes import (
+    Measurement,
+    load_by_id,
+)
+
+from qcodes_qick.instrument_v2 import QickInstrument, SoftwareSweep
+from qcodes_qick.macros_v2 import DelayAuto
+from qcodes_qick.metrics_v2 import MeteredSoc, PointMetrics
+from qcodes_qick.simulated_soc_v2 import SimulatedQickSoc
+
+
+@pytest.fixture
+def qi(make_qi):
+    return make_qi(seed=0)
+
+
+def _sweep(inst: QickInstrument) -> SoftwareSweep:
+    return SoftwareSweep(inst.dacs[0].readout_pulse.gain, 0.1, 0.3, 3)
+
+
+def test_run_records_metrics_of_each_point(qi):
+    run_id = qi.run(Measurement(name="metrics"), software_sweeps=[_sweep(qi)])
+    metrics = qi.last_run_metrics
+    assert metrics.run_id == run_id
+    assert [point.software_sweep_indices for point in metrics.points] == [
+        (0,),
+        (1,),
+        (2,),
+    ]
+    # the first point reuses the program compiled to find the readouts
+    assert [point.program_cache_hit for point in metrics.points] == [
+        True,
+        False,
+        False,
+    ]
+    for point in metrics.points:
+        assert point.build_time > 0
+        assert point.assemble_time > 0 or point.program_cache_hit
+        assert point.load_time > 0
+        assert point.run_time > 0
+        assert point.write_time > 0
+        # 100 shots of one int32 IQ pair
+        assert point.transfer_bytes == 100 * 8
+    assert metrics.totals()["transfer_bytes"] == 3 * 100 * 8
+    assert metrics.total_time >= sum(point.write_time for point in metrics.points)
+    assert 0 < metrics.duty_cycle() < 1
+
+
+def test_run_metrics_count_program_cache_hits(qi):
+    qi.run(Measurement(name="metrics"), software_sweeps=[_sweep(qi)])
+    qi.run(Measurement(name="metrics"), software_sweeps=[_sweep(qi)])
+    metrics = qi.last_run_metrics
+    assert metrics.totals()["program_cache_hits"] == 3
+    assert all(point.assemble_time == 0 for point in metrics.points)
+
+
+def test_program_cache_misses_only_when_the_program_changes(qi):
+    def cache_hit() -> bool:
+        metrics = PointMetrics()
+        qi.get_program({}, metrics)
+        return metrics.program_cache_hit
+
+    assert not cache_hit()
+    assert cache_hit()
+    # settings which do not go into the program
+    qi.soft_avgs.set(2)
+    qi.max_buffered_reads.set(10**6)
+    qi.max_pending_writes.set(2)
+    qi.program_cache_size.set(4)
+    assert cache_hit()
+    # a parameter of a pulse
+    qi.dacs[0].readout_pulse.length.set(2e-6)
+    assert not cache_hit()
+    # the macro list
+    qi.set_macro_list([*qi.macro_list, DelayAuto(qi, 1e-6)])
+    assert not cache_hit()
+    # a parameter of the instrument which the program reads
+    qi.final_delay.set(2e-6)
+    assert not cache_hit()
+
+
+def test_run_saves_metrics_as_metadata(qi):
+    run_id = qi.run(Measurement(name="metrics"), save_metrics=True)
+    metadata = json.loads(load_by_id(run_id).metadata["qick_metrics"])
+    assert metadata == json.loads(json.dumps(qi.last_run_metrics.as_dict()))
+    assert len(metadata["points"]) == 1
+
+
+def test_run_does_not_save_metrics_by_default(qi):
+    run_id = qi.run(Measurement(name="metrics"))
+    assert "qick_metrics" not in load_by_id(run_id).metadata
+
+
+def test_metered_soc_records_transfers():
+    soc = SimulatedQickSoc(seed=0)
+    metrics = PointMetrics()
+    metered = MeteredSoc(soc, metrics)
+    metered.config_buf(0, length=100)
+    metered.start_tproc()
+    data = metered.get_decimated(0, length=100)
+    metered.cleanup_round()
+    assert metrics.transfer_bytes == data.nbytes == 100 * 2 * 2
+    assert metrics.transfer_time > 0
+    assert metrics.run_time > 0
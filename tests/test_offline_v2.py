@@ -0,0 +1,108 @@
+"""Unit tests for creating a `QickInstrument` offline from a cached board configuration."""
+
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING
+
+import pytest
+from qick.qick_asm import QickConfig
+
+from qcodes_qick import instrument_v2
+from qcodes_qick.instrument_v2 import QickInstrument
+from qcodes_qick.macros_v2 import DelayAuto, PlayPulse, Trigger
+from qcodes_qick.pulses_v2 import ConstantPulse
+from qcodes_qick.simulated_soc_v2 import SimulatedQickSoc, simulated_soccfg
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+@pytest.fixture
+def soccfg_path(tmp_path):
+    path = tmp_path / "soccfg.json"
+    path.write_text(json.dumps(simulated_soccfg()))
+    return path
+
+
+@pytest.fixture
+def proxies(monkeypatch) -> list[SimulatedQickSoc]:
+    """Get the queue of boards which the simulated `make_proxy` connects to."""
+    proxies = []
+
+    def make_proxy(ns_host: str, ns_port: int) -> tuple[SimulatedQickSoc, QickConfig]:
+        assert (ns_host, ns_port) == ("192.0.2.1", 8888)
+        soc = proxies.pop(0)
+        return soc, QickConfig(soc.get_cfg())
+
+    monkeypatch.setattr(instrument_v2, "make_proxy", make_proxy)
+    return proxies
+
+
+@pytest.fixture
+def make_offline_qi(soccfg_path) -> Callable[..., QickInstrument]:
+    instruments = []
+
+    def make_offline_qi(ns_host: str | None = "192.0.2.1") -> QickInstrument:
+        inst = QickInstrument(
+            ns_host, name=f"offline{len(instruments)}", soccfg_path=soccfg_path
+        )
+        instruments.append(inst)
+        return inst
+
+    yield make_offline_qi
+    for inst in instruments:
+        inst.close()
+
+
+def test_instrument_is_created_and_compiles_without_a_board(make_offline_qi, proxies):
+    qi = make_offline_qi()
+    assert qi.soccfg["board"] == "ZCU216"
+    assert len(qi.dacs) == 4
+    dac, adc = qi.dacs[0], qi.adcs[0]
+    pulse = ConstantPulse(dac, "readout_pulse")
+    qi.set_macro_list(
+        [Trigger(qi, adc, t=0), PlayPulse(qi, pulse), DelayAuto(qi, 10e-9)]
+    )
+    program = qi.get_program({})
+    assert program.binprog is not None
+    # the board has not been connected to
+    assert proxies == []
+    assert qi._soc is None  # noqa: SLF001
+
+
+def test_board_is_connected_on_first_use(make_offline_qi, proxies):
+    qi = make_offline_qi()
+    board = SimulatedQickSoc()
+    proxies.append(board)
+    assert qi.soc is board
+    assert proxies == []
+    # the connection is kept
+    assert qi.soc is board
+
+
+def test_changed_board_configuration_is_an_error(make_offline_qi, proxies, soccfg_path):
+    qi = make_offline_qi()
+    proxies.append(SimulatedQickSoc(simulated_soccfg(num_dacs=2)))
+    with pytest.raises(RuntimeError, match="board configuration has changed"):
+        qi.soc  # noqa: B018
+    # the cache is updated for the next instrument
+    assert len(QickConfig(str(soccfg_path))["gens"]) == 2
+    assert len(make_offline_qi().dacs) == 2
+
+
+def test_missing_cache_is_written_after_connecting(
+    make_offline_qi, proxies, soccfg_path
+):
+    soccfg_path.unlink()
+    board = SimulatedQickSoc()
+    proxies.append(board)
+    qi = make_offline_qi()
+    assert qi.soc is board
+    assert QickConfig(str(soccfg_path)).dump_cfg() == qi.soccfg.dump_cfg()
+
+
+def test_offline_instrument_without_nameserver_cannot_connect(make_offline_qi):
+    qi = make_offline_qi(ns_host=None)
+    with pytest.raises(RuntimeError, match="`ns_host` is None"):
+        qi.soc  # noqa: B018
@@ -0,0 +1,73 @@
+"""Unit tests for the partial results which `QickInstrument.run()` saves during the rounds."""
+
+import numpy as np
+import pytest
+from qcodes import (
+    Measurement,
+    load_by_id,
+)
+from qick.asm_v2 import QickSweep1D
+
+from qcodes_qick.instrument_v2 import QickInstrument, SoftwareSweep
+
+
+@pytest.fixture
+def make_partial_qi(make_qi):
+    def make_partial_qi() -> QickInstrument:
+        inst = make_qi(noise=30, seed=0)
+        inst.soft_avgs.set(4)
+        inst.dacs[0].readout_pulse.gain.set(QickSweep1D("gain", 0.1, 0.5))
+        return inst
+
+    return make_partial_qi
+
+
+def _run(inst: QickInstrument, **kwargs) -> dict:
+    run_id = inst.run(
+        Measurement(name="partial"),
+        software_sweeps=[SoftwareSweep(inst.dacs[0].readout_pulse.freq, 1e8, 2e8, 2)],
+        hardware_loop_counts={"gain": 3},
+        **kwargs,
+    )
+    return load_by_id(run_id).get_parameter_data()
+
+
+@pytest.mark.parametrize("max_buffered_reads", [0, 2**24])
+def test_partial_results_are_saved_after_every_n_rounds(
+    make_partial_qi, max_buffered_reads
+):
+    partial, reference = make_partial_qi(), make_partial_qi()
+    partial.max_buffered_reads.set(max_buffered_reads)
+    data = _run(partial, partial_results_every=2)
+    reference_data = _run(reference)
+
+    # the final results are saved as without partial results
+    np.testing.assert_array_equal(data["iq"]["iq"], reference_data["iq"]["iq"])
+    # two partial results per software sweep point, the last one being the final result
+    rounds = data["iq_partial"]["round"]
+    np.testing.assert_array_equal(rounds[:, 0], [2, 4, 2, 4])
+    np.testing.assert_array_equal(
+        data["iq_partial"]["iq_partial"][1::2], data["iq"]["iq"]
+    )
+    assert not np.array_equal(data["iq_partial"]["iq_partial"][0], data["iq"]["iq"][0])
+
+
+def test_partial_histograms_count_the_rounds_so_far(make_partial_qi):
+    data = _run(
+        make_partial_qi(),
+        acquisition_mode="histogram",
+        histogram_bins=(np.linspace(-1e6, 1e6, 5), np.linspace(-1e6, 1e6, 5)),
+        partial_results_every=1,
+    )
+    counts = data["histogram_partial"]["histogram_partial"]
+    rounds = data["histogram_partial"]["round"]
+    assert len(counts) == 2 * 4
+    np.testing.assert_array_equal(counts.sum(axis=(-2, -1)), 100 * rounds[..., 0, 0])
+    np.testing.assert_array_equal(counts[3::4], data["histogram"]["histogram"])
+
+
+def test_partial_results_require_rounds_averaged_mode(make_partial_qi):
+    inst = make_partial_qi()
+    inst.soft_avgs.set(1)
+    with pytest.raises(ValueError, match="Partial results"):
+        _run(inst, acquisition_mode="accumulated shots", partial_results_every=1)
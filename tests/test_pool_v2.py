@@ -0,0 +1,197 @@
+"""Unit tests for distributing the software sweep points of `QickInstrument.run()` over a pool."""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+from qcodes import (
+    Measurement,
+    load_by_id,
+)
+from qick.asm_v2 import QickSweep1D
+
+from qcodes_qick.instrument_v2 import QickInstrument, RunCancelledError, SoftwareSweep
+from qcodes_qick.macros_v2 import PlayPulse
+from qcodes_qick.pulses_v2 import ConstantPulse
+from qcodes_qick.simulated_soc_v2 import SimulatedQickSoc
+
+
+class CountingSoc(SimulatedQickSoc):
+    """Counts the acquisitions which it has run."""
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.num_acquisitions = 0
+
+    def start_readout(self, *args: object, **kwargs) -> None:
+        self.num_acquisitions += 1
+        super().start_readout(*args, **kwargs)
+
+
+class PipelineProbe:
+    """Records whether the next point of a board is prepared while it acquires a point."""
+
+    def __init__(self, inst: QickInstrument, monkeypatch) -> None:
+        self.num_prepared = 0
+        self.num_acquired = 0
+        self.overlapped: list[bool] = []
+        self._condition = threading.Condition()
+        prepare_point = inst._prepare_point  # noqa: SLF001
+        acquire_point = inst._acquire_point  # noqa: SLF001
+
+        def prepare(*args: object) -> object:
+            with self._condition:
+                self.num_prepared += 1
+                self._condition.notify_all()
+            return prepare_point(*args)
+
+        def acquire(*args: object, **kwargs) -> None:
+            with self._condition:
+                self.overlapped.append(
+                    self._condition.wait_for(
+                        lambda: self.num_prepared > self.num_acquired + 1, timeout=0.5
+                    )
+                )
+                self.num_acquired += 1
+            acquire_point(*args, **kwargs)
+
+        monkeypatch.setattr(inst, "_prepare_point", prepare)
+        monkeypatch.setattr(inst, "_acquire_point", acquire)
+
+
+@pytest.fixture
+def make_pool_qi(make_qi):
+    def make_pool_qi(shot_time: float = 1e-5) -> QickInstrument:
+        # without noise and with a single state, every board measures the same values
+        return make_qi(
+            soc_class=CountingSoc, state_iq=[300 + 100j], noise=0, shot_time=shot_time
+        )
+
+    return make_pool_qi
+
+
+def _run(inst: QickInstrument, **kwargs) -> dict:
+    pulse = inst.dacs[0].readout_pulse
+    run_id = inst.run(
+        Measurement(name="pool"),
+        software_sweeps=[
+            # not evenly spaced, so it cannot be promoted to a hardware loop
+            SoftwareSweep(pulse.freq, [1e8, 1.5e8, 1.7e8]),
+            SoftwareSweep(pulse.phase, 0, 90, 4),
+        ],
+        **kwargs,
+    )
+    return load_by_id(run_id).get_parameter_data()
+
+
+def _assert_datasets_equal(data: dict, reference: dict) -> None:
+    assert data.keys() == reference.keys()
+    for name, values in reference.items():
+        assert values.keys() == data[name].keys()
+        for parameter in values:
+            np.testing.assert_array_equal(data[name][parameter], values[parameter])
+
+
+@pytest.mark.parametrize("promote_software_sweeps", [False, True])
+def test_pool_saves_the_same_dataset_as_one_board(
+    make_pool_qi, promote_software_sweeps
+):
+    inst, reference = make_pool_qi(), make_pool_qi()
+    pool = [make_pool_qi(), make_pool_qi()]
+    for board in [inst, reference, *pool]:
+        board.dacs[0].readout_pulse.gain.set(QickSweep1D("gain", 0.1, 0.5))
+    kwargs = {
+        "hardware_loop_counts": {"gain": 2},
+        "promote_software_sweeps": promote_software_sweeps,
+    }
+    data = _run(inst, pool=pool, **kwargs)
+    reference_data = _run(reference, **kwargs)
+    # the parameters are named after the instrument
+    reference_data = {
+        name: {
+            parameter.replace(reference.name, inst.name): values
+            for parameter, values in parameters.items()
+        }
+        for name, parameters in reference_data.items()
+    }
+    _assert_datasets_equal(data, reference_data)
+
+    num_points = 3 if promote_software_sweeps else 12
+    acquisitions = [board.soc.num_acquisitions for board in [inst, *pool]]
+    assert sum(acquisitions) == num_points
+    # each board holds its next point while it measures one, so with 3 points
+    # one of the 3 boards may measure none
+    assert sum(n > 0 for n in acquisitions) >= (2 if promote_software_sweeps else 3)
+    assert len(inst.last_run_metrics.points) == num_points
+    # the instruments are left as after a software sweep
+    for board in [inst, *pool]:
+        assert board.dacs[0].readout_pulse.freq.get() == pytest.approx(1.7e8, rel=1e-6)
+        assert board.dacs[0].readout_pulse.phase.get() == pytest.approx(90, abs=0.1)
+
+
+def test_pool_gives_more_points_to_faster_boards(make_pool_qi, monkeypatch):
+    slow, fast = make_pool_qi(), make_pool_qi()
+    acquire_point = slow._acquire_point  # noqa: SLF001
+
+    def acquire(*args: object, **kwargs) -> None:
+        # the slow board only finishes its points after the fast board has
+        # measured 8 points, while it holds at most 2 of the 12 points
+        deadline = time.monotonic() + 5
+        while fast.soc.num_acquisitions < 8 and time.monotonic() < deadline:
+            time.sleep(1e-3)
+        acquire_point(*args, **kwargs)
+
+    monkeypatch.setattr(slow, "_acquire_point", acquire)
+    _run(slow, pool=[fast])
+    assert fast.soc.num_acquisitions >= 9
+    assert slow.soc.num_acquisitions + fast.soc.num_acquisitions == 12
+
+
+def test_pool_prepares_the_next_point_during_the_acquisition(make_pool_qi, monkeypatch):
+    inst, board = make_pool_qi(), make_pool_qi()
+    probes = [PipelineProbe(b, monkeypatch) for b in [inst, board]]
+    _run(inst, pool=[board])
+    assert sum(probe.num_acquired for probe in probes) == 12
+    for probe in probes:
+        # every board has prepared its next point, except during its last point
+        assert len(probe.overlapped) > 0
+        assert all(probe.overlapped[:-1])
+
+
+def test_pool_can_be_cancelled(make_pool_qi):
+    inst, board = make_pool_qi(), make_pool_qi()
+    with pytest.raises(RunCancelledError):
+        _run(inst, pool=[board], before_each_point=inst.cancel_run)
+    assert inst.soc.num_acquisitions + board.soc.num_acquisitions < 12
+    # the cancellation does not stop the next run
+    _run(inst, pool=[board])
+
+
+def test_pool_reports_a_failing_board(make_pool_qi):
+    inst, board = make_pool_qi(), make_pool_qi()
+
+    def fail(*args: object, **kwargs) -> list:  # noqa: ARG001
+        msg = "board failed"
+        raise RuntimeError(msg)
+
+    board.soc.poll_data = fail
+    with pytest.raises(RuntimeError, match="board failed"):
+        _run(inst, pool=[board])
+    # the other board has been stopped
+    assert inst.soc.start_time is None
+
+
+def test_pool_requires_equivalent_parameters(make_pool_qi):
+    inst, board = make_pool_qi(), make_pool_qi()
+    other_pulse = ConstantPulse(board.dacs[1], "other_pulse")
+    board.set_macro_list([PlayPulse(board, other_pulse)])
+    board.dacs[0].submodules.pop("readout_pulse")
+    with pytest.raises(ValueError, match="no equivalent"):
+        _run(inst, pool=[board])
+
+
+def test_pool_must_not_contain_the_instrument(make_pool_qi):
+    inst = make_pool_qi()
+    with pytest.raises(ValueError, match="distinct"):
+        _run(inst, pool=[inst])
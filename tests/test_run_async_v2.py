@@ -0,0 +1,159 @@
+"""Unit tests for running a measurement with `QickInstrument.run_async()`."""
+
+import asyncio
+import contextlib
+import threading
+
+import numpy as np
+import pytest
+from qcodes import (
+    Measurement,
+    load_by_id,
+)
+
+from qcodes_qick.instrument_v2 import QickInstrument, RunCancelledError, SoftwareSweep
+
+
+@pytest.fixture
+def qi(make_qi):
+    # 10 ms per point
+    return make_qi(hard_avgs=1000, noise=30, shot_time=1e-5, seed=0)
+
+
+def _sweep(inst: QickInstrument, num: int) -> SoftwareSweep:
+    return SoftwareSweep(inst.dacs[0].readout_pulse.gain, 0.1, 0.5, num)
+
+
+def test_run_async_reports_progress_on_the_event_loop(qi):
+    progress = []
+
+    async def main():
+        loop = asyncio.get_running_loop()
+
+        def report(num_saved, num_points):
+            assert asyncio.get_running_loop() is loop
+            progress.append((num_saved, num_points))
+
+        return await qi.run_async(
+            Measurement(name="run_async"),
+            software_sweeps=[_sweep(qi, 3)],
+            progress_callback=report,
+        )
+
+    run_id = asyncio.run(main())
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+    data = load_by_id(run_id).get_parameter_data()
+    assert data["iq"]["iq"].shape == (3,)
+
+
+def test_run_async_overlaps_with_the_event_loop(qi):
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(1e-3)
+
+    async def main():
+        ticker = asyncio.create_task(tick())
+        await qi.run_async(Measurement(name="run_async"), [_sweep(qi, 5)])
+        ticker.cancel()
+
+    asyncio.run(main())
+    # the measurement takes at least 50 ms
+    assert ticks > 10
+
+
+def test_cancelling_run_async_stops_the_tproc(qi):
+    async def main():
+        two_points_saved = asyncio.Event()
+
+        def report(num_saved, num_points):  # noqa: ARG001
+            if num_saved == 2:
+                two_points_saved.set()
+
+        task = asyncio.create_task(
+            qi.run_async(
+                Measurement(name="run_async"),
+                software_sweeps=[_sweep(qi, 100)],
+                progress_callback=report,
+            )
+        )
+        await two_points_saved.wait()
+        task.cancel()
+        await task
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(main())
+    assert qi.soc.start_time is None
+    assert qi.soc.readout_job is None
+    # the points saved before the cancellation are kept
+    run_id = qi.last_run_metrics.run_id
+    data = load_by_id(run_id).get_parameter_data()
+    gains = data["iq"][f"{qi.name}_dac0_readout_pulse_gain"]
+    assert 2 <= len(gains) < 100
+    np.testing.assert_allclose(gains, _sweep(qi, 100).values[: len(gains)], rtol=1e-3)
+
+
+def test_cancel_run_from_another_thread(qi):
+    async def main():
+        task = asyncio.create_task(
+            qi.run_async(Measurement(name="run_async"), [_sweep(qi, 100)])
+        )
+        await asyncio.sleep(0.05)
+        await asyncio.get_running_loop().run_in_executor(None, qi.cancel_run)
+        await task
+
+    with pytest.raises(RunCancelledError):
+        asyncio.run(main())
+
+
+def test_cancelling_run_async_before_the_run_starts(qi, monkeypatch):
+    run = qi.run
+    cancelled = threading.Event()
+
+    def delayed_run(*args: object, **kwargs: object) -> int:
+        # the worker thread only starts the run once the task has been cancelled
+        assert cancelled.wait(5)
+        return run(*args, **kwargs)
+
+    cancel_run = qi.cancel_run
+
+    def cancel_and_start():
+        cancel_run()
+        cancelled.set()
+
+    monkeypatch.setattr(qi, "run", delayed_run)
+    monkeypatch.setattr(qi, "cancel_run", cancel_and_start)
+
+    async def main():
+        task = asyncio.create_task(
+            qi.run_async(Measurement(name="run_async"), [_sweep(qi, 100)])
+        )
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await task
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(main())
+    assert len(qi.last_run_metrics.points) == 0
+    assert qi.soc.readout_job is None
+
+
+def test_cancellation_does_not_stop_the_next_run(qi):
+    async def main():
+        task = asyncio.create_task(
+            qi.run_async(Measurement(name="run_async"), [_sweep(qi, 100)])
+        )
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        # a cancellation without a run in progress is forgotten by the next run
+        qi.cancel_run()
+        return await qi.run_async(Measurement(name="run_async"), [_sweep(qi, 3)])
+
+    run_id = asyncio.run(main())
+    data = load_by_id(run_id).get_parameter_data()
+    assert data["iq"]["iq"].shape == (3,)
@@ -0,0 +1,96 @@
+"""Unit tests for saving the shots of `QickInstrument.run()` in a `ShotStore`."""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+from qcodes import (
+    Measurement,
+    load_by_id,
+)
+from qick.asm_v2 import QickSweep1D
+
+from qcodes_qick.instrument_v2 import QickInstrument, SoftwareSweep
+from qcodes_qick.shot_store import ShotStore
+
+
+@pytest.fixture
+def qi(make_qi):
+    inst = make_qi(hard_avgs=50, noise=30, seed=0)
+    inst.dacs[0].readout_pulse.gain.set(QickSweep1D("gain", 0.1, 0.5))
+    return inst
+
+
+def _run(inst: QickInstrument, **kwargs) -> int:
+    pulse = inst.dacs[0].readout_pulse
+    return inst.run(
+        Measurement(name="shots"),
+        software_sweeps=[
+            SoftwareSweep(pulse.freq, [1e8, 1.5e8, 1.7e8]),
+            SoftwareSweep(pulse.phase, 0, 90, 2),
+        ],
+        hardware_loop_counts={"gain": 4},
+        acquisition_mode="accumulated shots",
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize("promote_software_sweeps", [False, True])
+def test_shot_store_holds_the_shots_of_the_dataset(qi, promote_software_sweeps):
+    run_id = _run(qi, save_shots=True, promote_software_sweeps=promote_software_sweeps)
+    dataset = load_by_id(run_id)
+    path = Path(dataset.path_to_db).parent / dataset.metadata["qick_shots"]
+    with ShotStore(path) as store:
+        assert store.readouts == ["iq"]
+        assert store.written.all()
+        names = [name for name, _ in store.software_sweeps]
+        assert names == [
+            f"{qi.name}_dac0_readout_pulse_freq",
+            f"{qi.name}_dac0_readout_pulse_phase",
+        ]
+        assert store["iq"].shape == (3, 2, 50, 4, 2)
+        assert store["iq"].dtype == np.int32
+        (readout,) = qi.loaded_program.ro_chs.values()
+        assert store["iq"].attrs["scale"] == 1 / readout["length"]
+        # the points are saved in the dataset in the order of the software sweeps
+        shots = dataset.get_parameter_data()["iq"]["iq"]
+        np.testing.assert_array_equal(store.shots("iq").reshape(shots.shape), shots)
+        # a single point is read on its own
+        np.testing.assert_array_equal(store.shots("iq", (2, 1)), shots[5])
+
+
+def test_shot_store_reads_a_partially_written_sweep(tmp_path):
+    path = tmp_path / "partial_shots.h5"
+    rng = np.random.default_rng(0)
+    shots = rng.integers(-1000, 1000, size=(100, 3, 2), dtype=np.int32)
+    with ShotStore.create(path, [("x", [1.0, 2.0, 3.0])]) as store:
+        store.write("iq0_ch0", [1], shots)
+        store.flush()
+        # the store can be read while it is written,
+        # and the point is incomplete until all its readouts are written
+        with ShotStore(path) as reader:
+            np.testing.assert_array_equal(reader.written, [False, False, False])
+        store.write("iq1_ch0", [1], shots)
+        store.mark_written([1])
+        store.flush()
+        with ShotStore(path) as reader:
+            np.testing.assert_array_equal(reader.written, [False, True, False])
+    with ShotStore(path) as store:
+        np.testing.assert_array_equal(store["iq0_ch0"][1], shots)
+        np.testing.assert_array_equal(
+            store.shots("iq0_ch0", (1, slice(10))),
+            shots[:10, ..., 0] + 1j * shots[:10, ..., 1],
+        )
+        # only the written point takes up space
+        assert store["iq0_ch0"].id.get_storage_size() <= shots.nbytes
+    with pytest.raises(FileExistsError):
+        ShotStore.create(path, [])
+
+
+def test_save_shots_as_npy_is_deprecated(qi):
+    with pytest.deprecated_call():
+        run_id = _run(qi, save_shots_as_npy=True)
+    dataset = load_by_id(run_id)
+    shots = dataset.get_parameter_data()["iq"]["iq"]
+    folder = Path(dataset.path_to_db).parent / f"{run_id}_shots"
+    np.testing.assert_array_equal(np.load(folder / "sweep_2_1_iq.npy"), shots[5])
@@ -0,0 +1,164 @@
+"""Unit tests for `SimulatedQickSoc`, which runs `QickInstrument` without a board."""
+
+from collections import Counter
+
+import numpy as np
+import pytest
+from qcodes import Measurement, load_by_id
+
+from qcodes_qick.envelopes_v2.gaussian import GaussianEnvelope
+from qcodes_qick.macros_v2 import DelayAuto, PlayPulse, Trigger
+from qcodes_qick.programs_v2 import AveragerProgram
+from qcodes_qick.pulses_v2.arbitrary_pulse import ArbitraryPulse
+from qcodes_qick.simulated_soc_v2 import SimulatedQickSoc
+
+
+@pytest.fixture
+def qi(make_qi):
+    return make_qi(state_iq=[100 + 0j, 0 + 100j], noise=100, seed=0)
+
+
+def test_simulated_soc_is_used_without_connecting(qi):
+    assert isinstance(qi.soc, SimulatedQickSoc)
+    assert qi.soccfg["board"] == "ZCU216"
+    assert len(qi.dacs) == 4
+    assert len(qi.adcs) == 2
+
+
+def test_simulated_soc_accumulated_average(qi):
+    qi.soc.populations = [1, 0]
+    qi.hard_avgs.set(1000)
+    iq = qi.run_without_saving()["iq"]
+    assert iq == pytest.approx(100, abs=5)
+
+
+def test_simulated_soc_accumulated_shots_follow_populations(qi):
+    qi.soc.populations = [0.25, 0.75]
+    qi.hard_avgs.set(4000)
+    program = qi.get_program({})
+    qi.run_without_saving()
+    iq = program.acc_buf[0][..., 0, :].dot([1, 1j]) / program.ro_chs[0]["length"]
+    assert program.acc_buf[0].dtype == np.int64
+    assert np.mean(iq.imag > iq.real) == pytest.approx(0.75, abs=0.03)
+
+
+def test_simulated_soc_state_model(qi):
+    qi.soc.state_model = lambda rng, ch, num_reads: np.ones(num_reads, dtype=int)  # noqa: ARG005
+    qi.hard_avgs.set(100)
+    assert qi.run_without_saving()["iq"] == pytest.approx(100j, abs=10)
+
+
+def test_simulated_soc_streams_shots_at_shot_rate():
+    soc = SimulatedQickSoc(shot_time=1e-5, seed=0)
+    soc.config_avg(0, length=10)
+    soc.start_readout(3000, ch_list=[0], reads_per_shot=[1])
+    shots = 0
+    packets = 0
+    while shots < 3000:
+        for new_shots, (data, _) in soc.poll_data():
+            assert data[0].shape == (new_shots, 2)
+            shots += new_shots
+            packets += 1
+    assert shots == 3000
+    assert packets > 1
+
+
+def test_simulated_soc_ddr4():
+    soc = SimulatedQickSoc(seed=0)
+    soc.arm_ddr4(0, 4)
+    data = soc.get_ddr4(4)
+    burst_len = soc["ddr4_buf"]["burst_len"]
+    assert data.shape == (4 * burst_len - soc["ddr4_buf"]["junk_len"], 2)
+    assert data.dtype == np.int16
+
+
+def test_ddr4_run_arms_with_the_settings_of_the_point(qi):
+    adc, pulse = qi.adcs[0], qi.dacs[0].readout_pulse
+    qi.set_macro_list(
+        [Trigger(qi, adc, t=0, ddr4=True), PlayPulse(qi, pulse), DelayAuto(qi, 10e-9)]
+    )
+    qi.hard_avgs.set(1)
+    qi.ddr4_buffer.num_transfers.set(2)
+    armed = []
+    arm_ddr4 = qi.soc.arm_ddr4
+    qi.soc.arm_ddr4 = lambda ch, nt: armed.append((ch, nt)) or arm_ddr4(ch, nt)
+    # the settings change while the point waits to be acquired,
+    # as when the next point is prepared on the compiler thread
+    run_id = qi.run(
+        Measurement(name="ddr4"),
+        acquisition_mode="ddr4",
+        before_each_point=lambda: qi.ddr4_buffer.num_transfers.set(5),
+    )
+    assert armed == [(adc.channel_num, 2)]
+    iq = load_by_id(run_id).get_parameter_data()["iq"]["iq"]
+    burst_len = qi.soccfg["ddr4_buf"]["burst_len"]
+    assert iq.shape == (1, 2 * burst_len - qi.soccfg["ddr4_buf"]["junk_len"])
+
+
+def _count_board_calls(soc: SimulatedQickSoc, monkeypatch) -> Counter:
+    """Count the calls which configure the board.
+
+    The readouts of the simulated board are configured by the tProc, so qick
+    never calls `configure_readout()`, and `config_readouts()` is counted instead.
+    """
+    calls = Counter()
+
+    def count(owner: object, name: str) -> None:
+        method = getattr(owner, name)
+
+        def counted(*args: object, **kwargs) -> None:
+            calls[name] += 1
+            method(*args, **kwargs)
+
+        monkeypatch.setattr(owner, name, counted)
+
+    for name in ["set_nyquist", "load_envelope", "load_bin_program"]:
+        count(soc, name)
+    count(AveragerProgram, "config_readouts")
+    return calls
+
+
+def test_reloading_a_program_skips_the_unchanged_board_configuration(qi, monkeypatch):
+    dac, adc = qi.dacs[0], qi.adcs[0]
+    drive = ArbitraryPulse(dac, "drive_pulse", GaussianEnvelope(dac))
+    qi.set_macro_list(
+        [
+            PlayPulse(qi, drive),
+            Trigger(qi, adc, t=0),
+            PlayPulse(qi, dac.readout_pulse),
+            DelayAuto(qi, 10e-9),
+        ]
+    )
+    qi.run_without_saving()
+    calls = _count_board_calls(qi.soc, monkeypatch)
+
+    # the gain and the frequency are in the waveform memory
+    dac.readout_pulse.gain.set(0.2)
+    drive.freq.set(1.2e8)
+    qi.run_without_saving()
+    assert calls == {"load_bin_program": 1}
+
+    # the Nyquist zone and the readout length reconfigure the board,
+    # but the resident envelope is not loaded again
+    calls.clear()
+    dac.nqz.set(2)
+    qi.run_without_saving()
+    assert calls["set_nyquist"] > 0
+    assert calls["config_readouts"] > 0
+    assert calls["load_envelope"] == 0
+
+    calls.clear()
+    adc.length.set(2e-6)
+    qi.run_without_saving()
+    assert calls["set_nyquist"] > 0
+    assert calls["config_readouts"] > 0
+
+    # a run after something else has configured the board loads everything
+    calls.clear()
+    qi.run_without_saving()
+    assert calls == {"load_bin_program": 1}
+    qi.invalidate_board_state()
+    qi.run_without_saving()
+    assert calls["set_nyquist"] > 0
+    assert calls["config_readouts"] > 0
+    assert calls["load_envelope"] > 0
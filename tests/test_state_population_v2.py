@@ -0,0 +1,65 @@
+"""Unit tests for the "state population" acquisition mode of `QickInstrument`."""
+
+import itertools
+
+import numpy as np
+import pytest
+from qcodes import (
+    Measurement,
+    load_by_id,
+)
+from qick.asm_v2 import QickSweep1D
+
+STATE_IQ = np.array([100, 100j, -100])
+
+
+def _classify(iq: np.ndarray) -> np.ndarray:
+    # the state whose IQ point is closest in direction
+    return (iq[..., np.newaxis] * STATE_IQ.conj()).real.argmax(axis=-1)
+
+
+@pytest.fixture
+def qi(make_qi):
+    inst = make_qi(num_readouts=2, state_iq=STATE_IQ, noise=1, seed=0)
+    soc = inst.soc
+    # record the states drawn by the simulated board
+    soc.drawn_states = []
+
+    def state_model(rng, ch, num_reads):  # noqa: ARG001
+        states = rng.integers(len(STATE_IQ), size=num_reads)
+        soc.drawn_states.append(states)
+        return states
+
+    soc.state_model = state_model
+    return inst
+
+
+def test_state_population_counts_every_combination(qi):
+    qi.hard_avgs.set(500)
+    qi.dacs[0].readout_pulse.gain.set(QickSweep1D("gain", 0.1, 0.5))
+    run_id = qi.run(
+        Measurement(name="state_population"),
+        hardware_loop_counts={"gain": 4},
+        acquisition_mode="state population",
+        num_states=3,
+        state_classifier=_classify,
+    )
+    data = load_by_id(run_id).get_parameter_data()
+    states = np.concatenate(qi.soc.drawn_states).reshape(500, 4, 2)
+    for combination in itertools.product(range(3), repeat=2):
+        name = "population_" + "_".join(map(str, combination))
+        expected = np.all(states == combination, axis=-1).sum(axis=0)
+        np.testing.assert_array_equal(data[name][name].reshape(-1), expected)
+    total = sum(data[name][name].reshape(-1) for name in data)
+    np.testing.assert_array_equal(total, np.full(4, 500))
+
+
+def test_state_population_rejects_states_out_of_range(qi):
+    qi.hard_avgs.set(10)
+    with pytest.raises(ValueError, match="outside of range"):
+        qi.run(
+            Measurement(name="state_population"),
+            acquisition_mode="state population",
+            num_states=2,
+            state_classifier=_classify,
+        )
@@ -0,0 +1,51 @@
+"""Unit tests for the dtypes with which `QickInstrument.run()` saves the results."""
+
+import numpy as np
+import pytest
+from qcodes import (
+    Measurement,
+    load_by_id,
+)
+from qick.asm_v2 import QickSweep1D
+
+from qcodes_qick.instrument_v2 import QickInstrument, SoftwareSweep
+
+
+@pytest.fixture
+def make_dtypes_qi(make_qi):
+    def make_dtypes_qi() -> QickInstrument:
+        inst = make_qi(hard_avgs=200, noise=30, seed=0)
+        inst.dacs[0].readout_pulse.gain.set(QickSweep1D("gain", 0.1, 0.5))
+        return inst
+
+    return make_dtypes_qi
+
+
+def _run(inst: QickInstrument, **kwargs) -> dict:
+    run_id = inst.run(
+        Measurement(name="dtypes"),
+        software_sweeps=[SoftwareSweep(inst.dacs[0].readout_pulse.freq, 1e8, 2e8, 2)],
+        hardware_loop_counts={"gain": 3},
+        **kwargs,
+    )
+    return load_by_id(run_id).get_parameter_data()
+
+
+@pytest.mark.parametrize("acquisition_mode", ["accumulated", "accumulated shots"])
+def test_complex64_results_match_complex128(make_dtypes_qi, acquisition_mode):
+    compact = _run(
+        make_dtypes_qi(), acquisition_mode=acquisition_mode, iq_dtype="complex64"
+    )
+    reference = _run(make_dtypes_qi(), acquisition_mode=acquisition_mode)
+    assert compact["iq"]["iq"].dtype == np.complex64
+    assert reference["iq"]["iq"].dtype == np.complex128
+    np.testing.assert_allclose(compact["iq"]["iq"], reference["iq"]["iq"], rtol=1e-6)
+    if acquisition_mode == "accumulated shots":
+        shots = compact["iq"]["shot"]
+        assert shots.dtype == np.int16
+        np.testing.assert_array_equal(shots[0, :, 0], np.arange(200))
+
+
+def test_iq_dtype_must_be_complex(make_dtypes_qi):
+    with pytest.raises(ValueError, match="iq_dtype"):
+        _run(make_dtypes_qi(), iq_dtype="int32")
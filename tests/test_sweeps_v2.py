@@ -6,7 +6,7 @@ the `SweepableParameter' get/set behaviour.
 
 import numpy as np
 import pytest
-from qcodes import Instrument, ManualParameter
+from qcodes import Instrument, ManualParameter, Measurement, load_by_id
 from qick.asm_v2 import QickSweep1D
 
 from qcodes_qick.instrument_v2 import SoftwareSweep
@@ -132,3 +132,62 @@ def test_sweepable_parameter_rejects_out_of_range(instrument):
     p = _sweepable(instrument)
     with pytest.raises(ValueError, match="must be between"):
         p.set(70.0)
+
+
+# Promotion of software sweeps to hardware loops
+def test_software_sweep_is_hardware_sweepable(instrument):
+    p = _sweepable(instrument)
+    assert SoftwareSweep(p, 1, 9, 5).is_hardware_sweepable(instrument)
+
+
+def test_software_sweep_uneven_is_not_hardware_sweepable(instrument):
+    p = _sweepable(instrument)
+    sweep = SoftwareSweep(p, [1, 2, 4])
+    assert not sweep.is_hardware_sweepable(instrument)
+
+
+def test_software_sweep_single_point_is_not_hardware_sweepable(instrument):
+    p = _sweepable(instrument)
+    assert not SoftwareSweep(p, [1]).is_hardware_sweepable(instrument)
+
+
+def test_software_sweep_manual_parameter_is_not_hardware_sweepable(instrument):
+    assert not SoftwareSweep(_param(), 1, 9, 5).is_hardware_sweepable(instrument)
+
+
+def test_software_sweep_of_swept_parameter_is_not_hardware_sweepable(instrument):
+    p = _sweepable(instrument)
+    p.set(QickSweep1D("loop", 4.0, 7.0))
+    assert not SoftwareSweep(p, 1, 9, 5).is_hardware_sweepable(instrument)
+
+
+def test_promoted_software_sweeps_save_the_same_dataset(make_qi):
+    datasets = []
+    for promote_software_sweeps in [False, True]:
+        # without noise and with a single state, every point measures the same value
+        qi = make_qi(state_iq=[300 + 100j], noise=0)
+        pulse = qi.dacs[0].readout_pulse
+        run_id = qi.run(
+            Measurement(name="promotion"),
+            software_sweeps=[
+                SoftwareSweep(pulse.phase, 0, 90, 4),
+                SoftwareSweep(pulse.freq, 1e8, 1.37e8, 7),
+            ],
+            promote_software_sweeps=promote_software_sweeps,
+        )
+        num_points = len(qi.last_run_metrics.points)
+        assert num_points == (1 if promote_software_sweeps else 28)
+        data = load_by_id(run_id).get_parameter_data()["iq"]
+        # the parameters of the instruments differ only in the instrument name
+        datasets.append({name.replace(qi.name, "qi"): data[name] for name in data})
+    software, promoted = datasets
+    assert software.keys() == promoted.keys()
+    for name, values in software.items():
+        assert promoted[name].shape == values.shape
+    np.testing.assert_array_equal(promoted["iq"], software["iq"])
+    # the promoted values step by the step truncated to the hardware resolution
+    for name in ["qi_dac0_readout_pulse_phase", "qi_dac0_readout_pulse_freq"]:
+        np.testing.assert_allclose(promoted[name], software[name], rtol=1e-7, atol=1e-6)
+    # so the last value is further from the requested one than without promotion
+    freqs = [data["qi_dac0_readout_pulse_freq"][-1] for data in datasets]
+    assert abs(freqs[1] - 1.37e8) > abs(freqs[0] - 1.37e8)